@@ -51,6 +51,7 @@ setup(
     ],
     extras_require={
         ':python_version<"3.5"': ['typing'],
-        ':python_version<"3.4"': ['enum34']
+        ':python_version<"3.4"': ['enum34'],
+        'numpy': ['numpy']
     }
 )
@@ -10,6 +10,8 @@ LICENSE file.
 """
 from __future__ import division, print_function
 
+import math
+import random
 import select
 import socket
 import struct
@@ -20,9 +22,12 @@ import attr
 from . import Logger, protocol
 from .__version__ import __version__
 from .protocol import (ConnectMessage, DiscoveryMessage, EchoRequestMessage, EchoResponseMessage,
-                       MocapFrameMessage, ModelDefinitionsMessage, RequestModelDefinitionsMessage,
-                       ServerInfoMessage)
-from .protocol.MocapFrameMessage import TimingInfo
+                       KeepAliveMessage, MocapFrameMessage, ModelDefinitionsMessage,
+                       RequestModelDefinitionsMessage, ServerInfoMessage)
+from .protocol.common import SerializeBuffer
+from .protocol.MocapFrameMessage import LabelledMarker, Markerset, RigidBody, Skeleton, TimingInfo
+from .protocol.ModelDefinitionsMessage import (MarkersetDescription, RigidBodyDescription,
+                                               SkeletonDescription)
 from .protocol.ServerInfoMessage import ConnectionInfo
 
 
@@ -39,15 +44,14 @@ class ServerConnection(object):
     _multicast_address = ('239.255.42.100', 1511)  # Not the same as Motive default
 
     @classmethod
-    def listen(cls, command_port=1510):
+    def listen(cls, command_port=1510, ttl=1):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind(('', command_port))
 
-        # Set the time-to-live for messages to 1 so they do not go past the
-        # local network segment.
-        ttl = struct.pack('b', 1)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        # Set the time-to-live for multicast messages (by default to 1 so they do not go past the
+        # local network segment).
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', ttl))
 
         return cls(sock)
 
@@ -84,21 +88,231 @@ class ServerConnection(object):
         return message, client_address, received_time
 
 
+class _SubscriberTable(object):
+
+    """Unicast subscribers, which stay subscribed until `timeout` seconds after their last KeepAlive message."""
+
+    def __init__(self, log, timeout=5.0):
+        """
+        Args:
+            log (:class:`~natnet.logging.Logger`):
+            timeout (float): How long a subscriber stays subscribed after its last KeepAlive message
+        """
+        self._log = log
+        self._timeout = timeout
+        self._last_keep_alive_times = {}  # type: dict[tuple[str, int], float]
+
+    def __len__(self):
+        return len(self._last_keep_alive_times)
+
+    def __iter__(self):
+        return iter(list(self._last_keep_alive_times))
+
+    def keep_alive(self, address, received_time):
+        """Subscribe an address, or renew its subscription."""
+        if address not in self._last_keep_alive_times:
+            self._log.info('New subscriber %s', address)
+        self._last_keep_alive_times[address] = received_time
+
+    def expire(self):
+        """Unsubscribe addresses which haven't sent a KeepAlive message recently enough."""
+        expired_before = timeit.default_timer() - self._timeout
+        for address, last_keep_alive_time in list(self._last_keep_alive_times.items()):
+            if last_keep_alive_time < expired_before:
+                self._log.info('Subscriber %s timed out', address)
+                del self._last_keep_alive_times[address]
+
+
+@attr.s
+class Scene(object):
+
+    """Synthetic scene for the server to stream, standing in for a real mocap stage.
+
+    Each rigid body moves around a circle about the origin at its own height, rotating about the
+    vertical axis as it goes, with its markers spaced evenly around a smaller circle.  Each skeleton
+    is a chain of bones (rigid bodies) moving the same way.  Free markers (labelled markers which
+    aren't part of a rigid body) move around a larger circle.
+
+    Occlusion dropouts mimic Motive with "solver replaces occlusion" turned on: an occluded rigid
+    body marker is left out of the labelled markers but still appears in the rigid body's
+    markerset, which is what :class:`~natnet.comms.Client` expects.  Dropouts are random but
+    repeatable, as the random number generator is seeded.
+
+    Attributes:
+        rigid_body_count (int):
+        markers_per_rigid_body (int):
+        free_marker_count (int): Number of labelled markers which don't belong to a rigid body
+        skeleton_count (int):
+        bones_per_skeleton (int):
+        occlusion_probability (float): Probability of each rigid body marker being occluded in
+            each frame
+        radius (float): Radius of the circle the rigid bodies move around, in metres
+        angular_velocity (float): Angular velocity of the rigid bodies around that circle, in
+            radians per second
+        seed (int): Seed for occlusion dropouts
+    """
+
+    rigid_body_count = attr.ib(0)  # type: int
+    markers_per_rigid_body = attr.ib(4)  # type: int
+    free_marker_count = attr.ib(0)  # type: int
+    skeleton_count = attr.ib(0)  # type: int
+    bones_per_skeleton = attr.ib(21)  # type: int
+    occlusion_probability = attr.ib(0.0)  # type: float
+    radius = attr.ib(1.0)  # type: float
+    angular_velocity = attr.ib(1.0)  # type: float
+    seed = attr.ib(0)  # type: int
+    _random = attr.ib(init=False, repr=False)
+    _marker_radius = 0.05
+
+    def __attrs_post_init__(self):
+        self._random = random.Random(self.seed)
+
+    @property
+    def labelled_marker_count(self):
+        """Number of labelled markers in each frame, before occlusion."""
+        return self.rigid_body_count*self.markers_per_rigid_body + self.free_marker_count
+
+    def _rigid_body_name(self, id_):
+        return u'Rigid body {}'.format(id_)
+
+    def _skeleton_id(self, i):
+        # Skeleton and rigid body IDs share a namespace on the client
+        return self.rigid_body_count + i + 1
+
+    def _marker_offsets(self):
+        return [(self._marker_radius*math.cos(2*math.pi*i/self.markers_per_rigid_body), 0.0,
+                 self._marker_radius*math.sin(2*math.pi*i/self.markers_per_rigid_body))
+                for i in range(self.markers_per_rigid_body)]
+
+    def model_definitions(self):
+        """Get model definitions for the rigid bodies and skeletons in this scene.
+
+        Returns:
+            :class:`~natnet.protocol.ModelDefinitionsMessage`:
+        """
+        models = []
+        marker_offsets = self._marker_offsets()
+        for id_ in range(1, self.rigid_body_count + 1):
+            name = self._rigid_body_name(id_)
+            models.append(MarkersetDescription(name, [u'{}_{}'.format(name, i + 1)
+                                                      for i in range(self.markers_per_rigid_body)]))
+            models.append(RigidBodyDescription(name, id_, -1, (0.0, 0.0, 0.0), marker_offsets,
+                                               [0]*self.markers_per_rigid_body))
+        for i in range(self.skeleton_count):
+            skeleton_id = self._skeleton_id(i)
+            bones = [RigidBodyDescription(u'Bone {}'.format(bone_id), (skeleton_id << 16) + bone_id,
+                                          (skeleton_id << 16) + bone_id - 1 if bone_id > 1 else -1,
+                                          (0.0, 0.1, 0.0), [], [])
+                     for bone_id in range(1, self.bones_per_skeleton + 1)]
+            models.append(SkeletonDescription(u'Skeleton {}'.format(skeleton_id), skeleton_id, bones))
+        return ModelDefinitionsMessage(models)
+
+    def _pose(self, phase, height, t):
+        """Get the position and orientation of a body moving around the circle at time t."""
+        angle = self.angular_velocity*t + phase
+        position = (self.radius*math.cos(angle), height, self.radius*math.sin(angle))
+        # Rotation about the vertical (y) axis, as an (x, y, z, w) quaternion
+        orientation = (0.0, math.sin(-angle/2), 0.0, math.cos(-angle/2))
+        return position, orientation
+
+    def frame(self, frame_number, t, timing_info):
+        """Generate a frame of mocap data.
+
+        Args:
+            frame_number (int):
+            t (float): Time in seconds
+            timing_info (:class:`~natnet.protocol.MocapFrameMessage.TimingInfo`):
+
+        Returns:
+            :class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage`:
+        """
+        rigid_bodies = []
+        markersets = []
+        labelled_markers = []
+        marker_offsets = self._marker_offsets()
+        tracked_params = LabelledMarker._POINT_CLOUD_SOLVED | LabelledMarker._HAS_MODEL
+        for id_ in range(1, self.rigid_body_count + 1):
+            position, orientation = self._pose(2*math.pi*id_/self.rigid_body_count, 0.1*id_, t)
+            rigid_bodies.append(RigidBody(id_, position, orientation, mean_error=0.0001, params=1))
+            # Markers rotate with the body, so the angle around it matches the body's heading
+            angle = self.angular_velocity*t + 2*math.pi*id_/self.rigid_body_count
+            c, s = math.cos(angle), math.sin(angle)
+            markers = [(position[0] + c*x - s*z, position[1] + y, position[2] + s*x + c*z)
+                       for x, y, z in marker_offsets]
+            markersets.append(Markerset(self._rigid_body_name(id_), markers))
+            for marker_id, marker_position in enumerate(markers, 1):
+                if self._random.random() >= self.occlusion_probability:
+                    labelled_markers.append(LabelledMarker(id_, marker_id, marker_position, 0.014,
+                                                           tracked_params, 0.0001))
+        for i in range(self.free_marker_count):
+            position, _ = self._pose(2*math.pi*i/self.free_marker_count, 0.0, -t)
+            position = (2*position[0], position[1], 2*position[2])
+            labelled_markers.append(LabelledMarker(0, i + 1, position, 0.014,
+                                                   LabelledMarker._POINT_CLOUD_SOLVED, 0.0001))
+
+        skeletons = []
+        for i in range(self.skeleton_count):
+            skeleton_id = self._skeleton_id(i)
+            bones = []
+            for bone_id in range(1, self.bones_per_skeleton + 1):
+                position, orientation = self._pose(2*math.pi*i/self.skeleton_count, 0.1*bone_id, t)
+                bones.append(RigidBody((skeleton_id << 16) + bone_id, position, orientation,
+                                       mean_error=0.0001, params=1))
+            skeletons.append(Skeleton(skeleton_id, bones))
+
+        return MocapFrameMessage(
+            frame_number=frame_number,
+            markersets=markersets,
+            rigid_bodies=rigid_bodies,
+            skeletons=skeletons,
+            labelled_markers=labelled_markers,
+            force_plates=[],
+            devices=[],
+            timing_info=timing_info,
+            params=0
+        )
+
+
 class Server(object):
 
-    """Fake server which implements just enough of the protocol for integration tests."""
+    """Fake server which implements just enough of the protocol for integration tests.
+
+    It streams frames of a synthetic :class:`Scene`, which is empty by default, to any number of
+    clients.  In multicast mode (the default) each frame is sent once to the multicast group.  In
+    unicast mode each frame is serialized once and sent to every subscriber, where a subscriber is
+    any address which has sent a KeepAlive message within the last `subscriber_timeout` seconds.
+    """
+
+    # Sleep until this long before each frame is due, then busy-wait, since select timeouts aren't
+    # precise enough for high frame rates (especially on Windows)
+    _spin_time = 0.002
 
-    def __init__(self):
+    def __init__(self, scene=None, unicast=False, subscriber_timeout=5.0):
+        """
+        Args:
+            scene (:class:`Scene`): Scene to stream
+            unicast (bool): Send frames to each subscriber instead of to the multicast group
+            subscriber_timeout (float): In unicast mode, stop sending frames to a subscriber after
+                this long without a KeepAlive message
+        """
         self._conn = None
+        self._frame_buffers = []  # type: list[SerializeBuffer]
         self._last_frame_number = 0
         self._log = ServerLogger()
-        self._last_frame_time = None
+        self._scene = scene or Scene()
+        self._start_time = None
+        self._unicast = unicast
+        self._subscribers = _SubscriberTable(self._log, subscriber_timeout)
         self.should_exit = False
 
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
     def _send_server_info(self, client_address):
         connection_info = ConnectionInfo(
             data_port=self._conn._multicast_address[1],
-            multicast=True,
+            multicast=not self._unicast,
             multicast_address=self._conn._multicast_address[0]
         )
         msg = ServerInfoMessage(
@@ -118,10 +332,9 @@ class Server(object):
         self._conn.send_message(msg, client_address)
 
     def _send_model_definitions(self, client_address):
-        msg = ModelDefinitionsMessage([])
-        self._conn.send_message(msg, client_address)
+        self._conn.send_message(self._scene.model_definitions(), client_address)
 
-    def _send_frame(self):
+    def _make_frame_packet(self, buffer):
         now = timeit.default_timer()
         now_int = int(now*1e9)
         timing_info = TimingInfo(
@@ -133,59 +346,95 @@ class Server(object):
             transmit_timestamp=now_int
         )
         self._last_frame_number += 1
-        msg = MocapFrameMessage(
-            frame_number=self._last_frame_number,
-            markersets=[],
-            rigid_bodies=[],
-            skeletons=[],
-            labelled_markers=[],
-            force_plates=[],
-            devices=[],
-            timing_info=timing_info,
-            params=0
-        )
-        self._conn.send_message(msg)
-        self._last_frame_time = now
+        msg = self._scene.frame(self._last_frame_number, now - self._start_time, timing_info)
+        return protocol.serialize(msg, buffer)
+
+    def _send_burst(self, burst_size):
+        # Generate the whole burst first so the packets go out back-to-back, packing each frame into
+        # its own buffer which is reused for every burst
+        while len(self._frame_buffers) < burst_size:
+            self._frame_buffers.append(SerializeBuffer())
+        packets = [self._make_frame_packet(self._frame_buffers[i]) for i in range(burst_size)]
+        if self._unicast:
+            self._subscribers.expire()
+            subscribers = list(self._subscribers)
+            for packet in packets:
+                for address in subscribers:
+                    self._conn.send_packet(packet, address)
+        else:
+            for packet in packets:
+                self._conn.send_packet(packet)
+
+    def _handle_message(self, message, client_address, received_time):
+        if type(message) in (ConnectMessage, DiscoveryMessage):
+            self._log.info('Sending server info to %s', client_address)
+            self._send_server_info(client_address)
+        elif type(message) is KeepAliveMessage:
+            if self._unicast:
+                self._subscribers.keep_alive(client_address, received_time)
+        elif type(message) is EchoRequestMessage:
+            self._send_echo_response(message, client_address, received_time)
+        elif type(message) is RequestModelDefinitionsMessage:
+            self._send_model_definitions(client_address)
+        else:
+            self._log.debug('Received message: %s', message)
+
+    def _wait_until(self, deadline):
+        """Handle incoming messages until the deadline.
+
+        This sleeps in select until shortly before the deadline, then polls until it.  Any messages
+        which are already waiting are handled even if the deadline has passed.
+        """
+        while not self.should_exit:
+            remaining = deadline - timeit.default_timer()
+            timeout = max(remaining - self._spin_time, 0)
+            message, client_address, received_time = self._conn.wait_for_message(timeout=timeout)
+            if message is not None:
+                self._handle_message(message, client_address, received_time)
+            elif remaining <= 0:
+                break
 
-    def _run(self, rate):
+    def _run(self, rate, burst_size=1):
         self._conn = ServerConnection.listen()
         self._log.info('Waiting for client to connect')
         while not self.should_exit:
             message, client_address, received_time = self._conn.wait_for_message(timeout=0.1)
             if message is None:
                 continue
+            self._handle_message(message, client_address, received_time)
             if type(message) in (ConnectMessage, DiscoveryMessage):
-                self._log.info('Sending server info to %s', client_address)
-                self._send_server_info(client_address)
                 break
-            else:
-                self._log.debug('Received message: %s', message)
         self._log.info('Streaming frames')
+        # Schedule bursts from the start time rather than the previous burst, so timing errors
+        # don't accumulate
+        self._start_time = timeit.default_timer()
+        burst_period = burst_size/rate
+        bursts_sent = 0
         while not self.should_exit:
-            if self._last_frame_time:
-                next_frame_due = self._last_frame_time + 1.0/rate
-                sleep_time = max(0, next_frame_due - timeit.default_timer())
-                message, client_address, received_time = self._conn.wait_for_message(timeout=sleep_time)
-                if message is not None:
-                    if type(message) is EchoRequestMessage:
-                        self._send_echo_response(message, client_address, received_time)
-                        continue
-                    elif type(message) is RequestModelDefinitionsMessage:
-                        self._send_model_definitions(client_address)
-                        continue
-                    else:
-                        self._log.debug('Received message: %s', message)
-            self._send_frame()
+            self._send_burst(burst_size)
             self._log.debug('.')
+            bursts_sent += 1
+            next_burst_due = self._start_time + bursts_sent*burst_period
+            lag = timeit.default_timer() - next_burst_due
+            if lag > burst_period:
+                # Can't keep up (e.g., the scene is too big for this rate), so drop the missed
+                # bursts rather than sending them all at once
+                missed = int(lag/burst_period)
+                self._log.warning('Server fell behind, skipping %i bursts', missed)
+                bursts_sent += missed
+                next_burst_due += missed*burst_period
+            self._wait_until(next_burst_due)
 
-    def run(self, rate=1):
+    def run(self, rate=1, burst_size=1):
         """Run the server.
 
         Args:
             rate (int): Rate at which to send mocap frames, in Hz
+            burst_size (int): Send frames in bursts of this many back-to-back, with bursts at
+                `rate`/`burst_size` Hz (so the average rate is unchanged)
         """
         try:
-            self._run(rate)
+            self._run(rate, burst_size)
         except KeyboardInterrupt:
             pass
         finally:
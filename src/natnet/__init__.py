@@ -8,13 +8,13 @@ No part of python_natnet, including this file, may be copied, modified,
 propagated, or distributed except according to the terms contained in the
 LICENSE file.
 """
-__all__ = ['__version__', 'fakes', 'protocol', 'Client', 'DiscoveryError', 'MessageId', 'Version',
-           'Logger', 'Server']
+__all__ = ['__version__', 'fakes', 'protocol', 'Client', 'ClockSyncError', 'DiscoveryError', 'MessageId',
+           'Version', 'Logger', 'Scene', 'Server']
 
 
 from . import fakes, protocol
 from .__version__ import __version__
-from .comms import Client, DiscoveryError
+from .comms import Client, ClockSyncError, DiscoveryError
 from .logging import Logger
 from .protocol import MessageId, Version
-from .Server import Server
+from .Server import Scene, Server
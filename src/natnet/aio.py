@@ -0,0 +1,340 @@
+# coding: utf-8
+"""asyncio client.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+This module requires Python 3.5 or later, so it isn't imported by the top-level package.  It uses
+the same sockets (from :func:`~natnet.comms.Connection.open`) and the same frame processing as
+:class:`~natnet.comms.Client`, but receives packets with asyncio datagram transports instead of
+blocking in :func:`select.select`.
+"""
+
+__all__ = ['AsyncClient']
+
+import asyncio
+import collections
+import timeit
+
+from . import protocol
+from .comms import (Client, ClockSyncError, ClockSynchronizer, Connection, DiscoveryError,
+                    _InitialSync)
+from .logging import Logger
+
+
+class _PacketProtocol(asyncio.DatagramProtocol):
+
+    """Pass each received packet to a handler, along with its received timestamp."""
+
+    def __init__(self, handler, log):
+        self._handler = handler
+        self._log = log
+
+    def datagram_received(self, data, address):
+        self._handler(data, timeit.default_timer(), address)
+
+    def error_received(self, exc):
+        self._log.error('Socket error: %s', exc)
+
+
+class _FrameIterator(object):
+
+    def __init__(self, queue):
+        self._queue = queue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._queue.get()
+        if item is None:
+            # Client closed
+            raise StopAsyncIteration
+        return item
+
+
+class AsyncClient(object):
+
+    """NatNet client for use with asyncio.
+
+    Use :func:`connect` to create one, then iterate over the frames it receives::
+
+        client = await AsyncClient.connect()
+        async for frame, timing in client.frames():
+            print(frame.rigid_bodies)
+
+    Each frame is a :class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage` (with the same
+    occlusion workaround as :class:`~natnet.comms.Client`) and each timing is a
+    :class:`~natnet.comms.TimestampAndLatency`, where the processing latency is the time taken to
+    queue the frame rather than to consume it.
+
+    Attributes:
+        dropped_frame_count (int): Number of frames dropped because the queue was full (or because
+            too many arrived before the clocks were synchronized)
+    """
+
+    def __init__(self, conn, logger, max_queued_frames=100):
+        """
+        Args:
+            conn (:class:`~natnet.comms.Connection`):
+            logger (:class:`~natnet.logging.Logger`):
+            max_queued_frames (int): When this many frames are waiting to be consumed, drop the
+                oldest one for each new one
+        """
+        self._conn = conn
+        self._log = logger
+        self._client = None  # type: Client
+        self._frames = asyncio.Queue(max_queued_frames)
+        self._subscribers = {}  # type: dict[protocol.MessageId, list[asyncio.Queue]]
+        self._transports = []
+        self._keep_alive_handle = None  # type: asyncio.TimerHandle
+        # Packets which arrived before the clocks were synchronized
+        self._early_packets = collections.deque()
+        self._max_queued_frames = max_queued_frames
+        self.dropped_frame_count = 0
+
+    @classmethod
+    async def connect(cls, server=None, logger=Logger(), timeout=1, max_queued_frames=100):
+        """Connect to a NatNet server.
+
+        Raises :class:`~natnet.comms.DiscoveryError` if `server` is not provided and discovery fails,
+        or :class:`~natnet.comms.ClockSyncError` if the server doesn't respond to echo requests.
+
+        Args:
+            server (str): IPv4 address of server (hostname probably works too), or None to
+                autodiscover
+            logger (:class:`~natnet.logging.Logger`):
+            timeout (int): How long to wait for server(s) to respond
+            max_queued_frames (int): See :class:`AsyncClient`
+        """
+        conn = Connection.open('<broadcast>' if server is None else server)
+        inst = cls(conn, logger, max_queued_frames)
+        await inst._open_endpoint(conn._command_socket)
+        try:
+            if server is None:
+                server_address, server_info = await inst._discover(timeout)
+                conn.set_server_address(*server_address)
+            else:
+                logger.info('Connecting to %s', server)
+                conn.send_message(protocol.ConnectMessage())
+                server_info, _, _ = await inst._wait_for_message(protocol.MessageId.ServerInfo,
+                                                                 timeout)
+            logger.debug('Server application: %s', server_info.app_name)
+            logger.debug('Server version: %s', server_info.app_version)
+            unicast = not server_info.connection_info.multicast
+            if unicast:
+                logger.debug('Server is in unicast mode')
+                conn.bind_unicast_data_socket()
+            else:
+                conn.bind_data_socket(server_info.connection_info.multicast_address,
+                                      server_info.connection_info.data_port)
+            await inst._open_endpoint(conn._data_socket)
+
+            clock_synchronizer = ClockSynchronizer(server_info, logger)
+            inst._client = Client(conn, clock_synchronizer, logger, unicast=unicast)
+            if unicast:
+                inst._keep_alive()
+            inst._client.set_frame_callback(inst._enqueue_frame)
+
+            logger.debug('Synchronizing clocks')
+            await inst.initial_sync()
+            if not clock_synchronizer.estimator.synchronized:
+                raise ClockSyncError('No response to echo requests')
+            inst._handle_early_packets()
+
+            logger.debug('Getting data descriptions')
+            await inst.request_model_definitions(timeout)
+        except BaseException:
+            inst.close()
+            raise
+
+        logger.info('Ready')
+        return inst
+
+    async def _open_endpoint(self, sock):
+        loop = asyncio.get_event_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _PacketProtocol(self._handle_packet, self._log), sock=sock)
+        self._transports.append(transport)
+
+    async def _discover(self, timeout):
+        self._log.info('Discovering servers')
+        queue = self._subscribe(protocol.MessageId.ServerInfo)
+        try:
+            self._conn.send_message(protocol.DiscoveryMessage())
+            await asyncio.sleep(timeout)
+        finally:
+            self._unsubscribe(protocol.MessageId.ServerInfo, queue)
+
+        servers = []
+        while not queue.empty():
+            info, _, address = queue.get_nowait()
+            self._log.info('Found server %s', address)
+            servers.append((address, info))
+
+        if not servers:
+            raise DiscoveryError('No servers found')
+        if len(servers) > 1:
+            raise DiscoveryError('Multiple servers found, choose one manually')
+        return servers[0]
+
+    def _subscribe(self, message_id):
+        """Get a queue which receives every message of the given type until unsubscribed.
+
+        While anything is subscribed to a message type, those messages aren't passed to the client.
+        """
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(message_id, []).append(queue)
+        return queue
+
+    def _unsubscribe(self, message_id, queue):
+        self._subscribers[message_id].remove(queue)
+
+    async def _wait_for_message(self, message_id, timeout=None):
+        """Return the next message received of the given type, along with its received time and sender."""
+        queue = self._subscribe(message_id)
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        finally:
+            self._unsubscribe(message_id, queue)
+
+    def _handle_packet(self, packet, received_time, address):
+        message_id, payload = protocol.deserialize_header(packet)
+        subscribers = self._subscribers.get(message_id)
+        if subscribers:
+            message = protocol.deserialize_payload(message_id, payload)
+            for queue in subscribers:
+                queue.put_nowait((message, received_time, address))
+        elif self._client is not None:
+            clock_synchronizer = self._client._clock_synchronizer
+            if not clock_synchronizer.estimator.synchronized:
+                if message_id == protocol.MessageId.FrameOfData:
+                    # Frames can't be timestamped until the first echo response, so keep them until then
+                    if len(self._early_packets) >= self._max_queued_frames:
+                        self._early_packets.popleft()
+                        self.dropped_frame_count += 1
+                    self._early_packets.append((packet, received_time))
+                else:
+                    self._client._handle_packet(message_id, payload, received_time)
+                return
+            # Handle any frames which arrived before this one first, so they're still in order
+            self._handle_early_packets()
+            self._client._handle_packet(message_id, payload, received_time)
+            clock_synchronizer.update(self._conn)
+        else:
+            self._log.debug('Ignoring %s message while connecting', message_id.name)
+
+    def _keep_alive(self):
+        """Send a KeepAlive message to a unicast server, and schedule the next one.
+
+        This runs on a timer rather than when packets arrive, so that the subscription is renewed
+        even if frames stop arriving for a while.
+        """
+        self._conn.send_keep_alive()
+        self._keep_alive_handle = asyncio.get_event_loop().call_later(self._conn.keep_alive_interval,
+                                                                      self._keep_alive)
+
+    def _handle_early_packets(self):
+        while self._early_packets:
+            packet, received_time = self._early_packets.popleft()
+            message_id, payload = protocol.deserialize_header(packet)
+            self._client._handle_packet(message_id, payload, received_time)
+
+    def _enqueue_frame(self, frame, timing):
+        if self._frames.full():
+            self._frames.get_nowait()
+            self.dropped_frame_count += 1
+        self._frames.put_nowait((frame, timing))
+
+    async def echo(self, timeout=0.1):
+        """Send an echo request, wait for the response, and use it to synchronize clocks.
+
+        Raises :class:`asyncio.TimeoutError` if there is no response within `timeout`.
+
+        Returns:
+            :class:`~natnet.protocol.EchoResponseMessage`:
+        """
+        clock_synchronizer = self._client._clock_synchronizer
+        queue = self._subscribe(protocol.MessageId.EchoResponse)
+        try:
+            clock_synchronizer.send_echo_request(self._conn)
+            response, received_time, _ = await asyncio.wait_for(queue.get(), timeout)
+        finally:
+            self._unsubscribe(protocol.MessageId.EchoResponse, queue)
+        clock_synchronizer.handle_echo_response(response, received_time)
+        return response
+
+    async def initial_sync(self, max_echoes=100, min_echoes=10, target_uncertainty=25e-6, max_outstanding=4,
+                           echo_timeout=0.1, timeout=2.0):
+        """Exchange a series of echoes with the server until the clock estimate converges.
+
+        See :func:`~natnet.comms.ClockSynchronizer.initial_sync` for the arguments.
+
+        Returns:
+            bool: Whether the estimate converged
+        """
+        sync = _InitialSync(self._client._clock_synchronizer, max_echoes, min_echoes, target_uncertainty,
+                            max_outstanding, echo_timeout, timeout)
+        queue = self._subscribe(protocol.MessageId.EchoResponse)
+        try:
+            while not sync.done:
+                sync.send_echo_requests(self._conn)
+                if sync.done:
+                    break
+                try:
+                    response, received_time, _ = await asyncio.wait_for(queue.get(), echo_timeout)
+                except asyncio.TimeoutError:
+                    continue
+                sync.handle_echo_response(response, received_time)
+                while not queue.empty():
+                    response, received_time, _ = queue.get_nowait()
+                    sync.handle_echo_response(response, received_time)
+        finally:
+            self._unsubscribe(protocol.MessageId.EchoResponse, queue)
+        return sync.finish()
+
+    async def request_model_definitions(self, timeout=None):
+        """Request model definitions from the server and wait for them to arrive.
+
+        The model callback is called as usual (see :func:`set_model_callback`).
+
+        Returns:
+            :class:`~natnet.protocol.ModelDefinitionsMessage`:
+        """
+        queue = self._subscribe(protocol.MessageId.ModelDef)
+        try:
+            self._conn.send_message(protocol.RequestModelDefinitionsMessage())
+            model_definitions_message, _, _ = await asyncio.wait_for(queue.get(), timeout)
+        finally:
+            self._unsubscribe(protocol.MessageId.ModelDef, queue)
+        self._client._handle_model_definitions(model_definitions_message)
+        return model_definitions_message
+
+    def set_model_callback(self, callback):
+        """Set the model definition callback (see :func:`natnet.comms.Client.set_model_callback`)."""
+        self._client.set_model_callback(callback)
+
+    def frames(self):
+        """Iterate asynchronously over received frames, until the client is closed.
+
+        Yields:
+            tuple[:class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage`,
+            :class:`~natnet.comms.TimestampAndLatency`]:
+        """
+        return _FrameIterator(self._frames)
+
+    def close(self):
+        """Close the transports and end iteration over :func:`frames`."""
+        if self._keep_alive_handle is not None:
+            self._keep_alive_handle.cancel()
+            self._keep_alive_handle = None
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+        while not self._frames.empty():
+            self._frames.get_nowait()
+        self._frames.put_nowait(None)
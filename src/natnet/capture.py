@@ -0,0 +1,324 @@
+# coding: utf-8
+"""Reading NatNet traffic from packet captures.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+This reads pcap and pcapng files (e.g., from Wireshark or tcpdump) directly, and extracts the
+payloads of UDP packets to or from the NatNet ports.  Fragmented IPv4 packets (which large mocap
+frames usually are) are reassembled.  Only IPv4 over Ethernet, Linux cooked capture, BSD loopback
+and raw IP link types are supported; anything else is skipped.
+"""
+
+__all__ = ['Capture', 'CaptureError']
+
+import collections
+import io
+import socket
+import struct
+
+from . import protocol
+from .logging import Logger
+
+_PCAP_MAGIC_US = 0xa1b2c3d4
+_PCAP_MAGIC_NS = 0xa1b23c4d
+_PCAPNG_SECTION_HEADER = 0x0a0d0d0a
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+# pcapng block types
+_INTERFACE_DESCRIPTION = 1
+_OBSOLETE_PACKET = 2
+_SIMPLE_PACKET = 3
+_ENHANCED_PACKET = 6
+
+# pcapng interface description option giving timestamp resolution
+_IF_TSRESOL = 9
+
+# Link types
+_LINKTYPE_NULL = 0
+_LINKTYPE_ETHERNET = 1
+_LINKTYPE_RAW = 101
+_LINKTYPE_LINUX_SLL = 113
+_LINKTYPE_IPV4 = 228
+
+_ETHERTYPE_IPV4 = 0x0800
+_ETHERTYPE_VLAN = (0x8100, 0x88a8)
+_IPPROTO_UDP = 17
+
+_ipv4_header_t = struct.Struct('!BBHHHBBH4s4s')
+_udp_header_t = struct.Struct('!HHHH')
+_natnet_header_t = struct.Struct('<HH')
+
+# Incomplete datagrams are dropped once their first fragment is this old (in capture time), like
+# Linux's default ipfrag_time, or when there are too many of them
+_FRAGMENT_TIMEOUT = 30.0
+_MAX_INCOMPLETE_DATAGRAMS = 64
+
+
+class CaptureError(Exception):
+    pass
+
+
+class Capture(object):
+
+    """Packet capture file containing NatNet traffic.
+
+    Packets are timestamped with the capture time, in seconds since the epoch.  Simple packet
+    blocks in pcapng files have no timestamp, so they are given the timestamp of the previous packet
+    (or 0 if there isn't one).
+    """
+
+    def __init__(self, file_, ports=(1510, 1511), logger=Logger()):
+        """
+        Args:
+            file_: Binary file object open for reading
+            ports (tuple[int]): Only read UDP packets to or from these ports (the default NatNet
+                command and data ports), or None to read every UDP packet
+            logger (:class:`~natnet.logging.Logger`):
+        """
+        self._file = file_
+        self._ports = ports
+        self._log = logger
+
+    @classmethod
+    def open(cls, filename, ports=(1510, 1511), logger=Logger()):
+        return cls(io.open(filename, 'rb'), ports, logger)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read(self, n):
+        data = self._file.read(n)
+        if len(data) < n:
+            if data:
+                raise CaptureError('Truncated capture file')
+            raise EOFError
+        return data
+
+    def _captured_frames(self):
+        """Iterate over link-layer frames in the capture, as (link type, frame, timestamp)."""
+        self._file.seek(0)
+        magic = self._read(4)
+        self._file.seek(0)
+        if struct.unpack('<I', magic)[0] == _PCAPNG_SECTION_HEADER:
+            return self._pcapng_frames()
+        return self._pcap_frames()
+
+    def _pcap_frames(self):
+        header = self._read(24)
+        for byte_order in '<>':
+            magic, = struct.unpack(byte_order + 'I', header[:4])
+            if magic in (_PCAP_MAGIC_US, _PCAP_MAGIC_NS):
+                break
+        else:
+            raise CaptureError('Not a pcap or pcapng file')
+        resolution = 1e-6 if magic == _PCAP_MAGIC_US else 1e-9
+        link_type = struct.unpack(byte_order + 'I', header[20:])[0] & 0xffff
+        record_header_t = struct.Struct(byte_order + 'IIII')
+        while True:
+            try:
+                seconds, fraction, captured_length, _ = record_header_t.unpack(self._read(record_header_t.size))
+            except EOFError:
+                return
+            yield link_type, self._read(captured_length), seconds + fraction*resolution
+
+    def _pcapng_frames(self):
+        byte_order = '<'
+        interfaces = []  # type: list[tuple[int, float]]
+        timestamp = 0.0
+        while True:
+            try:
+                block_type, block_length = struct.unpack(byte_order + 'II', self._read(8))
+            except EOFError:
+                return
+            if block_type == _PCAPNG_SECTION_HEADER:
+                # Byte order is given by the magic number which follows, and can change between sections
+                body = self._read(4)
+                byte_order = '<' if struct.unpack('<I', body)[0] == _PCAPNG_BYTE_ORDER_MAGIC else '>'
+                block_length, = struct.unpack(byte_order + 'I', struct.pack('<I', block_length))
+                body += self._read(block_length - 12)
+                interfaces = []
+            else:
+                body = self._read(block_length - 8)
+            body = body[:-4]  # Trailing block length
+
+            if block_type == _INTERFACE_DESCRIPTION:
+                link_type, = struct.unpack_from(byte_order + 'H', body)
+                interfaces.append((link_type, self._pcapng_timestamp_resolution(body[8:], byte_order)))
+            elif block_type in (_ENHANCED_PACKET, _OBSOLETE_PACKET):
+                if block_type == _ENHANCED_PACKET:
+                    interface, high, low, captured_length = struct.unpack_from(byte_order + 'IIII', body)
+                else:
+                    interface, _, high, low, captured_length = struct.unpack_from(byte_order + 'HHIII', body)
+                link_type, resolution = interfaces[interface]
+                timestamp = ((high << 32) + low)*resolution
+                yield link_type, body[20:20 + captured_length], timestamp
+            elif block_type == _SIMPLE_PACKET:
+                # No timestamp, so use the previous packet's
+                link_type, _ = interfaces[0]
+                yield link_type, body[4:], timestamp
+
+    @staticmethod
+    def _pcapng_timestamp_resolution(options, byte_order):
+        offset = 0
+        while offset + 4 <= len(options):
+            code, length = struct.unpack_from(byte_order + 'HH', options, offset)
+            if code == 0:
+                break
+            if code == _IF_TSRESOL:
+                value = bytearray(options[offset + 4:offset + 5])[0]
+                if value & 0x80:
+                    return 2.0**-(value & 0x7f)
+                return 10.0**-value
+            offset += 4 + (length + 3)//4*4
+        return 1e-6
+
+    @staticmethod
+    def _ipv4_packet(link_type, frame):
+        """Get the IPv4 packet from a link-layer frame, or None if it isn't one."""
+        if link_type == _LINKTYPE_ETHERNET:
+            ethertype, = struct.unpack_from('!H', frame, 12)
+            offset = 14
+            while ethertype in _ETHERTYPE_VLAN:
+                ethertype, = struct.unpack_from('!H', frame, offset + 2)
+                offset += 4
+        elif link_type == _LINKTYPE_LINUX_SLL:
+            ethertype, = struct.unpack_from('!H', frame, 14)
+            offset = 16
+        elif link_type == _LINKTYPE_NULL:
+            # Address family in host byte order of the capturing machine
+            family = struct.unpack_from('<I', frame)[0]
+            if family > 0xffff:
+                family, = struct.unpack_from('>I', frame)
+            ethertype = _ETHERTYPE_IPV4 if family == socket.AF_INET else None
+            offset = 4
+        elif link_type in (_LINKTYPE_RAW, _LINKTYPE_IPV4):
+            ethertype = _ETHERTYPE_IPV4 if bytearray(frame[:1])[0] >> 4 == 4 else None
+            offset = 0
+        else:
+            return None
+        if ethertype != _ETHERTYPE_IPV4:
+            return None
+        return frame[offset:]
+
+    def _udp_datagrams(self):
+        """Iterate over UDP datagrams, reassembling fragments, as (source, destination, payload, timestamp)."""
+        fragments = collections.OrderedDict()
+        for link_type, frame, timestamp in self._captured_frames():
+            packet = self._ipv4_packet(link_type, frame)
+            if packet is None or len(packet) < _ipv4_header_t.size:
+                continue
+            version_ihl, _, total_length, identification, flags_offset, _, ip_protocol, _, source, destination = \
+                _ipv4_header_t.unpack_from(packet)
+            if ip_protocol != _IPPROTO_UDP:
+                continue
+            data = packet[(version_ihl & 0xf)*4:total_length]
+
+            more_fragments = flags_offset & 0x2000
+            fragment_offset = (flags_offset & 0x1fff)*8
+            if more_fragments or fragment_offset:
+                key = (source, destination, identification)
+                self._expire_fragments(fragments, key, timestamp)
+                _, parts, total = fragments.setdefault(key, (timestamp, [], [None]))
+                parts.append((fragment_offset, data))
+                if not more_fragments:
+                    total[0] = fragment_offset + len(data)
+                if total[0] is None or sum(len(part) for _, part in parts) < total[0]:
+                    continue
+                del fragments[key]
+                data = b''.join(part for _, part in sorted(parts, key=lambda p: p[0]))
+
+            if len(data) < _udp_header_t.size:
+                # Cut off by the capture's snapshot length
+                continue
+            source_port, destination_port, length, _ = _udp_header_t.unpack_from(data)
+            if self._ports is not None and source_port not in self._ports and \
+                    destination_port not in self._ports:
+                continue
+            yield ((socket.inet_ntoa(source), source_port), (socket.inet_ntoa(destination), destination_port),
+                   data[_udp_header_t.size:length], timestamp)
+
+    def _expire_fragments(self, fragments, key, timestamp):
+        """Drop incomplete datagrams which have timed out, and make room for a new one with the given key.
+
+        Fragments are kept in order of arrival of each datagram's first fragment, as
+        (source, destination, identification): (first timestamp, parts, [total length]).
+        """
+        while fragments:
+            oldest_key, (first_timestamp, _, _) = next(iter(fragments.items()))
+            if timestamp - first_timestamp < _FRAGMENT_TIMEOUT and \
+                    (key in fragments or len(fragments) < _MAX_INCOMPLETE_DATAGRAMS):
+                break
+            del fragments[oldest_key]
+            self._log.debug('Dropping incomplete datagram from %s', socket.inet_ntoa(oldest_key[0]))
+
+    def packets(self):
+        """Iterate over the NatNet packets in the capture.
+
+        Yields:
+            tuple[bytes, float]: Raw packet and capture timestamp
+        """
+        for _, _, packet, timestamp in self._udp_datagrams():
+            yield packet, timestamp
+
+    def packets_with_addresses(self):
+        """Iterate over the NatNet packets in the capture, along with their sources and destinations.
+
+        Yields:
+            tuple[bytes, float, tuple[str, int], tuple[str, int]]: Raw packet, capture timestamp,
+            source address and destination address
+        """
+        for source, destination, packet, timestamp in self._udp_datagrams():
+            yield packet, timestamp, source, destination
+
+    def _message_headers(self):
+        for packet, timestamp in self.packets():
+            if len(packet) < _natnet_header_t.size or \
+                    _natnet_header_t.unpack_from(packet)[1] != len(packet) - _natnet_header_t.size:
+                # Probably cut off by the capture's snapshot length
+                self._log.warning('Skipping truncated packet captured at %s', timestamp)
+                continue
+            try:
+                message_id, payload = protocol.deserialize_header(packet)
+            except ValueError:
+                # Unknown message ID
+                continue
+            yield message_id, payload, timestamp
+
+    def messages(self, version=protocol.Version(3)):
+        """Iterate over the NatNet messages in the capture, deserializing them.
+
+        Packets with unknown message IDs, truncated packets and messages which aren't implemented are
+        skipped.
+
+        Yields:
+            tuple[message, float]: Message and capture timestamp
+        """
+        for message_id, payload, timestamp in self._message_headers():
+            try:
+                message = protocol.deserialize_payload(message_id, payload, version)
+            except KeyError:
+                # No implementation for this message type
+                continue
+            yield message, timestamp
+
+    def frames(self, version=protocol.Version(3)):
+        """Iterate over the mocap frames in the capture.
+
+        Yields:
+            tuple[:class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage`, float]: Frame and
+            capture timestamp
+        """
+        for message_id, payload, timestamp in self._message_headers():
+            if message_id == protocol.MessageId.FrameOfData:
+                yield protocol.deserialize_payload(message_id, payload, version), timestamp
@@ -12,20 +12,37 @@ Note that all local timestamps (e.g. packet reception time) are from :func:`time
 """
 
 import collections
+import enum
+import errno
+import heapq
+import math
+import numbers
 import select
 import socket
 import struct
+import threading
 import timeit
 
 import attr
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from . import protocol
 from .logging import Logger
 from .protocol.MocapFrameMessage import LabelledMarker
-from .protocol.ModelDefinitionsMessage import (MarkersetDescription, RigidBodyDescription,
-                                               SkeletonDescription)
+from .protocol.ModelDefinitionsMessage import ModelIndex
+from .protocol.common import ParseBuffer
+from .telemetry import FrameSequence, FrameStatus, FrameTelemetry
+
+__all__ = ['Client', 'Connection', 'TimestampAndLatency', 'TimestampAndLatencyArrays', 'BackgroundReceiver',
+           'OverflowPolicy',
+           'ClockSynchronizer', 'ClockEstimator', 'CristianClockEstimator', 'KalmanClockEstimator']
 
-__all__ = ['Client', 'Connection', 'TimestampAndLatency']
+# Not available on Windows
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', None)
 
 
 @attr.s
@@ -35,12 +52,35 @@ class Connection(object):
 
     Attributes:
         last_sender_address (tuple[str, int]): Sending IP and port of last packet received.
+        receive_buffer_count (int): Number of preallocated buffers used by :func:`wait_for_packets_raw`
     """
 
     _command_socket = attr.ib()  # type: socket.socket
     _data_socket = attr.ib()  # type: socket.socket
     _command_address = attr.ib()  # type: tuple[str, int]
     last_sender_address = attr.ib(None)
+    receive_buffer_count = attr.ib(64)  # type: int
+    _receive_buffers = attr.ib(attr.Factory(list))  # type: list[bytearray]
+    _next_receive_buffer = attr.ib(0)  # type: int
+    _recorder = attr.ib(None)  # type: natnet.recording.Recorder
+    _requeued_packets = attr.ib(attr.Factory(collections.deque))  # type: collections.deque
+    _last_keep_alive_time = attr.ib(None)  # type: float
+
+    # How often :func:`keep_alive` sends KeepAlive messages
+    keep_alive_interval = 1.0
+
+    def set_recorder(self, recorder):
+        """Pass every packet received to a recorder (see :class:`~natnet.recording.Recorder`), or None to stop."""
+        self._recorder = recorder
+
+    @property
+    def sockets(self):
+        """Command and data sockets, for waiting on along with other sockets.
+
+        Returns:
+            list[socket.socket]:
+        """
+        return [self._command_socket, self._data_socket]
 
     def set_server_address(self, server=None, command_port=None):
         current_server, current_command_port = self._command_address
@@ -61,6 +101,25 @@ class Connection(object):
         # Bind to data port
         self._data_socket.bind(('', data_port))
 
+    def bind_unicast_data_socket(self):
+        """Bind data socket to any free port, to receive mocap frames from a server in unicast mode.
+
+        A unicast server sends frames to wherever KeepAlive messages come from, so use
+        :func:`send_keep_alive` to start receiving them (and keep doing so).
+        """
+        self._data_socket.bind(('', 0))
+
+    def send_keep_alive(self):
+        """Send a KeepAlive message from the data socket, so a unicast server keeps sending frames to it."""
+        self._data_socket.sendto(protocol.serialize(protocol.KeepAliveMessage()), self._command_address)
+
+    def keep_alive(self):
+        """Send a KeepAlive message if one hasn't been sent in the last :attr:`keep_alive_interval` seconds."""
+        now = timeit.default_timer()
+        if self._last_keep_alive_time is None or now - self._last_keep_alive_time > self.keep_alive_interval:
+            self.send_keep_alive()
+            self._last_keep_alive_time = now
+
     @classmethod
     def open(cls, server, command_port=1510, multicast_addr=None, data_port=None):
         """Open a connection to a NatNet server.
@@ -101,6 +160,89 @@ class Connection(object):
             self._data_socket.close()
             self._data_socket = None
 
+    def _select(self, timeout):
+        """Wait until either socket is readable, and return the readable sockets."""
+        sockets = self.sockets
+        readable, _, exceptional = select.select(sockets, [], sockets, timeout)
+
+        for s in exceptional:
+            which = 'command' if s is self._command_socket else 'data'
+            raise IOError('Something went wrong with the', which, 'socket')
+
+        return readable
+
+    def _receive_into_buffer(self, sock, flags=0):
+        """Receive one packet into the next buffer in the ring.
+
+        Returns:
+            tuple[memoryview, float]: Raw packet and received timestamp
+        """
+        if not self._receive_buffers:
+            self._receive_buffers = [bytearray(32768) for i in range(self.receive_buffer_count)]
+        buffer_ = self._receive_buffers[self._next_receive_buffer]
+        size, self.last_sender_address = sock.recvfrom_into(buffer_, 0, flags)
+        received_time = timeit.default_timer()  # type: float
+        self._next_receive_buffer = (self._next_receive_buffer + 1) % len(self._receive_buffers)
+        return memoryview(buffer_)[:size], received_time
+
+    def _receive_all(self, sock, max_packets):
+        """Receive every packet queued on a readable socket, up to `max_packets`."""
+        packets = [self._receive_into_buffer(sock)]
+        while len(packets) < max_packets:
+            if _MSG_DONTWAIT is None:
+                # No non-blocking receive on this platform, so poll instead
+                readable, _, _ = select.select([sock], [], [], 0)
+                if not readable:
+                    break
+            try:
+                packets.append(self._receive_into_buffer(sock, _MSG_DONTWAIT or 0))
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                break
+        return packets
+
+    def wait_for_packets_raw(self, timeout=None, max_packets=None):
+        """Return every packet queued on either socket as raw bytes, waiting for at least one.
+
+        Packets are received into a ring of :attr:`receive_buffer_count` preallocated buffers rather
+        than into new bytes objects, so each packet is only valid until its buffer is reused; copy any
+        packets you need to keep for longer.
+
+        Args:
+            timeout (float): Timeout in seconds
+            max_packets (int): Maximum number of packets to return (at most
+                :attr:`receive_buffer_count`, which is the default)
+
+        Returns:
+            list[tuple[memoryview, float]]: Raw packets and received timestamps, or an empty list if a
+            timeout occurred
+        """
+        if max_packets is None or max_packets > self.receive_buffer_count:
+            max_packets = self.receive_buffer_count
+        if self._requeued_packets:
+            requeued = self._requeued_packets
+            return [requeued.popleft() for i in range(min(max_packets, len(requeued)))]
+        packets = []
+        for s in self._select(timeout):
+            if len(packets) < max_packets:
+                packets.extend(self._receive_all(s, max_packets - len(packets)))
+        if self._recorder:
+            for packet, received_time in packets:
+                self._recorder.record(packet, received_time)
+        return packets
+
+    def wait_for_packets(self, timeout=None, max_packets=None):
+        """Return every packet queued, deserializing the headers but not the payloads.
+
+        See :func:`wait_for_packets_raw`.
+
+        Returns:
+            list[tuple[MessageId, ParseBuffer, float]]:
+        """
+        return [protocol.deserialize_header(packet) + (received_time,)
+                for packet, received_time in self.wait_for_packets_raw(timeout, max_packets)]
+
     def wait_for_packet_raw(self, timeout=None):
         """Return the next packet to arrive on either socket as raw bytes.
 
@@ -111,12 +253,13 @@ class Connection(object):
             tuple[bytes, float]: Raw packet and received timestamp, or (None, None) if a timeout
             occurred
         """
-        sockets = [self._command_socket, self._data_socket]
-        readable, _, exceptional = select.select(sockets, [], sockets, timeout)
+        if self._requeued_packets:
+            return self._requeued_packets.popleft()
+        return self._receive_packet_raw(timeout)
 
-        for s in exceptional:
-            which = 'command' if s is self._command_socket else 'data'
-            raise IOError('Something went wrong with the', which, 'socket')
+    def _receive_packet_raw(self, timeout=None):
+        """Receive the next packet from either socket, ignoring any requeued packets."""
+        readable = self._select(timeout)
 
         data = None
         received_time = None
@@ -124,6 +267,8 @@ class Connection(object):
             # Just get the first message this time around
             data, self.last_sender_address = readable[0].recvfrom(32768)  # type: bytes
             received_time = timeit.default_timer()  # type: float
+            if self._recorder:
+                self._recorder.record(data, received_time)
 
         return data, received_time
 
@@ -145,14 +290,42 @@ class Connection(object):
         message = protocol.deserialize(packet) if packet is not None else None
         return message, received_time
 
-    def wait_for_message_with_id(self, id_, timeout=None):
-        """Return the next message received of the given type, discarding any others."""
-        # TODO: There's probably a better way of doing this (that doesn't throw away other packets)
-        #       but it can wait until I see if that matters
-        while True:
-            message_id, payload, received_time = self.wait_for_packet(timeout)
-            if message_id == id_:
-                return protocol.deserialize_payload(message_id, payload), received_time
+    def wait_for_message_with_id(self, id_, timeout=None, keep_others=False):
+        """Return the next message received of the given type, discarding any others.
+
+        Args:
+            id_ (:class:`~natnet.protocol.MessageId`):
+            timeout (float): Timeout in seconds (for each packet)
+            keep_others (bool): Requeue any other packets received meanwhile (see
+                :func:`requeue_packets`) instead of discarding them
+        """
+        requeued = []
+        try:
+            while True:
+                if keep_others:
+                    packet, received_time = self._receive_packet_raw(timeout)
+                else:
+                    packet, received_time = self.wait_for_packet_raw(timeout)
+                if packet is None:
+                    continue
+                message_id, payload = protocol.deserialize_header(packet)
+                if message_id == id_:
+                    return protocol.deserialize_payload(message_id, payload), received_time
+                if keep_others:
+                    requeued.append((packet, received_time))
+        finally:
+            self.requeue_packets(requeued)
+
+    def requeue_packets(self, packets):
+        """Queue packets to be returned by the ``wait_for_packet*`` methods before any new ones.
+
+        This is for putting back packets which were received while waiting for something else.  The
+        packets are copied, so they can be views into the receive buffers.
+
+        Args:
+            packets (list[tuple[bytes, float]]): Raw packets and received timestamps
+        """
+        self._requeued_packets.extend((bytes(packet), received_time) for packet, received_time in packets)
 
     def send_packet(self, packet):
         self._command_socket.sendto(packet, self._command_address)
@@ -161,113 +334,422 @@ class Connection(object):
         self.send_packet(protocol.serialize(message))
 
 
+@attr.s
+class ClockEstimator(object):
+
+    """Estimate of the server clock, updated from echo measurements (see :class:`ClockSynchronizer`).
+
+    The server clock is modelled as running at a rate of ``1 + skew`` relative to the local clock,
+    so between measurements ``server_time = reference_server_time + (local_time -
+    reference_local_time)*(1 + skew)``.  Subclasses implement :meth:`add_measurement`, which moves
+    the reference point and updates the skew.
+
+    Attributes:
+        offset_uncertainty (float): Standard deviation of the server time estimate at the reference
+            point, in seconds, or None if the estimator doesn't track it
+        skew_uncertainty (float): Standard deviation of the skew estimate, or None if the estimator
+            doesn't track it
+    """
+
+    _reference_local_time = attr.ib(None, init=False)  # type: float
+    _reference_server_time = attr.ib(None, init=False)  # type: float
+    _skew = attr.ib(0.0, init=False)  # type: float
+    offset_uncertainty = attr.ib(None, init=False)  # type: float
+    skew_uncertainty = attr.ib(None, init=False)  # type: float
+
+    @property
+    def synchronized(self):
+        """Whether there has been at least one measurement."""
+        return self._reference_local_time is not None
+
+    @property
+    def last_synced_at(self):
+        """Local time of the last measurement which was used."""
+        return self._reference_local_time
+
+    @property
+    def skew(self):
+        """Rate of the server clock relative to the local clock, minus one."""
+        return self._skew
+
+    def add_measurement(self, local_time, server_time, rtt, min_rtt):
+        """Update the estimate with the result of an echo.
+
+        Args:
+            local_time (float): Local time the echo response was received
+            server_time (float): Server time at `local_time`, assuming the echo request and response
+                took the same time in transit
+            rtt (float): Round trip time of the echo
+            min_rtt (float): Minimum round trip time seen so far (no more than `rtt`)
+
+        Returns:
+            bool: Whether the measurement was used
+        """
+        raise NotImplementedError
+
+    def get_state(self):
+        """Get the current estimate, for :func:`set_state` on a copy of this estimator."""
+        return self._reference_server_time, self._reference_local_time, self._skew
+
+    def set_state(self, state):
+        self._reference_server_time, self._reference_local_time, self._skew = state
+
+    def local_to_server_time(self, local_time):
+        return self._reference_server_time + (local_time - self._reference_local_time)*(1 + self._skew)
+
+    def server_to_local_time(self, server_time):
+        return self._reference_local_time + (server_time - self._reference_server_time)/(1 + self._skew)
+
+
+@attr.s
+class CristianClockEstimator(ClockEstimator):
+
+    """Use echoes whose RTT is close to the minimum as they are, and ignore the rest.
+
+    The true server time falls within ``server_time +- (rtt - true_min_rtt)/2``.  We'd generally like
+    to be within 0.1ms of the actual time, which would require the RTT to be less than 0.1ms over the
+    minimum RTT.  However, I've measured clock skew of 0.03ms/s before, so if we start with a perfect
+    estimate and don't sync for 5 seconds we could already be out by 0.1ms.  Therefore the threshold
+    starts at 0.1ms and increases over time such that it's always a bit less than the potential
+    accumulated drift.  The skew is estimated from the corrections, but only slowly converges.
+    """
+
+    def add_measurement(self, local_time, server_time, rtt, min_rtt):
+        if not self.synchronized:
+            self._reference_local_time = local_time
+            self._reference_server_time = server_time
+            self.offset_uncertainty = (rtt - min_rtt)/2
+            return True
+
+        dt = local_time - self._reference_local_time
+        accumulated_drift = dt*0.05e-3  # Assume skew is severe and we have a bad estimate of it
+        rtt_threshold = min_rtt + max(0.1e-3, accumulated_drift)
+        if rtt >= rtt_threshold:
+            return False
+        drift = (server_time - self.local_to_server_time(local_time))/dt
+        self._reference_local_time = local_time
+        self._reference_server_time = server_time
+        self.offset_uncertainty = (rtt - min_rtt)/2
+        # This only works over a reasonably long time period
+        if dt > 1:
+            if self._skew == 0:
+                # Initialize
+                self._skew = drift
+            else:
+                # Slowly converge on the true skew
+                self._skew += drift/2
+        return True
+
+
+@attr.s
+class KalmanClockEstimator(ClockEstimator):
+
+    """Track the offset and skew between the clocks with a Kalman filter.
+
+    Every echo is used, weighted by its RTT: the server time from an echo could be out by up to
+    ``(rtt - min_rtt)/2`` (plus some asymmetry in the network which can't be measured), so that is
+    used as the standard deviation of the measurement.  An echo with a long RTT barely moves the
+    estimate, while a series of echoes close to the minimum RTT pins it down quickly.  The offset is
+    modelled as drifting at the skew plus white noise, and the skew as a random walk.
+
+    Attributes:
+        measurement_noise (float): Standard deviation of the measured server time for an echo with
+            the minimum RTT, in seconds
+        offset_noise (float): Standard deviation of the offset random walk, in seconds per root
+            second
+        skew_noise (float): Standard deviation of the skew random walk, per root second
+        initial_skew_uncertainty (float): Standard deviation of the skew before any measurements
+    """
+
+    measurement_noise = attr.ib(20e-6)  # type: float
+    offset_noise = attr.ib(1e-6)  # type: float
+    skew_noise = attr.ib(1e-7)  # type: float
+    initial_skew_uncertainty = attr.ib(100e-6)  # type: float
+    # Covariance of (offset, skew)
+    _p00 = attr.ib(0.0, init=False)  # type: float
+    _p01 = attr.ib(0.0, init=False)  # type: float
+    _p11 = attr.ib(0.0, init=False)  # type: float
+
+    def _update_uncertainty(self):
+        self.offset_uncertainty = math.sqrt(self._p00)
+        self.skew_uncertainty = math.sqrt(self._p11)
+
+    def add_measurement(self, local_time, server_time, rtt, min_rtt):
+        measurement_sd = (rtt - min_rtt)/2 + self.measurement_noise
+        r = measurement_sd*measurement_sd
+        if not self.synchronized:
+            self._reference_local_time = local_time
+            self._reference_server_time = server_time
+            self._p00 = r
+            self._p01 = 0.0
+            self._p11 = self.initial_skew_uncertainty**2
+            self._update_uncertainty()
+            return True
+
+        # Predict the state at local_time
+        dt = local_time - self._reference_local_time
+        abs_dt = abs(dt)
+        q_offset = self.offset_noise**2
+        q_skew = self.skew_noise**2
+        p00 = self._p00 + 2*dt*self._p01 + dt*dt*self._p11 + q_offset*abs_dt + q_skew*abs_dt**3/3
+        p01 = self._p01 + dt*self._p11 + q_skew*dt*dt/2
+        p11 = self._p11 + q_skew*abs_dt
+        predicted_server_time = self.local_to_server_time(local_time)
+
+        # Correct it using the measured offset
+        innovation = server_time - predicted_server_time
+        innovation_variance = p00 + r
+        k0 = p00/innovation_variance
+        k1 = p01/innovation_variance
+        self._reference_local_time = local_time
+        self._reference_server_time = predicted_server_time + k0*innovation
+        self._skew += k1*innovation
+        self._p00 = (1 - k0)*p00
+        self._p01 = (1 - k0)*p01
+        self._p11 = p11 - k1*p01
+        self._update_uncertainty()
+        return True
+
+
 @attr.s
 class ClockSynchronizer(object):
 
-    """Synchronize clocks with a NatNet server using Cristian's algorithm."""
+    """Synchronize clocks with a NatNet server using echoes.
+
+    Each echo gives the server's time when it received the request, which is converted to an
+    estimate of the server time when the response arrived using Cristian's algorithm and passed to
+    a :class:`ClockEstimator` (by default a :class:`KalmanClockEstimator`).  Several echo requests
+    can be in flight at once: each has a unique timestamp, and responses are matched to requests
+    by timestamp until the request expires.
+
+    Attributes:
+        expired_echo_count (int): Number of echo requests which expired without a response
+    """
 
     _server_info = attr.ib()
     _log = attr.ib()  # type: Logger
-    _last_server_time = attr.ib(None)
-    _last_synced_at = attr.ib(None)
+    _estimator = attr.ib(attr.Factory(KalmanClockEstimator))  # type: ClockEstimator
     _min_rtt = attr.ib(1e-3)
     _echo_count = attr.ib(0)
     _last_sent_time = attr.ib(None)
-    _skew = attr.ib(0)
-
-    def initial_sync(self, conn):
-        """Use a series of echoes to measure minimum round trip time.
+    _last_request_timestamp = attr.ib(None)  # type: int
+    _in_flight_echoes = attr.ib(attr.Factory(collections.OrderedDict))  # type: dict[int, float]
+    expired_echo_count = attr.ib(0)  # type: int
+    _recorder = attr.ib(None)  # type: natnet.recording.Recorder
+
+    # How long to wait for a response to an echo request, and how many requests can be in flight
+    _echo_timeout = 1.0
+    _max_in_flight_echoes = 64
+
+    def initial_sync(self, conn, max_echoes=100, min_echoes=10, target_uncertainty=25e-6,
+                     max_outstanding=4, echo_timeout=0.1, timeout=2.0):
+        """Exchange a series of echoes with the server until the clock estimate converges.
+
+        Up to `max_outstanding` echo requests are in flight at once, and responses are matched to
+        requests by their timestamps, so a slow or lost echo doesn't hold up the rest.  Syncing stops
+        once at least `min_echoes` responses have arrived and the estimator's offset uncertainty is
+        below `target_uncertainty`, or after `max_echoes` responses or `timeout` seconds.  Any other
+        packets which arrive meanwhile (e.g., frames) are requeued on the connection (see
+        :func:`Connection.requeue_packets`) rather than discarded.
 
         Args:
             conn (:class:`Connection`):
+            max_echoes (int): Maximum number of echo responses to use
+            min_echoes (int): Minimum number of echo responses to use
+            target_uncertainty (float): Offset uncertainty to stop at, in seconds
+            max_outstanding (int): Maximum number of echo requests in flight at once
+            echo_timeout (float): Give up on an echo request after this long
+            timeout (float): Give up on syncing after this long
+
+        Returns:
+            bool: Whether the estimate converged
         """
-        while self._echo_count < 100:
-            self.send_echo_request(conn)
-            response, received_time = conn.wait_for_message_with_id(protocol.MessageId.EchoResponse,
-                                                                    timeout=0.1)
-            if response is None:
-                self._log.warning('Timeout out while waiting for echo response {}'
-                                  .format(self._echo_count + 1))
-            self.handle_echo_response(response, received_time)
+        sync = _InitialSync(self, max_echoes, min_echoes, target_uncertainty, max_outstanding, echo_timeout,
+                            timeout)
+        others = []
+        try:
+            while not sync.done:
+                sync.send_echo_requests(conn)
+                if sync.done:
+                    break
+                for packet, received_time in conn.wait_for_packets_raw(echo_timeout):
+                    message_id, payload = protocol.deserialize_header(packet)
+                    if message_id != protocol.MessageId.EchoResponse:
+                        # Copy it out of the connection's receive buffer before it's reused
+                        others.append((bytes(packet), received_time))
+                        continue
+                    sync.handle_echo_response(protocol.deserialize_payload(message_id, payload), received_time)
+        finally:
+            conn.requeue_packets(others)
+        return sync.finish()
+
+    @property
+    def estimator(self):
+        """The :class:`ClockEstimator` in use."""
+        return self._estimator
+
+    @property
+    def skew(self):
+        """Estimated rate of the server clock relative to the local clock, minus one."""
+        return self._estimator.skew
+
+    @property
+    def offset_uncertainty(self):
+        """Standard deviation of the server time estimate as of the last echo, in seconds (or None)."""
+        return self._estimator.offset_uncertainty
+
+    @property
+    def skew_uncertainty(self):
+        """Standard deviation of the skew estimate (or None)."""
+        return self._estimator.skew_uncertainty
+
+    def set_recorder(self, recorder):
+        """Pass every new clock estimate to a recorder (see :class:`~natnet.recording.Recorder`), or None to stop."""
+        self._recorder = recorder
+        if recorder and self._estimator.synchronized:
+            recorder.record_clock_state(self._get_state(), timeit.default_timer())
+
+    def _get_state(self):
+        """Get the current clock estimate, for :func:`_set_state` on a copy of this synchronizer."""
+        return self._estimator.get_state()
+
+    def _set_state(self, state):
+        self._estimator.set_state(state)
 
     def server_ticks_to_seconds(self, server_ticks):
         return float(server_ticks)/self._server_info.high_resolution_clock_frequency
 
     def server_to_local_time(self, server_ticks):
         """Convert a NatNet HPC timestamp to local time (according to timeit.default_timer)."""
-        server_time = self.server_ticks_to_seconds(server_ticks)
-        server_time_since_last_sync = server_time - self._last_server_time
-        local_time = self._last_synced_at + server_time_since_last_sync*(1 + self._skew)
-        return local_time
+        return self._estimator.server_to_local_time(self.server_ticks_to_seconds(server_ticks))
 
     def local_to_server_time(self, local_time):
-        local_time_since_last_sync = local_time - self._last_synced_at
-        server_time = self._last_server_time + local_time_since_last_sync*(1 + self._skew)
-        return server_time
+        return self._estimator.local_to_server_time(local_time)
 
     def server_time_now(self):
         """Get the current time on the server's HPC."""
         return self.local_to_server_time(timeit.default_timer())
 
+    @property
+    def in_flight_echo_count(self):
+        """Number of echo requests waiting for a response."""
+        return len(self._in_flight_echoes)
+
+    def _expire_echoes(self, now, timeout=None):
+        """Forget echo requests sent more than `timeout` seconds before `now`."""
+        expired_before = now - (self._echo_timeout if timeout is None else timeout)
+        in_flight = self._in_flight_echoes
+        while in_flight and (next(iter(in_flight.values())) < expired_before or
+                             len(in_flight) >= self._max_in_flight_echoes):
+            request_timestamp, _ = in_flight.popitem(last=False)
+            self.expired_echo_count += 1
+            self._log.debug('Echo request {} expired without a response'.format(request_timestamp))
+
     def send_echo_request(self, conn):
-        self._last_sent_time = timeit.default_timer()
-        sent_timestamp_int = int(self._last_sent_time*1e9)
-        conn.send_message(protocol.EchoRequestMessage(sent_timestamp_int))
+        """Send an echo request with a unique timestamp, and remember it until the response arrives."""
+        sent_time = timeit.default_timer()
+        self._expire_echoes(sent_time)
+        request_timestamp = int(sent_time*1e9)
+        if self._last_request_timestamp is not None and request_timestamp <= self._last_request_timestamp:
+            request_timestamp = self._last_request_timestamp + 1
+        conn.send_message(protocol.EchoRequestMessage(request_timestamp))
+        self._last_sent_time = sent_time
+        self._last_request_timestamp = request_timestamp
+        self._in_flight_echoes[request_timestamp] = sent_time
 
     def handle_echo_response(self, response, received_time):
-        if response.request_timestamp != int(self._last_sent_time*1e9):
-            self._log.warning('Warning: echo response does not match last echo request ' +
-                              '(last sent at {}, received response for {})'
-                              .format(self._last_sent_time*1e9, response.request_timestamp))
-            return
-        rtt = received_time - self._last_sent_time
-        server_reception_time = self.server_ticks_to_seconds(response.received_timestamp)
-        if self._last_server_time is None:
-            # First echo, initialize
-            self._last_server_time = server_reception_time + rtt/2
-            self._last_synced_at = received_time
-            self._log.debug('First echo: RTT {:.2f}ms, server time {:.1f}'
-                            .format(1000*rtt, self._last_server_time))
-        else:
-            # The true server time falls within server_reception_time +- (rtt - true_min_rtt)/2.
-            # We'd generally like to be within 0.1ms of the actual time, which would require the RTT
-            # to be less than 0.1ms over the minimum RTT.  However, I've measured clock skew of
-            # 0.03ms/s before, so if we start with a perfect estimate and don't sync for 5 seconds we
-            # could already be out by 0.1ms.  Therefore our threshold should start at 0.05ms and
-            # increase over time such that it's always a bit less than our potential accumulated
-            # drift.
-            # TODO: Kalman filter
-            dt = received_time - self._last_synced_at
-            accumulated_drift = dt*0.05e-3  # Assume skew is severe and we have a bad estimate of it
-            rtt_threshold = self._min_rtt + max(0.05e-3, max(0.1e-3, accumulated_drift))
-            if rtt < rtt_threshold:
-                old_server_time_when_received = self.local_to_server_time(received_time)
-                self._last_server_time = server_reception_time + rtt/2
-                self._last_synced_at = received_time
-                correction = self._last_server_time - old_server_time_when_received
-                drift = correction/dt
-                # This only works over a reasonably long time period
-                if dt > 1:
-                    if self._skew == 0:
-                        # Initialize
-                        self._skew = -drift
-                    else:
-                        # Slowly converge on the true skew
-                        self._skew += drift/2
-                self._log.debug(
-                    ('Echo {: 5d}: RTT {:.2f}ms (min {:.2f}ms), server time {:.1f}s, ' +
-                     'dt {: .3f}s, correction {: .3f}ms, drift {:7.3f}ms/s, new skew: {: .3f}ms/s')
-                    .format(self._echo_count, 1000*rtt, 1000*self._min_rtt, self._last_server_time,
-                            dt, 1000*correction, 1000*drift, 1000*self._skew))
+        """Match an echo response to its request, and use it to update the clock estimate.
 
+        Returns:
+            bool: Whether the response matched an in-flight request
+        """
+        sent_time = self._in_flight_echoes.pop(response.request_timestamp, None)
+        if sent_time is None:
+            self._log.debug('Ignoring response to unknown or expired echo request {}'
+                            .format(response.request_timestamp))
+            return False
+        self._handle_echo(sent_time, response, received_time)
+        return True
+
+    def _handle_echo(self, sent_time, response, received_time):
+        """Pass the result of an echo to the estimator."""
+        rtt = received_time - sent_time
         if rtt < self._min_rtt:
             self._min_rtt = rtt
+        server_time = self.server_ticks_to_seconds(response.received_timestamp) + rtt/2
+        estimator = self._estimator
+        if not estimator.synchronized:
+            estimator.add_measurement(received_time, server_time, rtt, self._min_rtt)
+            self._log.debug('First echo: RTT {:.2f}ms, server time {:.1f}'.format(1000*rtt, server_time))
+        else:
+            old_server_time = estimator.local_to_server_time(received_time)
+            if estimator.add_measurement(received_time, server_time, rtt, self._min_rtt):
+                correction = estimator.local_to_server_time(received_time) - old_server_time
+                self._log.debug(
+                    ('Echo {: 5d}: RTT {:.2f}ms (min {:.2f}ms), server time {:.1f}s, ' +
+                     'correction {: .3f}ms, skew {: .3f}ms/s')
+                    .format(self._echo_count, 1000*rtt, 1000*self._min_rtt, server_time,
+                            1000*correction, 1000*estimator.skew))
+        if self._recorder:
+            self._recorder.record_clock_state(self._get_state(), received_time)
         self._echo_count += 1
 
+    def convert_timestamps(self, camera_mid_exposure_timestamps, transmit_timestamps, received_timestamps=None,
+                           history=None):
+        """Calculate local timestamps and latencies for many frames at once.
+
+        This is the vectorised counterpart of the timing passed to the frame callback (see
+        :class:`TimestampAndLatency`), for reprocessing recorded frames.  Requires NumPy.
+
+        Args:
+            camera_mid_exposure_timestamps (numpy.ndarray): HPC timestamps of each frame (see
+                :class:`~natnet.protocol.MocapFrameMessage.TimingInfo`)
+            transmit_timestamps (numpy.ndarray): HPC timestamps of each frame
+            received_timestamps (numpy.ndarray): Local time each frame was received, if known
+            history (list[tuple[float, tuple]]): Clock estimates as (local time, state), in order
+                (e.g., from :func:`~natnet.recording.Recording.clock_states`).  Each frame is
+                converted using the last estimate made before it was received, as the client would
+                have done live, which requires `received_timestamps`.  By default, the current
+                estimate is used for every frame.
+
+        Returns:
+            :class:`TimestampAndLatencyArrays`:
+        """
+        if np is None:
+            raise ImportError('NumPy is required for batch timestamp conversion')
+        camera_mid_exposure_timestamps = np.asarray(camera_mid_exposure_timestamps)
+        transmit_timestamps = np.asarray(transmit_timestamps)
+        if history is None:
+            reference_server_time, reference_local_time, skew = self._get_state()
+        else:
+            if received_timestamps is None:
+                raise ValueError('Received timestamps are required to convert using a clock history')
+            state_times = np.array([local_time for local_time, _ in history], dtype=np.float64)
+            states = np.array([state for _, state in history], dtype=np.float64).reshape(-1, 3)
+            # Frames received before the first estimate use the first estimate
+            i = np.searchsorted(state_times, received_timestamps, side='right') - 1
+            reference_server_time, reference_local_time, skew = states[np.maximum(i, 0)].T
+
+        frequency = float(self._server_info.high_resolution_clock_frequency)
+
+        def to_local_time(server_ticks):
+            server_time = server_ticks.astype(np.float64)/frequency
+            return reference_local_time + (server_time - reference_server_time)/(1 + skew)
+
+        timestamp = to_local_time(camera_mid_exposure_timestamps)
+        system_latency_ticks = transmit_timestamps.astype(np.int64) - camera_mid_exposure_timestamps.astype(np.int64)
+        system_latency = system_latency_ticks.astype(np.float64)/frequency
+        transit_latency = None
+        if received_timestamps is not None:
+            transit_latency = np.asarray(received_timestamps) - to_local_time(transmit_timestamps)
+        return TimestampAndLatencyArrays(timestamp, system_latency, transit_latency)
+
     def update(self, conn):
         now = timeit.default_timer()
-        time_since_last_echo = now - self._last_sent_time
-        time_since_last_sync = now - self._last_synced_at
+        time_since_last_echo = float('inf') if self._last_sent_time is None else now - self._last_sent_time
+        time_since_last_sync = float('inf')
+        if self._estimator.synchronized:
+            time_since_last_sync = now - self._estimator.last_synced_at
 
         minimum_time_between_echo_requests = 0.5
         if time_since_last_sync > 5:
@@ -278,6 +760,60 @@ class ClockSynchronizer(object):
             self.send_echo_request(conn)
 
 
+@attr.s
+class _InitialSync(object):
+
+    """Progress of an initial clock sync (see :func:`ClockSynchronizer.initial_sync`).
+
+    This only decides when to send echo requests and when to stop, so that the same sync can be
+    driven by blocking receives or by asyncio (see :func:`natnet.aio.AsyncClient.initial_sync`).
+    """
+
+    _clock = attr.ib()  # type: ClockSynchronizer
+    _max_echoes = attr.ib(100)  # type: int
+    _min_echoes = attr.ib(10)  # type: int
+    _target_uncertainty = attr.ib(25e-6)  # type: float
+    _max_outstanding = attr.ib(4)  # type: int
+    _echo_timeout = attr.ib(0.1)  # type: float
+    _timeout = attr.ib(2.0)  # type: float
+    _start_time = attr.ib(attr.Factory(timeit.default_timer))  # type: float
+    responses = attr.ib(0)  # type: int
+    converged = attr.ib(False)  # type: bool
+    done = attr.ib(False)  # type: bool
+
+    def send_echo_requests(self, conn):
+        """Expire echo requests which have timed out, and send more up to the limit in flight."""
+        now = timeit.default_timer()
+        if now - self._start_time > self._timeout:
+            self._clock._log.warning('Timed out synchronizing clocks after {} echoes'.format(self.responses))
+            self.done = True
+            return
+        clock = self._clock
+        clock._expire_echoes(now, self._echo_timeout)
+        while clock.in_flight_echo_count < self._max_outstanding and \
+                self.responses + clock.in_flight_echo_count < self._max_echoes:
+            clock.send_echo_request(conn)
+
+    def handle_echo_response(self, response, received_time):
+        if self._clock.handle_echo_response(response, received_time):
+            self.responses += 1
+        estimator = self._clock.estimator
+        uncertainty = estimator.offset_uncertainty
+        self.converged = estimator.synchronized and (uncertainty is None or uncertainty < self._target_uncertainty)
+        if self.responses >= self._max_echoes or (self.responses >= self._min_echoes and self.converged):
+            self.done = True
+
+    def finish(self):
+        """Log how the sync went.
+
+        Returns:
+            bool: Whether the estimate converged
+        """
+        self._clock._log.debug('Synchronized clocks with {} echoes in {:.1f}ms'
+                               .format(self.responses, 1000*(timeit.default_timer() - self._start_time)))
+        return self.converged
+
+
 @attr.s
 class TimestampAndLatency(object):
 
@@ -317,10 +853,166 @@ class TimestampAndLatency(object):
         return self.system_latency + self.transit_latency + self.processing_latency
 
 
+@attr.s
+class TimestampAndLatencyArrays(object):
+
+    """Timing information for many mocap frames (see :func:`ClockSynchronizer.convert_timestamps`).
+
+    Attributes:
+        timestamp (numpy.ndarray): Camera mid-exposure timestamps (according to local clock)
+        system_latency (numpy.ndarray): Times from camera mid-exposure to Motive transmitting frame
+        transit_latency (numpy.ndarray): Times from transmitting frame to receiving frame, or None
+            if received times weren't given
+    """
+
+    timestamp = attr.ib()
+    system_latency = attr.ib()
+    transit_latency = attr.ib()
+
+
+class OverflowPolicy(enum.Enum):
+
+    """What to do with a packet when a :class:`BackgroundReceiver`'s queue is full.
+
+    Attributes:
+        DropOldest: Discard the oldest queued packet to make room
+        DropNewest: Discard the new packet
+        Block: Stop receiving until there is room (which delays the next packet's timestamp)
+    """
+
+    DropOldest = 'drop_oldest'
+    DropNewest = 'drop_newest'
+    Block = 'block'
+
+
+class BackgroundReceiver(object):
+
+    """Receive packets on a background thread and queue them for processing on another.
+
+    The background thread only receives and timestamps packets, so the received timestamps aren't
+    delayed by parsing or callbacks.  This has the same ``wait_for_packet*`` methods as
+    :class:`Connection`, so it can be used in its place to receive packets.  Any exception raised on
+    the background thread is raised again by these once the queue is empty.
+
+    Attributes:
+        dropped_packet_count (int): Number of packets dropped because the queue was full
+    """
+
+    def __init__(self, conn, max_queued_packets=100, overflow=OverflowPolicy.DropOldest, logger=Logger()):
+        """
+        Args:
+            conn (:class:`Connection`):
+            max_queued_packets (int): Queue size
+            overflow (:class:`OverflowPolicy`): What to do when the queue is full
+            logger (:class:`~logging.Logger`):
+        """
+        assert max_queued_packets >= 1
+        self._conn = conn
+        self._max_queued_packets = max_queued_packets
+        self._overflow = overflow
+        self._log = logger
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._error = None
+        self.dropped_packet_count = 0
+
+    def start(self):
+        """Start the background thread."""
+        assert self._thread is None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='natnet receiver')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and wait for it to exit."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while self._running:
+                packets = self._conn.wait_for_packets_raw(timeout=0.1)
+                if packets:
+                    # Copy packets out of the connection's receive buffers, which will be reused
+                    self._put([(bytes(packet), received_time) for packet, received_time in packets])
+        except BaseException as e:
+            if not isinstance(e, SystemExit):
+                self._log.error('Receiver thread exiting due to error: %s', e)
+            with self._condition:
+                self._error = e
+                self._running = False
+                self._condition.notify_all()
+
+    def _put(self, packets):
+        with self._condition:
+            for packet in packets:
+                if len(self._queue) >= self._max_queued_packets:
+                    if self._overflow is OverflowPolicy.DropNewest:
+                        self.dropped_packet_count += 1
+                        continue
+                    elif self._overflow is OverflowPolicy.DropOldest:
+                        self._queue.popleft()
+                        self.dropped_packet_count += 1
+                    else:
+                        while len(self._queue) >= self._max_queued_packets and self._running:
+                            self._condition.wait()
+                self._queue.append(packet)
+            self._condition.notify_all()
+
+    def wait_for_packets_raw(self, timeout=None, max_packets=None):
+        """Return every queued packet (up to `max_packets`), waiting for at least one.
+
+        Returns:
+            list[tuple[bytes, float]]: Raw packets and received timestamps, or an empty list if a
+            timeout occurred
+        """
+        deadline = None if timeout is None else timeit.default_timer() + timeout
+        with self._condition:
+            while not self._queue:
+                if not self._running and self._error is not None:
+                    raise self._error
+                remaining = None if deadline is None else deadline - timeit.default_timer()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+            count = len(self._queue)
+            if max_packets is not None:
+                count = min(count, max_packets)
+            packets = [self._queue.popleft() for i in range(count)]
+            self._condition.notify_all()
+        return packets
+
+    def wait_for_packets(self, timeout=None, max_packets=None):
+        """Return every queued packet, deserializing the headers but not the payloads."""
+        return [protocol.deserialize_header(packet) + (received_time,)
+                for packet, received_time in self.wait_for_packets_raw(timeout, max_packets)]
+
+    def wait_for_packet(self, timeout=None):
+        """Return the next queued packet, deserializing the header but not the payload."""
+        packets = self.wait_for_packets(timeout, 1)
+        return packets[0] if packets else (None, None, None)
+
+
 class DiscoveryError(EnvironmentError):
     pass
 
 
+class ClockSyncError(EnvironmentError):
+    pass
+
+
+# Markers each rigid body should have, as a bitmap of marker IDs, and which markerset should have
+# their model-solved positions
+_ExpectedMarkers = collections.namedtuple('_ExpectedMarkers', ('model_id', 'name', 'mask', 'markerset_slot'))
+
+
 @attr.s
 class Client(object):
 
@@ -328,30 +1020,63 @@ class Client(object):
 
     This class connects to a NatNet server and calls a callback whenever a frame of mocap data
     arrives.
+
+    Attributes:
+        skipped_frame_count (int): Number of frames dropped without being parsed in latest-only mode
+        late_frame_count (int): Number of frames discarded because they arrived after a later frame
+            had been delivered (see :func:`set_reorder_window`)
     """
 
     _conn = attr.ib()  # type: Connection
     _clock_synchronizer = attr.ib()  # type: ClockSynchronizer
     _log = attr.ib()  # type: Logger
-    _model_definitions = attr.ib(attr.Factory(list))  # type: list
-    _expected_markers = attr.ib(attr.Factory(set))  # type: set
-    _model_names = attr.ib(attr.Factory(dict))  # type: dict[int, str]
+    _models = attr.ib(attr.Factory(ModelIndex))  # type: ModelIndex
+    _expected_markers = attr.ib(attr.Factory(list))  # type: list[_ExpectedMarkers]
+    _expected_model_ids = attr.ib(attr.Factory(list))  # type: list[int]
     _callback = attr.ib(None)
     _model_callback = attr.ib(None)
+    _frame_callback = attr.ib(None)
+    _lazy_frames = attr.ib(False)
+    _batch_size = attr.ib(1)  # type: int
+    _latest_only = attr.ib(False)
+    skipped_frame_count = attr.ib(0)  # type: int
+    _receiver = attr.ib(None)  # type: BackgroundReceiver
+    _unicast = attr.ib(False)  # type: bool
+    _rigid_body_selection = attr.ib(None)  # type: list
+    _marker_selection = attr.ib(None)  # type: list
+    _selected_rigid_body_ids = attr.ib(None)  # type: set[int]
+    _selected_marker_model_ids = attr.ib(None)  # type: set[int]
+    _selected_markerset_names = attr.ib(None)  # type: set[str]
+    _telemetry = attr.ib(None)  # type: FrameTelemetry
+    _frame_sequence = attr.ib(attr.Factory(FrameSequence))  # type: FrameSequence
+    _reorder_window = attr.ib(0)  # type: int
+    _reorder_delay = attr.ib(None)  # type: float
+    _held_frames = attr.ib(attr.Factory(list))  # type: list[tuple[int, float, ParseBuffer]]
+    _last_delivered_frame_number = attr.ib(None)  # type: int
+    late_frame_count = attr.ib(0)  # type: int
 
     @classmethod
     def _setup_client(cls, conn, server_info, logger):
-        conn.bind_data_socket(server_info.connection_info.multicast_address,
-                              server_info.connection_info.data_port)
+        unicast = not server_info.connection_info.multicast
+        if unicast:
+            logger.debug('Server is in unicast mode')
+            conn.bind_unicast_data_socket()
+            conn.keep_alive()
+        else:
+            conn.bind_data_socket(server_info.connection_info.multicast_address,
+                                  server_info.connection_info.data_port)
 
         logger.debug('Synchronizing clocks')
         clock_synchronizer = ClockSynchronizer(server_info, logger)
         clock_synchronizer.initial_sync(conn)
-        inst = cls(conn, clock_synchronizer, logger)
+        if not clock_synchronizer.estimator.synchronized:
+            raise ClockSyncError('No response to echo requests')
+        inst = cls(conn, clock_synchronizer, logger, unicast=unicast)
 
         logger.debug('Getting data descriptions')
         conn.send_message(protocol.RequestModelDefinitionsMessage())
-        model_definitions_message, _ = conn.wait_for_message_with_id(protocol.MessageId.ModelDef)
+        model_definitions_message, _ = conn.wait_for_message_with_id(protocol.MessageId.ModelDef,
+                                                                     keep_others=True)
         inst._handle_model_definitions(model_definitions_message)
 
         logger.info('Ready')
@@ -373,7 +1098,6 @@ class Client(object):
             logger.info('Found server %s', address)
             logger.debug('Server application: %s', info.app_name)
             logger.debug('Server version: %s', info.app_version)
-            assert info.connection_info.multicast
             servers.append((address, info))
 
         if not servers:
@@ -396,7 +1120,6 @@ class Client(object):
                                                                    timeout=timeout)
         logger.debug('Server application: %s', server_info.app_name)
         logger.debug('Server version: %s', server_info.app_version)
-        assert server_info.connection_info.multicast
 
         return cls._setup_client(conn, server_info, logger)
 
@@ -404,7 +1127,8 @@ class Client(object):
     def connect(cls, server=None, logger=Logger(), timeout=1):
         """Connect to a NatNet server.
 
-        Raises :class:`DiscoveryError` if `server` is not provided and discovery fails.
+        Raises :class:`DiscoveryError` if `server` is not provided and discovery fails, or
+        :class:`ClockSyncError` if the server doesn't respond to echo requests.
 
         Args:
             server (str): IPv4 address of server (hostname probably works too), or None to
@@ -417,21 +1141,99 @@ class Client(object):
         else:
             return cls._simple_connect(server, logger, timeout)
 
-    def set_callback(self, callback):
+    def set_callback(self, callback, rigid_bodies=None, markers=None):
         """Set the frame callback.
 
         It will be called with a list of :class:`~natnet.protocol.MocapFrameMessage.RigidBody`, a list of
         :class:`~natnet.protocol.MocapFrameMessage.LabelledMarker`, and a :class:`~natnet.comms.TimestampAndLatency`.
+
+        If you only need some of the rigid bodies, select them with `rigid_bodies` and the rest won't
+        be parsed at all (see :meth:`~natnet.protocol.MocapFrameMessage.FrameDecoder.deserialize_selected`).
+        Names are looked up in the model definitions, and looked up again whenever they change.  The
+        selection applies to every frame parsed, so the whole-frame callback (if any) gets the same
+        subset, except in lazy mode where nothing is parsed until it is used anyway.
+
+        Args:
+            callback:
+            rigid_bodies (list[int or str]): Streaming IDs or names of rigid bodies to include, or
+                None for all
+            markers (list[int or str]): Streaming IDs or names of models whose labelled markers to
+                include (0 for markers which aren't part of a model), or None for the same models as
+                `rigid_bodies`
         """
         self._callback = callback
+        self._rigid_body_selection = rigid_bodies
+        self._marker_selection = markers if markers is not None else rigid_bodies
+        self._update_selection()
+
+    def _resolve_model_ids(self, selection):
+        """Convert a list of model IDs and names into a set of IDs (or None for all)."""
+        if selection is None:
+            return None
+        ids = set()
+        for model in selection:
+            if isinstance(model, numbers.Integral):
+                ids.add(model)
+                continue
+            try:
+                ids.add(self._models.id(model))
+            except KeyError:
+                self._log.warning('Selected model %s is not in the model definitions', model)
+        return ids
+
+    def _update_selection(self):
+        self._selected_rigid_body_ids = self._resolve_model_ids(self._rigid_body_selection)
+        self._selected_marker_model_ids = self._resolve_model_ids(self._marker_selection)
+        self._selected_markerset_names = None
+        if self._selected_marker_model_ids is not None:
+            # Only need the markersets for the occlusion workaround on the selected models
+            self._selected_markerset_names = set()
+            for id_ in self._selected_marker_model_ids:
+                try:
+                    self._selected_markerset_names.add(self._models.name(id_))
+                except KeyError:
+                    pass
+        self._update_expected_markers()
+
+    def _update_expected_markers(self):
+        """Index the markers each (selected) rigid body should have, for the occlusion workaround."""
+        self._expected_markers = []
+        for r in self._models.rigid_bodies:
+            if self._selected_marker_model_ids is not None and r.id_ not in self._selected_marker_model_ids:
+                continue
+            # Marker IDs start at 1
+            mask = ((1 << len(r.marker_positions)) - 1) << 1
+            self._expected_markers.append(_ExpectedMarkers(r.id_, r.name, mask, self._models.markerset_slot(r.name)))
+        self._expected_model_ids = [e.model_id for e in self._expected_markers]
+
+    @property
+    def models(self):
+        """Index of the current model definitions, for looking up models by streaming ID or name.
+
+        Returns:
+            :class:`~natnet.protocol.ModelDefinitionsMessage.ModelIndex`:
+        """
+        return self._models
+
+    def set_frame_callback(self, callback, lazy=False):
+        """Set the whole-frame callback.
+
+        It will be called with a :class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage` and a
+        :class:`~natnet.comms.TimestampAndLatency`.  This can be used instead of or as well as the callback
+        from :func:`set_callback`.
+
+        Args:
+            callback:
+            lazy (bool): Pass a :class:`~natnet.protocol.MocapFrameMessage.LazyMocapFrame` instead, which only
+                parses the parts of the frame that are actually used
+        """
+        self._frame_callback = callback
+        self._lazy_frames = lazy
 
     def _call_model_callback(self):
         if not self._model_callback:
             return
-        rigid_body_descriptions = [m for m in self._model_definitions if type(m) is RigidBodyDescription]
-        skeleton_descriptions = [m for m in self._model_definitions if type(m) is SkeletonDescription]
-        markerset_descriptions = [m for m in self._model_definitions if type(m) is MarkersetDescription]
-        self._model_callback(rigid_body_descriptions, skeleton_descriptions, markerset_descriptions)
+        self._model_callback(self._models.rigid_bodies, self._models.skeletons, self._models.markersets)
 
     def set_model_callback(self, callback):
         """Set the model definition callback.
@@ -455,54 +1257,121 @@ class Client(object):
         To detect an occluded marker, we have to check if there are any markers missing in each
         rigid body and then find them in the markerset.  For sanity purposes, we hide this detail
         and make it look like they did the sensible thing.
+
+        The markers each rigid body should have are indexed in :func:`_handle_model_definitions`, so
+        this only does any real work for the missing markers.  Reconstructed markers are inserted in
+        order of marker ID among the rest of their rigid body's markers.
         """
         # First, clear the occluded flag if it's set, as I couldn't get a straight answer about
-        # what it actually means (and it clearly doesn't mean "occluded")
-        for l in labelled_markers:
-            l._params &= ~LabelledMarker._OCCLUDED
-
-        # Fill in missing markers
-        markers = set((l.model_id, l.marker_id) for l in labelled_markers)
-        missing_markers = self._expected_markers - markers
-        if missing_markers:
-            for model_id, marker_id in missing_markers:
-                # Get model-solved position from markerset
-                try:
-                    model_name = self._model_names[model_id]
-                    markerset_candidates = [m for m in markersets if m.name == model_name]
-                    assert len(markerset_candidates) == 1
-                    markerset = markerset_candidates[0]
-                    position = markerset.markers[marker_id - 1]
-                except (KeyError, AssertionError):
-                    self._log.warning('Tried to recreate occluded marker %i for unknown model %i',
-                                      marker_id, model_id)
-                    print(self._model_names)
-                    continue
-                # Construct labelled marker
-                params = LabelledMarker._OCCLUDED | LabelledMarker._MODEL_SOLVED | \
-                    LabelledMarker._HAS_MODEL
-                reconstructed_marker = LabelledMarker(
-                    model_id=model_id, marker_id=marker_id, position=position,
-                    size=0.1,  # Arbitrary small size
-                    params=params,
-                    residual=1  # Arbitrary large residual
-                )
-                labelled_markers.append(reconstructed_marker)
-            labelled_markers.sort(key=lambda lm: (lm.model_id, lm.marker_id))
+        # what it actually means (and it clearly doesn't mean "occluded").  At the same time, mark
+        # off each marker we're expecting in its model's bitmap, and note where each model's markers
+        # start (Motive streams each model's markers together, in order of marker ID).
+        not_occluded = ~LabelledMarker._OCCLUDED
+        present = dict.fromkeys(self._expected_model_ids, 0)
+        starts = {}
+        run_model_id = None
+        for i, l in enumerate(labelled_markers):
+            l._params &= not_occluded
+            model_id = l.model_id
+            if model_id != run_model_id:
+                run_model_id = model_id
+                starts.setdefault(model_id, i)
+            if model_id in present:
+                present[model_id] |= 1 << l.marker_id
+
+        # Reconstruct missing markers
+        markerset_slots = None
+        insertions = []
+        for expected in self._expected_markers:
+            missing = expected.mask & ~present[expected.model_id]
+            if not missing:
+                continue
+            markerset, markerset_slots = self._find_markerset(expected, markersets, markerset_slots)
+            reconstructed_markers = self._reconstruct_markers(expected, missing, markerset)
+            if reconstructed_markers:
+                # Models with no markers at all go on the end
+                start = starts.get(expected.model_id, len(labelled_markers))
+                insertions.append((start, expected.model_id, present[expected.model_id], reconstructed_markers))
+        self._insert_reconstructed_markers(labelled_markers, insertions)
+
+    @staticmethod
+    def _find_markerset(expected, markersets, markerset_slots):
+        """Find the markerset for a rigid body, which is usually in the same slot as in the model definitions.
+
+        Returns the markerset (or None if there isn't exactly one with the right name) and the
+        markersets indexed by name, which is only built the first time the slot is wrong.
+        """
+        slot = expected.markerset_slot
+        if slot is not None and slot < len(markersets) and markersets[slot].name == expected.name:
+            return markersets[slot], markerset_slots
+        if markerset_slots is None:
+            markerset_slots = collections.defaultdict(list)
+            for m in markersets:
+                markerset_slots[m.name].append(m)
+        candidates = markerset_slots.get(expected.name, [])
+        return (candidates[0] if len(candidates) == 1 else None), markerset_slots
+
+    def _reconstruct_markers(self, expected, missing, markerset):
+        """Make a labelled marker for each missing marker ID, with its model-solved position from the markerset."""
+        reconstructed_markers = []
+        while missing:
+            lowest_bit = missing & -missing
+            missing ^= lowest_bit
+            marker_id = lowest_bit.bit_length() - 1
+            if markerset is None:
+                self._log.warning('Tried to recreate occluded marker %i for unknown model %i',
+                                  marker_id, expected.model_id)
+                continue
+            params = LabelledMarker._OCCLUDED | LabelledMarker._MODEL_SOLVED | \
+                LabelledMarker._HAS_MODEL
+            reconstructed_markers.append(LabelledMarker(
+                model_id=expected.model_id, marker_id=marker_id,
+                position=markerset.markers[marker_id - 1],
+                size=0.1,  # Arbitrary small size
+                params=params,
+                residual=1  # Arbitrary large residual
+            ))
+        return reconstructed_markers
+
+    @staticmethod
+    def _insert_reconstructed_markers(labelled_markers, insertions):
+        """Insert each reconstructed marker in order among its model's markers.
+
+        Each insertion is (start index, model ID, bitmap of present marker IDs, reconstructed markers).
+        """
+        # Start from the end so the start indices stay valid
+        insertions.sort(key=lambda insertion: insertion[:2], reverse=True)
+        for start, _, present_markers, reconstructed_markers in insertions:
+            for marker in reconstructed_markers:
+                preceding_markers = present_markers & ((1 << marker.marker_id) - 1)
+                labelled_markers.insert(start + bin(preceding_markers).count('1'), marker)
+                present_markers |= 1 << marker.marker_id
+
+    def _deserialize_frame(self, payload):
+        if self._lazy_frames:
+            return protocol.MocapFrameMessage.deserialize_lazy(payload, protocol.Version(3))
+        if self._selected_rigid_body_ids is not None or self._selected_marker_model_ids is not None:
+            return protocol.MocapFrameMessage.deserialize_selected(
+                payload, protocol.Version(3), self._selected_rigid_body_ids, self._selected_marker_model_ids,
+                self._selected_markerset_names)
+        return protocol.deserialize_payload(protocol.MessageId.FrameOfData, payload)
 
     def _handle_frame(self, frame_message, received_time):
-        rigid_bodies = frame_message.rigid_bodies
-        labelled_markers = frame_message.labelled_markers
-        markersets = frame_message.markersets
-
-        if labelled_markers and markersets:
+        # Check the counts first so a lazy frame doesn't have to parse anything it doesn't need to
+        if frame_message.labelled_marker_count and frame_message.markerset_count:
             # Labelled markers and "solver replaces occlusion" are both on, so we can fill in the
             # missing labelled markers from the corresponding markerset
-            self._do_occlusion_workaround(labelled_markers, markersets)
+            self._do_occlusion_workaround(frame_message.labelled_markers, frame_message.markersets)
 
         timestamp_and_latency = TimestampAndLatency._calculate(
             received_time, frame_message.timing_info, self._clock_synchronizer)
-        self._callback(rigid_bodies, labelled_markers, timestamp_and_latency)
+        if self._telemetry:
+            self._telemetry.record(frame_message.frame_number, received_time, timestamp_and_latency)
+        if self._callback:
+            self._callback(frame_message.rigid_bodies, frame_message.labelled_markers,
+                           timestamp_and_latency)
+        if self._frame_callback:
+            self._frame_callback(frame_message, timestamp_and_latency)
 
         if frame_message.tracked_models_changed:
             self._log.info('Tracked models have changed, requesting new model definitions')
@@ -510,21 +1379,14 @@ class Client(object):
                 protocol.RequestModelDefinitionsMessage()))
 
     def _handle_model_definitions(self, model_definitions_message):
-        """Update local list of rigid body id:name mappings.
+        """Update the model index.
 
         :type model_definitions_message: protocol.ModelDefinitionsMessage
         """
-        self._model_definitions = model_definitions_message.models
-
-        rigid_bodies = [m for m in self._model_definitions if type(m) is RigidBodyDescription]
-        self._expected_markers = set((r.id_, i + 1) for r in rigid_bodies
-                                     for i in range(len(r.marker_positions)))
-        self._model_names = {}
-        for m in self._model_definitions:
-            try:
-                self._model_names[m.id_] = m.name
-            except AttributeError:
-                pass
+        added, removed = self._models.update(model_definitions_message.models)
+        self._log.debug('Model definitions updated: %i added or changed, %i removed or changed',
+                        len(added), len(removed))
+        rigid_bodies = self._models.rigid_bodies
 
         # TODO: Figure out what to do when there are duplicate streaming IDs
 
@@ -538,18 +1400,229 @@ class Client(object):
             self._log.warning('Warning: multiple rigid bodies with the same streaming ID detected ({})'
                               .format(duplicates))
 
+        self._update_selection()
+
         self._call_model_callback()
 
-    def run_once(self, timeout=None):
-        """Receive and process one message."""
-        message_id, payload, received_time = self._conn.wait_for_packet(timeout)
+    def set_batch_size(self, batch_size):
+        """Set the maximum number of packets to receive and process in each call to :func:`run_once`.
+
+        With a batch size greater than one, each call to :func:`run_once` drains every packet which
+        is already queued (up to the batch size) instead of waiting again for each one, which helps
+        the client catch up after it falls behind.
+
+        Args:
+            batch_size (int):
+        """
+        assert batch_size >= 1
+        self._batch_size = batch_size
+
+    def set_latest_only(self, latest_only=True):
+        """Only deliver the newest frame when several frames have queued up.
+
+        Each call to :func:`run_once` drains every queued packet (up to the batch size, if one has
+        been set with :func:`set_batch_size`), and any frames older than the newest one are dropped
+        without being parsed and counted in :attr:`skipped_frame_count`.  Other messages are still
+        handled as usual.
+
+        Args:
+            latest_only (bool):
+        """
+        self._latest_only = latest_only
+
+    def start_receiver_thread(self, max_queued_packets=100, overflow=OverflowPolicy.DropOldest):
+        """Receive packets on a background thread, and process them on whichever thread calls :func:`spin`.
+
+        See :class:`BackgroundReceiver`.
+
+        Args:
+            max_queued_packets (int): Queue size
+            overflow (:class:`OverflowPolicy`): What to do when the queue is full
+        """
+        assert self._receiver is None
+        self._receiver = BackgroundReceiver(self._conn, max_queued_packets, overflow, self._log)
+        self._receiver.start()
+
+    def stop_receiver_thread(self):
+        """Stop the background receiver thread, and go back to receiving packets in :func:`run_once`."""
+        self._receiver.stop()
+        self._receiver = None
+
+    @property
+    def dropped_packet_count(self):
+        """Number of packets dropped by the background receiver thread because its queue was full."""
+        return self._receiver.dropped_packet_count if self._receiver else 0
+
+    def enable_telemetry(self, interval=10.0, callback=None):
+        """Start collecting latency, jitter and frame loss statistics.
+
+        Args:
+            interval (float): Length of each reporting interval, in seconds
+            callback: Called with a :class:`~natnet.telemetry.TelemetrySnapshot` at the end of each
+                interval
+
+        Returns:
+            :class:`~natnet.telemetry.FrameTelemetry`:
+        """
+        self._telemetry = FrameTelemetry(interval, callback, self._frame_sequence)
+        return self._telemetry
+
+    def disable_telemetry(self):
+        """Stop collecting statistics."""
+        self._telemetry = None
+
+    @property
+    def telemetry(self):
+        """The :class:`~natnet.telemetry.FrameTelemetry` enabled with :func:`enable_telemetry`, or None."""
+        return self._telemetry
+
+    def start_recording(self, filename, index_interval=1000):
+        """Record every packet received to a file, which can be read with :class:`~natnet.recording.Recording`.
+
+        The server info and (once they arrive) the current model definitions are recorded first, so
+        the recording can be replayed on its own.  Every clock estimate is recorded too, for
+        :func:`ClockSynchronizer.convert_timestamps`.  Requires Python 3.
+
+        Args:
+            filename (str):
+            index_interval (int): See :class:`~natnet.recording.Recorder`
+        """
+        from .recording import Recorder
+        recorder = Recorder.open(filename, index_interval=index_interval)
+        recorder.record_message(self._clock_synchronizer._server_info, 0)
+        self._conn.set_recorder(recorder)
+        self._clock_synchronizer.set_recorder(recorder)
+        self._conn.send_message(protocol.RequestModelDefinitionsMessage())
+
+    def stop_recording(self):
+        """Stop recording and close the recording file."""
+        recorder = self._conn._recorder
+        self._conn.set_recorder(None)
+        self._clock_synchronizer.set_recorder(None)
+        recorder.close()
+
+    def _receive_packets(self, timeout):
+        source = self._receiver or self._conn
+        if self._latest_only:
+            max_packets = self._batch_size if self._batch_size > 1 else None
+            return self._drop_stale_frames(source.wait_for_packets(timeout, max_packets))
+        if self._batch_size > 1:
+            return source.wait_for_packets(timeout, self._batch_size)
+        message_id, payload, received_time = source.wait_for_packet(timeout)
         if message_id is None:
+            return []
+        return [(message_id, payload, received_time)]
+
+    def _drop_stale_frames(self, packets):
+        """Remove all but the newest FrameOfData packet from a batch, going by frame number."""
+        frame_indices = [i for i, (message_id, _, _) in enumerate(packets)
+                         if message_id == protocol.MessageId.FrameOfData]
+        if len(frame_indices) < 2:
+            return packets
+        newest = max(frame_indices,
+                     key=lambda i: protocol.MocapFrameMessage.peek_frame_number(packets[i][1]))
+        stale = set(frame_indices)
+        stale.remove(newest)
+        self.skipped_frame_count += len(stale)
+        for i in sorted(stale):
+            # Skipped on purpose, so don't count them as dropped
+            self._frame_sequence.track(protocol.MocapFrameMessage.peek_frame_number(packets[i][1]))
+        return [packet for i, packet in enumerate(packets) if i not in stale]
+
+    def run_once(self, timeout=None):
+        """Receive and process one message (or one batch of messages, see :func:`set_batch_size`)."""
+        packets = self._receive_packets(timeout)
+        self._keep_alive()
+        if not packets:
             self._log.warning('Timed out waiting for packet')
+            # Nothing else is coming for now, so don't hold on to anything
+            self._release_frames(flush=True)
+            return
+        for message_id, payload, received_time in packets:
+            self._handle_packet(message_id, payload, received_time)
+        if self._held_frames:
+            self._release_frames(timeit.default_timer())
+        self._clock_synchronizer.update(self._conn)
+
+    def _keep_alive(self):
+        """Send a KeepAlive message to a unicast server if one is due."""
+        if self._unicast:
+            self._conn.keep_alive()
+
+    def set_reorder_window(self, frames=0, delay=None):
+        """Hold frames back briefly, so that frames which arrive out of order are delivered in order.
+
+        Every frame's number is tracked to count lost, duplicated and out-of-order frames (see
+        :attr:`frame_sequence`), but by default frames are delivered in the order they arrive.  With
+        a reorder window, a frame which arrives with a gap before it is held until the missing frames
+        arrive, until `frames` later frames are being held, or until `delay` seconds after it
+        arrived, whichever comes first.  Frames are then always delivered in increasing order of
+        frame number: duplicates are discarded, and so are frames which arrive after a later frame
+        has been delivered (counted in :attr:`late_frame_count`).  Frames with no gap before them
+        are delivered immediately, so this only adds latency when frames are actually lost or
+        reordered.
+
+        Args:
+            frames (int): Maximum number of frames to hold, or 0 for no limit
+            delay (float): Maximum time to hold a frame, in seconds, or None for no limit
+        """
+        self._release_frames(flush=True)
+        self._reorder_window = frames
+        self._reorder_delay = delay
+
+    @property
+    def frame_sequence(self):
+        """Counts of lost, duplicated and out-of-order frames (see :class:`~natnet.telemetry.FrameSequence`)."""
+        return self._frame_sequence
+
+    def _deliver_frame(self, frame_number, payload, received_time):
+        self._last_delivered_frame_number = frame_number
+        if self._callback or self._frame_callback:
+            frame_message = self._deserialize_frame(payload)
+            self._handle_frame(frame_message, received_time)
+
+    def _hold_frame(self, frame_number, status, payload, received_time):
+        """Deliver a frame if it's next in order, otherwise put it in the reorder window."""
+        if status == FrameStatus.Duplicate:
+            return
+        if status == FrameStatus.Restart:
+            self._release_frames(flush=True)
+            self._last_delivered_frame_number = None
+        last = self._last_delivered_frame_number
+        if last is not None and frame_number <= last:
+            self.late_frame_count += 1
             return
+        if not self._held_frames and (last is None or frame_number == last + 1):
+            self._deliver_frame(frame_number, payload, received_time)
+            return
+        # Copy it out of the connection's receive buffer, which will be reused
+        held_payload = ParseBuffer(payload.data[payload.offset:].tobytes())
+        heapq.heappush(self._held_frames, (frame_number, received_time, held_payload))
+        self._release_frames(received_time)
+
+    def _release_frames(self, now=None, flush=False):
+        """Deliver held frames which are next in order, or have been held for too long."""
+        held = self._held_frames
+        while held:
+            frame_number, received_time, payload = held[0]
+            last = self._last_delivered_frame_number
+            if not (flush or last is None or frame_number == last + 1 or
+                    (self._reorder_window and len(held) > self._reorder_window) or
+                    (self._reorder_delay is not None and now - received_time >= self._reorder_delay)):
+                break
+            heapq.heappop(held)
+            self._deliver_frame(frame_number, payload, received_time)
+
+    def _handle_packet(self, message_id, payload, received_time):
         if message_id == protocol.MessageId.FrameOfData:
-            if self._callback:
-                frame_message = protocol.deserialize_payload(message_id, payload)
-                self._handle_frame(frame_message, received_time)
+            frame_number = protocol.MocapFrameMessage.peek_frame_number(payload)
+            status = self._frame_sequence.track(frame_number)
+            if status == FrameStatus.Restart:
+                self._log.info('Frame numbers restarted at %i', frame_number)
+            if self._reorder_window or self._reorder_delay is not None:
+                self._hold_frame(frame_number, status, payload, received_time)
+            else:
+                self._deliver_frame(frame_number, payload, received_time)
         elif message_id == protocol.MessageId.ModelDef:
             model_definitions_message = protocol.deserialize_payload(message_id, payload)
             self._handle_model_definitions(model_definitions_message)
@@ -558,7 +1631,6 @@ class Client(object):
             self._clock_synchronizer.handle_echo_response(echo_response_message, received_time)
         else:
             self._log.error('Unhandled message type:', message_id.name)
-        self._clock_synchronizer.update(self._conn)
 
     def spin(self, timeout=None):
         """Continuously receive and process messages."""
@@ -8,7 +8,7 @@ No part of python_natnet, including this file, may be copied, modified,
 propagated, or distributed except according to the terms contained in the
 LICENSE file.
 """
-__all__ = ['SingleFrameFakeClient']
+__all__ = ['SingleFrameFakeClient', 'ReplayConnection', 'ReplayClient']
 
 import os.path
 import time
@@ -17,6 +17,7 @@ import timeit
 from .comms import Client, ClockSynchronizer, Connection
 from .logging import Logger
 from .protocol import MessageId, deserialize, deserialize_header, serialize
+from .protocol.common import uint16_t
 
 
 class FakeConnection(Connection):
@@ -52,7 +53,7 @@ class FakeConnection(Connection):
     def add_message(self, message, received_time=None):
         self.add_packet(serialize(message), received_time)
 
-    def wait_for_packet_raw(self, timeout=None):
+    def _receive_packet_raw(self, timeout=None):
         if self.i >= len(self.packets):
             # Hit end of list
             if self.repeat:
@@ -73,14 +74,153 @@ class FakeConnection(Connection):
                 self.last_frame_time = timeit.default_timer()
             received_time = self.last_frame_time
 
+        if self._recorder:
+            self._recorder.record(packet, received_time)
         return packet, received_time
 
+    def wait_for_packets_raw(self, timeout=None, max_packets=None):
+        # When rate limiting, "receive" one packet at a time so the rate still applies
+        packets = [self.wait_for_packet_raw(timeout)]
+        while not self.rate and self.packets_remaining > 0 and \
+                (max_packets is None or len(packets) < max_packets):
+            packets.append(self.wait_for_packet_raw(timeout))
+        return packets
+
     def send_packet(self, *args, **kwargs):
         pass
 
     def bind_data_socket(self, *args, **kwargs):
         pass
 
+    def bind_unicast_data_socket(self):
+        pass
+
+    def send_keep_alive(self):
+        pass
+
+
+class ReplayConnection(FakeConnection):
+
+    """Fake connection which replays packets from a recording (see :mod:`natnet.recording`).
+
+    The recording is memory-mapped, so packets are only read from disk as they are replayed.  The
+    ServerInfo message at the start of the recording is stored in :attr:`server_info` rather than
+    replayed, since a client never receives one after connecting.
+
+    Attributes:
+        recording (:class:`~natnet.recording.Recording`):
+        server_info (:class:`~natnet.protocol.ServerInfoMessage`): Server info from the recording,
+            if any
+        model_definitions (:class:`~natnet.protocol.ModelDefinitionsMessage`): First model
+            definitions in the recording, if any
+        speed (float): Playback speed relative to real time, or None to replay as fast as possible
+    """
+
+    # How far into the recording to look for the server info and model definitions
+    _header_scan_limit = 1000
+
+    def __init__(self, recording, speed=1.0, repeat=False):
+        """
+        Args:
+            recording (:class:`~natnet.recording.Recording`):
+            speed (float): Playback speed relative to real time (e.g., 1 for real time or 10 for ten
+                times faster), or None to replay as fast as possible.  When replaying at a given
+                speed packets are timestamped with the current time, otherwise they are timestamped
+                with the time they were originally received.
+            repeat (bool): When the end of the recording is reached, either (true) loop back to the
+                start or (false) raise SystemExit
+        """
+        super(ReplayConnection, self).__init__(repeat=repeat)
+        self.recording = recording
+        self.speed = speed
+        self.server_info = None
+        self.model_definitions = None
+        for i, (packet, _) in enumerate(recording.packets()):
+            message_id, = uint16_t.unpack_from(packet)
+            if message_id == MessageId.ServerInfo and self.server_info is None:
+                self.server_info = deserialize(packet)
+            elif message_id == MessageId.ModelDef and self.model_definitions is None:
+                self.model_definitions = deserialize(packet)
+            if i >= self._header_scan_limit or None not in (self.server_info, self.model_definitions):
+                break
+        self._packets = None
+        self._replay_start = None
+        self.seek()
+
+    @classmethod
+    def open(cls, filename, speed=1.0, repeat=False):
+        """Open a recording file and replay it (see :class:`ReplayConnection`)."""
+        from .recording import Recording
+        return cls(Recording.open(filename), speed, repeat)
+
+    def seek(self, offset=None):
+        """Continue replaying from the given record offset, or from the start of the recording."""
+        self._packets = self.recording.packets(offset)
+        self._replay_start = None
+
+    def seek_frame(self, frame_number):
+        """Continue replaying from the first mocap frame with at least the given frame number."""
+        offset = self.recording.find_frame(frame_number)
+        if offset is None:
+            raise ValueError('Frame {} is past the end of the recording'.format(frame_number))
+        self.seek(offset)
+
+    def seek_timestamp(self, timestamp):
+        """Continue replaying from the first mocap frame at or after the given server timestamp."""
+        offset = self.recording.find_timestamp(timestamp)
+        if offset is None:
+            raise ValueError('Timestamp {} is past the end of the recording'.format(timestamp))
+        self.seek(offset)
+
+    def _next_packet(self):
+        """Get the next packet to replay and its original received time, or (None, None) at the end."""
+        looped = False
+        while True:
+            for packet, recorded_time in self._packets:
+                if uint16_t.unpack_from(packet)[0] != MessageId.ServerInfo:
+                    return packet, recorded_time
+            if not self.repeat or looped:
+                # Stop at the end, or if the recording is empty
+                return None, None
+            self.seek()
+            looped = True
+
+    def _receive_packet_raw(self, timeout=None):
+        packet, recorded_time = self._next_packet()
+        if packet is None:
+            raise SystemExit
+
+        received_time = recorded_time
+        if self.speed:
+            now = timeit.default_timer()
+            if self._replay_start is None:
+                self._replay_start = (now, recorded_time)
+            else:
+                start_time, start_recorded_time = self._replay_start
+                packet_due = start_time + (recorded_time - start_recorded_time)/self.speed
+                time.sleep(max(packet_due - now, 0))
+            received_time = timeit.default_timer()
+
+        if self._recorder:
+            self._recorder.record(packet, received_time)
+        return packet, received_time
+
+    def wait_for_packets_raw(self, timeout=None, max_packets=None):
+        # When replaying at a given speed, "receive" one packet at a time so the speed still applies
+        if self.speed:
+            return [self.wait_for_packet_raw(timeout)]
+        if max_packets is None:
+            max_packets = self.receive_buffer_count
+        packets = [self.wait_for_packet_raw(timeout)]
+        while len(packets) < max_packets:
+            packet, received_time = self._next_packet()
+            if packet is None:
+                break
+            if self._recorder:
+                self._recorder.record(packet, received_time)
+            packets.append((packet, received_time))
+        return packets
+
 
 class FakeClockSynchronizer(ClockSynchronizer):
 
@@ -115,3 +255,23 @@ class SingleFrameFakeClient(Client):
         inst = cls(conn, clock_synchronizer, logger)
         inst._handle_model_definitions(deserialize(model_definitions_packet))
         return inst
+
+
+class ReplayClient(Client):
+
+    """Fake NatNet client that replays a recording through the usual frame processing."""
+
+    @classmethod
+    def replay(cls, filename, speed=1.0, repeat=False, logger=Logger()):
+        """Open a recording file and replay it (see :class:`ReplayConnection`).
+
+        The recording must contain a ServerInfo message (which :func:`Client.start_recording` records).
+        """
+        conn = ReplayConnection.open(filename, speed, repeat)
+        if conn.server_info is None:
+            raise ValueError('Recording has no server info')
+        clock_synchronizer = FakeClockSynchronizer(conn.server_info, logger)
+        inst = cls(conn, clock_synchronizer, logger)
+        if conn.model_definitions is not None:
+            inst._handle_model_definitions(conn.model_definitions)
+        return inst
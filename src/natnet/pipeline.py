@@ -0,0 +1,258 @@
+# coding: utf-8
+"""Multiprocess frame processing.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+This module requires Python 3.8 or later (for :mod:`multiprocessing.shared_memory`), so it isn't
+imported by the top-level package.
+
+The main process receives packets, handles everything except mocap frames itself, and copies each
+mocap frame packet into a ring of slots in shared memory.  Worker processes take frames from the
+ring, parse them, and call a processing function, and the main process collects the results and
+passes them to a result callback in the order the frames arrived in.  Each worker has its own copy
+of the client state (model definitions for the occlusion workaround, and the clock estimate as of
+when the frame arrived), so the frame and timing passed to the processing function are the same as
+:class:`~natnet.comms.Client` would have given the callback.
+"""
+
+__all__ = ['Pipeline']
+
+import multiprocessing
+import queue
+import struct
+from multiprocessing import shared_memory
+
+from . import protocol
+from .comms import Client
+from .logging import Logger
+
+# Slot header: packet length and received time
+_slot_header_t = struct.Struct('<Id')
+
+
+class _NullConnection(object):
+
+    """Stand-in connection for workers, which shouldn't send anything."""
+
+    def send_packet(self, *args, **kwargs):
+        pass
+
+    def send_message(self, *args, **kwargs):
+        pass
+
+
+def _worker_main(shm_name, slot_size, clock_synchronizer, model_definitions, process,
+                 tasks, results, free_slots, free_slot_count, control):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    log = Logger()
+    client = Client(_NullConnection(), clock_synchronizer, log)
+    client._handle_model_definitions(model_definitions)
+    model_definitions_generation = 0
+    outputs = []
+    client.set_frame_callback(lambda frame, timing: outputs.append(process(frame, timing)))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            sequence_number, slot, clock_state, task_model_definitions_generation = task
+            # Catch up with the model definitions the frame was dispatched with, waiting for them to
+            # arrive if necessary
+            while model_definitions_generation < task_model_definitions_generation:
+                model_definitions_generation, model_definitions = control.get()
+                client._handle_model_definitions(model_definitions)
+
+            offset = slot*slot_size
+            length, received_time = _slot_header_t.unpack_from(shm.buf, offset)
+            packet = shm.buf[offset + _slot_header_t.size:offset + _slot_header_t.size + length]
+            try:
+                # Frame is parsed eagerly, so nothing refers to the slot after this
+                frame = client._deserialize_frame(protocol.deserialize_header(packet)[1])
+            except Exception as e:
+                # Report it, so the results after this one can still be delivered
+                results.put((sequence_number, None, None, repr(e)))
+                continue
+            finally:
+                packet.release()
+                free_slots.put(slot)
+                free_slot_count.release()
+
+            clock_synchronizer._set_state(clock_state)
+            try:
+                client._handle_frame(frame, received_time)
+                results.put((sequence_number, frame.frame_number, outputs.pop(), None))
+            except Exception as e:
+                del outputs[:]
+                results.put((sequence_number, frame.frame_number, None, repr(e)))
+    finally:
+        shm.close()
+
+
+class Pipeline(object):
+
+    """Parse mocap frames and run a processing function on them in several worker processes.
+
+    The processing function is called in a worker process with a
+    :class:`~natnet.protocol.MocapFrameMessage.MocapFrameMessage` and a
+    :class:`~natnet.comms.TimestampAndLatency`, and whatever it returns is passed back to the main
+    process and given to the result callback along with the frame number.  Results are delivered
+    in the order the frames were received, even if a later frame finishes processing first.  The
+    processing function and its results have to be picklable (e.g., the function must be defined at
+    module level), and it can't change any state in the main process.
+
+    If every slot in the ring is in use when a frame arrives, or the frame is larger than a slot, it
+    is dropped (and counted in :attr:`dropped_frame_count`).
+
+    Attributes:
+        dropped_frame_count (int): Number of frames dropped because all slots were in use or they
+            were too large
+    """
+
+    def __init__(self, client, process, result_callback=None, workers=2, slots=64, slot_size=32768):
+        """
+        Args:
+            client (:class:`~natnet.comms.Client`): Connected client
+            process: Processing function (run in worker processes)
+            result_callback: Called with the frame number and result of `process` for each frame
+                (in the main process)
+            workers (int): Number of worker processes
+            slots (int): Number of packets which can be waiting or being processed at once
+            slot_size (int): Maximum packet size
+        """
+        self._client = client
+        self._conn = client._conn
+        self._log = client._log
+        self._process = process
+        self._result_callback = result_callback
+        self._worker_count = workers
+        self._slot_count = slots
+        self._max_packet_size = slot_size
+        self._slot_size = slot_size + _slot_header_t.size
+        self._shm = None
+        self._workers = []
+        self._control = []
+        self._tasks = None
+        self._results = None
+        self._free_slots = None
+        self._free_slot_count = None
+        self._next_sequence_number = 0
+        self._next_result = 0
+        self._pending_results = {}
+        self._model_definitions_generation = 0
+        self.dropped_frame_count = 0
+
+    def start(self):
+        """Create the shared memory ring and start the worker processes."""
+        self._shm = shared_memory.SharedMemory(create=True, size=self._slot_size*self._slot_count)
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._free_slots = multiprocessing.Queue()
+        for slot in range(self._slot_count):
+            self._free_slots.put(slot)
+        # A queue can look empty while an item is still being flushed into it, so count the free
+        # slots separately to decide whether to drop a frame
+        self._free_slot_count = multiprocessing.Semaphore(self._slot_count)
+        model_definitions = protocol.ModelDefinitionsMessage(self._client.models.models)
+        for i in range(self._worker_count):
+            control = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_worker_main, name='natnet worker {}'.format(i),
+                args=(self._shm.name, self._slot_size, self._client._clock_synchronizer,
+                      model_definitions, self._process, self._tasks, self._results,
+                      self._free_slots, self._free_slot_count, control))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+            self._control.append(control)
+
+    def stop(self):
+        """Wait for the workers to finish processing queued frames, deliver the results, and clean up."""
+        for worker in self._workers:
+            self._tasks.put(None)
+        while self._next_result < self._next_sequence_number:
+            if not any(worker.is_alive() for worker in self._workers) and self._results.empty():
+                self._log.error('Workers exited before processing every frame')
+                break
+            self._collect_results(timeout=0.1)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._control = []
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def _dispatch_frame(self, packet, payload, received_time):
+        self._client.frame_sequence.track(protocol.MocapFrameMessage.peek_frame_number(payload))
+        if protocol.MocapFrameMessage.peek_tracked_models_changed(payload):
+            self._log.info('Tracked models have changed, requesting new model definitions')
+            self._conn.send_message(protocol.RequestModelDefinitionsMessage())
+        if len(packet) > self._max_packet_size:
+            self._log.warning('Dropping frame of %i bytes, which is larger than a slot', len(packet))
+            self.dropped_frame_count += 1
+            return
+        if not self._free_slot_count.acquire(False):
+            self.dropped_frame_count += 1
+            return
+        # The slot has been put on the queue already, but might not have arrived yet
+        slot = self._free_slots.get()
+        offset = slot*self._slot_size
+        _slot_header_t.pack_into(self._shm.buf, offset, len(packet), received_time)
+        self._shm.buf[offset + _slot_header_t.size:offset + _slot_header_t.size + len(packet)] = packet
+        clock_state = self._client._clock_synchronizer._get_state()
+        self._tasks.put((self._next_sequence_number, slot, clock_state, self._model_definitions_generation))
+        self._next_sequence_number += 1
+
+    def _collect_results(self, timeout=None):
+        """Deliver any results which are ready, in order."""
+        try:
+            while True:
+                sequence_number, frame_number, result, error = self._results.get(timeout=timeout)
+                self._pending_results[sequence_number] = (frame_number, result, error)
+                timeout = None if timeout is None else 0
+        except queue.Empty:
+            pass
+        while self._next_result in self._pending_results:
+            frame_number, result, error = self._pending_results.pop(self._next_result)
+            self._next_result += 1
+            if error is not None:
+                self._log.error('Error processing frame %s: %s', frame_number, error)
+            elif self._result_callback:
+                self._result_callback(frame_number, result)
+
+    def run_once(self, timeout=None):
+        """Receive and dispatch every queued packet, then deliver any results which are ready."""
+        packets = self._conn.wait_for_packets_raw(timeout)
+        for packet, received_time in packets:
+            message_id, payload = protocol.deserialize_header(packet)
+            if message_id == protocol.MessageId.FrameOfData:
+                self._dispatch_frame(packet, payload, received_time)
+            elif message_id == protocol.MessageId.ModelDef:
+                model_definitions_message = protocol.deserialize_payload(message_id, payload)
+                self._client._handle_model_definitions(model_definitions_message)
+                # Frames dispatched from now on are tagged with this generation, so each worker
+                # applies these before parsing them
+                self._model_definitions_generation += 1
+                for control in self._control:
+                    control.put((self._model_definitions_generation, model_definitions_message))
+            else:
+                self._client._handle_packet(message_id, payload, received_time)
+        self._client._clock_synchronizer.update(self._conn)
+        self._client._keep_alive()
+        self._collect_results(timeout=0)
+
+    def spin(self, timeout=None):
+        """Start the workers, then continuously receive and dispatch packets until interrupted."""
+        self.start()
+        try:
+            while True:
+                self.run_once(timeout)
+        except (KeyboardInterrupt, SystemExit):
+            self._log.info('Exiting')
+        finally:
+            self.stop()
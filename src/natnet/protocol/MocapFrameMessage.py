@@ -19,7 +19,7 @@ may not work.
 """
 
 __all__ = ['Markerset', 'RigidBody', 'Skeleton', 'LabelledMarker', 'AnalogChannelData', 'Device',
-           'TimingInfo', 'MocapFrameMessage']
+           'TimingInfo', 'FrameDecoder', 'MocapFrameMessage', 'LazyMocapFrame']
 
 try:
     # Only need this for type annotations
@@ -27,10 +27,46 @@ try:
 except ImportError:
     pass
 
+import functools
+import struct
+
 import attr
 
-from .common import (MessageId, Version, double_t, float_t, int16_t, quaternion_t, register_message,
-                     uint16_t, uint32_t, uint64_t, vector3_t)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .common import (MessageId, ParseBuffer, SerializeBuffer, Version, cstr_size, double_t, float_t,
+                     int16_t, quaternion_t, register_message, uint16_t, uint32_t, uint64_t, vector3_t)
+
+# Fixed-size parts of the latest (version 3) format, used for serializing
+_rigid_body_t = struct.Struct('<I7ffh')
+_skeleton_header_t = struct.Struct('<II')
+_labelled_marker_t = struct.Struct('<HH4fhf')
+_timing_info_t = struct.Struct('<IIdQQQ')
+_frame_footer_t = struct.Struct('<HI')
+
+
+def _serialize(obj, *args):
+    """Serialize something implementing ``serialized_size`` and ``serialize_into`` to bytes."""
+    buffer = SerializeBuffer(obj.serialized_size(*args))
+    obj.serialize_into(buffer, *args)
+    return bytes(buffer.data)
+
+
+def _pack_rigid_bodies(buffer, rigid_bodies):
+    """Pack a count-prefixed list of RigidBody instances into a SerializeBuffer."""
+    buffer.pack(uint32_t, len(rigid_bodies))
+    data = buffer.data
+    offset = buffer.offset
+    pack_into = _rigid_body_t.pack_into
+    for r in rigid_bodies:
+        p = r.position
+        o = r.orientation
+        pack_into(data, offset, r.id_, p[0], p[1], p[2], o[0], o[1], o[2], o[3], r.mean_error, r._params)
+        offset += _rigid_body_t.size
+    buffer.offset = offset
 
 
 @attr.s
@@ -51,12 +87,20 @@ class Markerset(object):
         """Deserialize a Markerset from a ParseBuffer."""
         name = data.unpack_cstr()
         marker_count = data.unpack(uint32_t)
-        markers = [data.unpack(vector3_t) for i in range(marker_count)]
+        markers = data.unpack_array(vector3_t, marker_count)
         return Markerset(name, markers)
 
+    def serialized_size(self):
+        return cstr_size(self.name) + uint32_t.size + vector3_t.size*len(self.markers)
+
+    def serialize_into(self, buffer):
+        """Serialize a Markerset into a SerializeBuffer."""
+        buffer.pack_cstr(self.name)
+        buffer.pack(uint32_t, len(self.markers))
+        buffer.pack_array(vector3_t, self.markers)
+
     def serialize(self):
-        return self.name.encode('utf-8') + b'\0' + uint32_t.pack(len(self.markers)) + \
-               b''.join(vector3_t.pack(*marker) for marker in self.markers)
+        return _serialize(self)
 
 
 @attr.s
@@ -111,10 +155,16 @@ class RigidBody(object):
 
         return cls(id_, position, orientation, mean_error, params)
 
+    def serialized_size(self):
+        return _rigid_body_t.size
+
+    def serialize_into(self, buffer):
+        """Serialize a RigidBody into a SerializeBuffer."""
+        buffer.pack(_rigid_body_t, *((self.id_,) + tuple(self.position) + tuple(self.orientation) +
+                                     (self.mean_error, self._params)))
+
     def serialize(self):
-        return uint32_t.pack(self.id_) + vector3_t.pack(*self.position) + \
-               quaternion_t.pack(*self.orientation) + float_t.pack(self.mean_error) + \
-               int16_t.pack(self._params)
+        return _serialize(self)
 
     @property
     def tracking_valid(self):
@@ -146,6 +196,17 @@ class Skeleton(object):
         rigid_bodies = [RigidBody.deserialize(data, version) for i in range(rigid_body_count)]
         return cls(id_, rigid_bodies)
 
+    def serialized_size(self):
+        return uint32_t.size + uint32_t.size + _rigid_body_t.size*len(self.rigid_bodies)
+
+    def serialize_into(self, buffer):
+        """Serialize a Skeleton into a SerializeBuffer."""
+        buffer.pack(uint32_t, self.id_)
+        _pack_rigid_bodies(buffer, self.rigid_bodies)
+
+    def serialize(self):
+        return _serialize(self)
+
 
 @attr.s
 class LabelledMarker(object):
@@ -190,10 +251,17 @@ class LabelledMarker(object):
 
         return cls(model_id, marker_id, position, size, params, residual)
 
+    def serialized_size(self):
+        return _labelled_marker_t.size
+
+    def serialize_into(self, buffer):
+        """Serialize a LabelledMarker into a SerializeBuffer."""
+        p = self.position
+        buffer.pack(_labelled_marker_t, self.marker_id, self.model_id, p[0], p[1], p[2], self.size,
+                    self._params, self.residual)
+
     def serialize(self):
-        return uint16_t.pack(self.marker_id) + uint16_t.pack(self.model_id) + \
-               vector3_t.pack(*self.position) + float_t.pack(self.size) + \
-               int16_t.pack(self._params) + float_t.pack(self.residual)
+        return _serialize(self)
 
     _OCCLUDED = 0x01
     _POINT_CLOUD_SOLVED = 0x02
@@ -311,11 +379,427 @@ class TimingInfo(object):
         return cls(timecode, timecode_subframe, timestamp, camera_mid_exposure_timestamp,
                    camera_data_received_timestamp, transmit_timestamp)
 
+    def serialized_size(self):
+        return _timing_info_t.size
+
+    def serialize_into(self, buffer):
+        """Serialize timing information into a SerializeBuffer."""
+        buffer.pack(_timing_info_t, self.timecode, self.timecode_subframe, self.timestamp,
+                    self.camera_mid_exposure_timestamp, self.camera_data_received_timestamp,
+                    self.transmit_timestamp)
+
     def serialize(self):
-        return uint32_t.pack(self.timecode) + uint32_t.pack(self.timecode_subframe) + \
-            double_t.pack(self.timestamp) + uint64_t.pack(self.camera_mid_exposure_timestamp) + \
-            uint64_t.pack(self.camera_data_received_timestamp) + \
-            uint64_t.pack(self.transmit_timestamp)
+        return _serialize(self)
+
+
+class FrameDecoder(object):
+
+    """Parser for FrameOfData messages, specialised for one protocol version.
+
+    The ``deserialize`` methods above check the protocol version for every field of every element,
+    which adds up when there are hundreds of markers in each frame.  This class does all of those
+    checks once, when it is constructed, and combines the fixed-size fields of each element type
+    into a single :class:`struct.Struct`.  Use :meth:`for_version` rather than constructing one
+    directly, as constructing the plan isn't free.
+
+    Attributes:
+        version (:class:`~natnet.protocol.common.Version`): Protocol version this decoder parses
+    """
+
+    _cache = {}
+
+    def __init__(self, version):
+        self.version = version
+
+        self._has_skeletons = version > Version(2)
+        self._has_labelled_markers = version >= Version(2, 3)
+        self._has_force_plates = version >= Version(2, 9)
+        self._has_devices = version >= Version(2, 11)
+
+        # Frame number and markerset count
+        self._header_t = struct.Struct('<II')
+        # Params and the mystery field at the end
+        self._footer_t = struct.Struct('<hI')
+
+        # Rigid bodies are ID, position and orientation, then (before NatNet 3) the marker data,
+        # then mean error and params
+        self._rigid_body_has_mean_error = version >= Version(2)
+        self._rigid_body_has_params = version >= Version(2, 6) or version.major == 0
+        rigid_body_tail = ('f' if self._rigid_body_has_mean_error else '') + \
+            ('h' if self._rigid_body_has_params else '')
+        self._rigid_body_has_markers = version < Version(3)
+        self._rigid_body_has_marker_details = version >= Version(2)
+        if self._rigid_body_has_markers:
+            self._rigid_body_t = struct.Struct('<I7f')
+            # Starts with padding
+            self._rigid_body_tail_t = struct.Struct('<I' + rigid_body_tail)
+        else:
+            self._rigid_body_t = struct.Struct('<I7f' + rigid_body_tail)
+            self._rigid_body_tail_t = None
+
+        # Labelled markers have residual only if they have params, so pad the end with Nones
+        self._labelled_marker_has_params = version >= Version(2, 6) or version.major == 0
+        self._labelled_marker_has_residual = version >= Version(3) or version.major == 0
+        labelled_marker_tail = ('h' if self._labelled_marker_has_params else '') + \
+            ('f' if self._labelled_marker_has_residual else '')
+        self._labelled_marker_t = struct.Struct('<HH4f' + labelled_marker_tail)
+        self._labelled_marker_padding = (None,)*(2 - len(labelled_marker_tail))
+        self._model_ids_t_cache = {}
+
+        self._rigid_body_dtype = None
+        self._labelled_marker_dtype = None
+        if np is not None:
+            # Same layouts as the structs above, for the columnar path
+            self._rigid_body_dtype = np.dtype(
+                [('id_', '<u4'), ('position', '<f4', (3,)), ('orientation', '<f4', (4,))] +
+                ([('mean_error', '<f4')] if self._rigid_body_has_mean_error else []) +
+                ([('params', '<i2')] if self._rigid_body_has_params else []))
+            self._labelled_marker_dtype = np.dtype(
+                [('marker_id', '<u2'), ('model_id', '<u2'), ('position', '<f4', (3,)), ('size', '<f4')] +
+                ([('params', '<i2')] if self._labelled_marker_has_params else []) +
+                ([('residual', '<f4')] if self._labelled_marker_has_residual else []))
+
+        # Timing info has HPC timestamps only as of NatNet 3, so pad the end with Nones
+        timing_info_format = '<II' + ('d' if version >= Version(2, 7) else 'f')
+        self._timing_info_padding = (None, None, None)
+        if version >= Version(3) or version.major == 0:
+            timing_info_format += 'QQQ'
+            self._timing_info_padding = ()
+        self._timing_info_t = struct.Struct(timing_info_format)
+
+    @classmethod
+    def for_version(cls, version):
+        """Get the decoder for the given protocol version, constructing it on first use.
+
+        Args:
+            version (:class:`~natnet.protocol.common.Version`):
+        """
+        try:
+            return cls._cache[version]
+        except KeyError:
+            decoder = cls._cache[version] = cls(version)
+            return decoder
+
+    def _unpack_rigid_body(self, data):
+        fields = data.unpack(self._rigid_body_t)
+        if self._rigid_body_has_markers:
+            # TODO: Store these?
+            marker_count = data.unpack(uint32_t)
+            data.skip(vector3_t, marker_count)
+            if self._rigid_body_has_marker_details:
+                data.skip(uint32_t, marker_count)
+                data.skip(float_t, marker_count)
+            # Drop padding
+            fields += data.unpack_array(self._rigid_body_tail_t, 1)[0][1:]
+        return self._make_rigid_body(fields)
+
+    def _make_rigid_body(self, fields):
+        mean_error = fields[8] if self._rigid_body_has_mean_error else None
+        params = fields[-1] if self._rigid_body_has_params else None
+        return RigidBody(fields[0], fields[1:4], fields[4:8], mean_error, params)
+
+    def _skip_rigid_body(self, data):
+        data.skip(self._rigid_body_t)
+        if self._rigid_body_has_markers:
+            marker_count = data.unpack(uint32_t)
+            data.skip(vector3_t, marker_count)
+            if self._rigid_body_has_marker_details:
+                data.skip(uint32_t, marker_count)
+                data.skip(float_t, marker_count)
+            data.skip(self._rigid_body_tail_t)
+
+    def _unpack_selected_rigid_bodies(self, data, count, ids):
+        """Unpack only the rigid bodies with the given IDs, skipping over the rest."""
+        buffer_ = data.data
+        rigid_bodies = []
+        if self._rigid_body_has_markers:
+            # Variable-length, so walk through them one at a time
+            for i in range(count):
+                if uint32_t.unpack_from(buffer_, data.offset)[0] in ids:
+                    rigid_bodies.append(self._unpack_rigid_body(data))
+                else:
+                    self._skip_rigid_body(data)
+            return rigid_bodies
+        # Fixed-length, so just check the ID at the start of each one
+        size = self._rigid_body_t.size
+        start = data.offset
+        for offset in range(start, start + count*size, size):
+            if uint32_t.unpack_from(buffer_, offset)[0] in ids:
+                rigid_bodies.append(self._make_rigid_body(self._rigid_body_t.unpack_from(buffer_, offset)))
+        data.offset = start + count*size
+        return rigid_bodies
+
+    def _unpack_rigid_bodies(self, data, count):
+        if self._rigid_body_has_markers:
+            return [self._unpack_rigid_body(data) for i in range(count)]
+        make_rigid_body = self._make_rigid_body
+        return [make_rigid_body(fields) for fields in data.unpack_array(self._rigid_body_t, count)]
+
+    def _unpack_skeleton(self, data):
+        id_, rigid_body_count = data.unpack(self._header_t)
+        return Skeleton(id_, self._unpack_rigid_bodies(data, rigid_body_count))
+
+    def _unpack_labelled_markers(self, data, count):
+        padding = self._labelled_marker_padding
+        return [LabelledMarker(f[1], f[0], f[2:5], f[5], *(f[6:] + padding))
+                for f in data.unpack_array(self._labelled_marker_t, count)]
+
+    def _unpack_selected_labelled_markers(self, data, count, model_ids):
+        """Unpack only the labelled markers belonging to the given models, skipping over the rest."""
+        buffer_ = data.data
+        size = self._labelled_marker_t.size
+        padding = self._labelled_marker_padding
+        start = data.offset
+        labelled_markers = []
+        unpack_from = self._labelled_marker_t.unpack_from
+        model_ids_t = self._labelled_marker_model_ids_t(count)
+        for i, model_id in enumerate(model_ids_t.unpack_from(buffer_, start)):
+            if model_id in model_ids:
+                f = unpack_from(buffer_, start + i*size)
+                labelled_markers.append(LabelledMarker(f[1], f[0], f[2:5], f[5], *(f[6:] + padding)))
+        data.offset = start + count*size
+        return labelled_markers
+
+    def _labelled_marker_model_ids_t(self, count):
+        """Get a struct which unpacks just the model IDs from `count` consecutive labelled markers."""
+        try:
+            return self._model_ids_t_cache[count]
+        except KeyError:
+            pass
+        if len(self._model_ids_t_cache) > 64:
+            # The marker count changes all the time, so don't keep every struct forever
+            self._model_ids_t_cache.clear()
+        # Model ID is the second field
+        element = '2xH{}x'.format(self._labelled_marker_t.size - 4)
+        model_ids_t = self._model_ids_t_cache[count] = struct.Struct('<' + element*count)
+        return model_ids_t
+
+    def _unpack_array(self, data, dtype, count):
+        """Wrap the next `count` elements of the buffer in a structured array, without copying."""
+        array = np.frombuffer(data.data, dtype, count, data.offset)
+        data.offset += dtype.itemsize*count
+        return array
+
+    def _unpack_rigid_body_array(self, data, count):
+        if self._rigid_body_has_markers:
+            # Marker data makes the elements variable-length, so do it the slow way
+            rigid_bodies = self._unpack_rigid_bodies(data, count)
+            return np.array([(b.id_, b.position, b.orientation) +
+                             ((b.mean_error,) if self._rigid_body_has_mean_error else ()) +
+                             ((b._params,) if self._rigid_body_has_params else ())
+                             for b in rigid_bodies], self._rigid_body_dtype)
+        return self._unpack_array(data, self._rigid_body_dtype, count)
+
+    def _unpack_labelled_marker_array(self, data, count):
+        return self._unpack_array(data, self._labelled_marker_dtype, count)
+
+    def deserialize(self, data):
+        """Deserialize a FrameOfData message.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            MocapFrameMessage: Deserialized message
+        """
+        return self._deserialize(data, self._unpack_rigid_bodies, self._unpack_labelled_markers)
+
+    def deserialize_columnar(self, data):
+        """Deserialize a FrameOfData message, with rigid bodies and labelled markers as NumPy arrays.
+
+        Rather than a list of :class:`RigidBody` and a list of :class:`LabelledMarker`, the returned
+        message's ``rigid_bodies`` and ``labelled_markers`` are structured arrays with one record per
+        element.  The fields are named after the corresponding attributes (``id_``, ``position``,
+        ``orientation``, ``mean_error``, ``params`` and ``marker_id``, ``model_id``, ``position``,
+        ``size``, ``params``, ``residual``), and fields which are not present in this protocol
+        version are left out.  As of NatNet 3 both arrays are read-only views onto the packet, so
+        copy them if you need to keep them after the packet buffer is reused.
+
+        Requires NumPy.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            MocapFrameMessage: Deserialized message
+        """
+        if np is None:
+            raise ImportError('NumPy is required for columnar deserialization')
+        return self._deserialize(data, self._unpack_rigid_body_array, self._unpack_labelled_marker_array)
+
+    def deserialize_selected(self, data, rigid_body_ids=None, marker_model_ids=None, markerset_names=None):
+        """Deserialize a FrameOfData message, but only the selected rigid bodies, markers and markersets.
+
+        Anything which isn't selected is skipped over without being constructed, which saves most of
+        the parsing time when only a few rigid bodies out of many are needed.  Each selection is a
+        set, or None to include everything.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+            rigid_body_ids (set[int]): Streaming IDs of rigid bodies to include
+            marker_model_ids (set[int]): Include labelled markers whose model ID is in this set (0
+                for markers which aren't part of a model)
+            markerset_names (set[str]): Names of markersets to include
+
+        Returns:
+            MocapFrameMessage: Deserialized message
+        """
+        unpack_rigid_bodies = self._unpack_rigid_bodies
+        if rigid_body_ids is not None:
+            unpack_rigid_bodies = functools.partial(self._unpack_selected_rigid_bodies, ids=rigid_body_ids)
+        unpack_labelled_markers = self._unpack_labelled_markers
+        if marker_model_ids is not None:
+            unpack_labelled_markers = functools.partial(self._unpack_selected_labelled_markers,
+                                                        model_ids=marker_model_ids)
+        unpack_markersets = self._unpack_markersets
+        if markerset_names is not None:
+            unpack_markersets = functools.partial(self._unpack_selected_markersets, names=markerset_names)
+        return self._deserialize(data, unpack_rigid_bodies, unpack_labelled_markers, unpack_markersets)
+
+    def _unpack_markersets(self, data, count):
+        return [Markerset.deserialize(data) for i in range(count)]
+
+    def _unpack_selected_markersets(self, data, count, names):
+        markersets = []
+        for i in range(count):
+            name = data.unpack_cstr()
+            marker_count = data.unpack(uint32_t)
+            if name in names:
+                markersets.append(Markerset(name, data.unpack_array(vector3_t, marker_count)))
+            else:
+                data.skip(vector3_t, marker_count)
+        return markersets
+
+    def _unpack_skeletons(self, data, count):
+        return [self._unpack_skeleton(data) for i in range(count)]
+
+    def _unpack_devices(self, data, count):
+        # Force plates and devices have the same data
+        return [Device.deserialize(data) for i in range(count)]
+
+    _unpack_force_plates = _unpack_devices
+
+    def _unpack_timing_info(self, data, count=None):
+        return TimingInfo(*(data.unpack(self._timing_info_t) + self._timing_info_padding))
+
+    def _deserialize(self, data, unpack_rigid_bodies, unpack_labelled_markers, unpack_markersets=None):
+        frame_number, markerset_count = data.unpack(self._header_t)
+        markersets = (unpack_markersets or self._unpack_markersets)(data, markerset_count)
+
+        unlabelled_markers_count = data.unpack(uint32_t)
+        data.skip(vector3_t, unlabelled_markers_count)
+
+        rigid_body_count = data.unpack(uint32_t)
+        rigid_bodies = unpack_rigid_bodies(data, rigid_body_count)
+
+        skeletons = []
+        if self._has_skeletons:
+            # TODO: Original version check here contradicted comment
+            skeleton_count = data.unpack(uint32_t)
+            skeletons = self._unpack_skeletons(data, skeleton_count)
+
+        labelled_marker_count = 0
+        if self._has_labelled_markers:
+            # TODO: Original version check here contradicted PacketClient
+            labelled_marker_count = data.unpack(uint32_t)
+        labelled_markers = unpack_labelled_markers(data, labelled_marker_count)
+
+        force_plates = []
+        if self._has_force_plates:
+            force_plate_count = data.unpack(uint32_t)
+            force_plates = self._unpack_devices(data, force_plate_count)
+
+        devices = []
+        if self._has_devices:
+            device_count = data.unpack(uint32_t)
+            devices = self._unpack_devices(data, device_count)
+
+        timing_info = self._unpack_timing_info(data)
+
+        # TODO: Shouldn't this be a uint16_t?
+        # No idea what the second field is, but this is how long packets are
+        params, unknown = data.unpack(self._footer_t)  # noqa: F841
+
+        return MocapFrameMessage(frame_number, markersets, rigid_bodies, skeletons, labelled_markers,
+                                 force_plates, devices, timing_info, params)
+
+    def _skip_rigid_bodies(self, data, count):
+        if self._rigid_body_has_markers:
+            for i in range(count):
+                self._skip_rigid_body(data)
+        else:
+            data.skip(self._rigid_body_t, count)
+
+    def _skip_markersets(self, data, count):
+        for i in range(count):
+            data.skip_cstr()
+            marker_count = data.unpack(uint32_t)
+            data.skip(vector3_t, marker_count)
+
+    def _skip_skeletons(self, data, count):
+        for i in range(count):
+            id_, rigid_body_count = data.unpack(self._header_t)
+            self._skip_rigid_bodies(data, rigid_body_count)
+
+    def _skip_labelled_markers(self, data, count):
+        data.skip(self._labelled_marker_t, count)
+
+    def _skip_devices(self, data, count):
+        for i in range(count):
+            id_, channel_count = data.unpack(self._header_t)
+            for j in range(channel_count):
+                frame_count = data.unpack(uint32_t)
+                data.skip(uint32_t, frame_count)
+
+    def _scan_section(self, data, sections, name, skip, present=True):
+        """Record the offset and element count of a section, then skip over it."""
+        count = data.unpack(uint32_t) if present else 0
+        sections[name] = (data.offset, count)
+        skip(data, count)
+
+    def peek_timing_info(self, data):
+        """Get the timing information from a FrameOfData payload without parsing the rest.
+
+        The timing information is a fixed distance from the end of the message, so this is cheap.
+        This doesn't move the buffer's offset.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            TimingInfo:
+        """
+        offset = len(data.data) - self._footer_t.size - self._timing_info_t.size
+        return self._unpack_timing_info(ParseBuffer(data.data, offset))
+
+    def deserialize_lazy(self, data):
+        """Deserialize a FrameOfData message, but only parse each section when it is accessed.
+
+        This walks the message to find where each section starts, which for NatNet 3 is just
+        arithmetic for everything except markersets, skeletons and devices, and even those are only
+        skipped over rather than parsed.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            LazyMocapFrame: Message which parses sections on demand
+        """
+        sections = {}
+        frame_number = data.unpack(uint32_t)
+        self._scan_section(data, sections, 'markersets', self._skip_markersets)
+        unlabelled_markers_count = data.unpack(uint32_t)
+        data.skip(vector3_t, unlabelled_markers_count)
+        self._scan_section(data, sections, 'rigid_bodies', self._skip_rigid_bodies)
+        self._scan_section(data, sections, 'skeletons', self._skip_skeletons, self._has_skeletons)
+        self._scan_section(data, sections, 'labelled_markers', self._skip_labelled_markers,
+                           self._has_labelled_markers)
+        self._scan_section(data, sections, 'force_plates', self._skip_devices, self._has_force_plates)
+        self._scan_section(data, sections, 'devices', self._skip_devices, self._has_devices)
+        sections['timing_info'] = (data.offset, None)
+        data.skip(self._timing_info_t)
+        params, unknown = data.unpack(self._footer_t)  # noqa: F841
+        return LazyMocapFrame(self, data.data, frame_number, sections, params)
 
 
 @register_message(MessageId.FrameOfData)
@@ -358,76 +842,162 @@ class MocapFrameMessage(object):
             MocapFrameMessage: Deserialized message
         """
 
-        frame_number = data.unpack(uint32_t)
+        return cls.decoder(version).deserialize(data)
 
-        markerset_count = data.unpack(uint32_t)
-        markersets = [Markerset.deserialize(data, version) for i in range(markerset_count)]
+    @classmethod
+    def deserialize_columnar(cls, data, version):
+        """Deserialize a FrameOfData message with rigid bodies and labelled markers as NumPy arrays.
 
-        unlabelled_markers_count = data.unpack(uint32_t)
-        data.skip(vector3_t, unlabelled_markers_count)
+        See :meth:`FrameDecoder.deserialize_columnar`.
 
-        rigid_body_count = data.unpack(uint32_t)
-        rigid_bodies = [RigidBody.deserialize(data, version) for i in range(rigid_body_count)]
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+            version (:class:`~natnet.protocol.common.Version`):
 
-        skeletons = []
-        if version > Version(2):
-            # TODO: Original version check here contradicted comment
-            skeleton_count = data.unpack(uint32_t)
-            skeletons = [Skeleton.deserialize(data, version) for i in range(skeleton_count)]
+        Returns:
+            MocapFrameMessage: Deserialized message
+        """
+        return cls.decoder(version).deserialize_columnar(data)
 
-        labelled_markers = []
-        if version >= Version(2, 3):
-            # TODO: Original version check here contradicted PacketClient
-            labelled_marker_count = data.unpack(uint32_t)
-            labelled_markers = [LabelledMarker.deserialize(data, version) for i in range(labelled_marker_count)]
+    @classmethod
+    def deserialize_lazy(cls, data, version):
+        """Deserialize a FrameOfData message, but only parse each section when it is accessed.
 
-        force_plates = []
-        if version >= Version(2, 9):
-            force_plate_count = data.unpack(uint32_t)
-            # Force plates and devices have the same data
-            force_plates = [Device.deserialize(data, version) for i in range(force_plate_count)]
+        See :meth:`FrameDecoder.deserialize_lazy`.
 
-        devices = []
-        if version >= Version(2, 11):
-            device_count = data.unpack(uint32_t)
-            devices = [Device.deserialize(data, version) for i in range(device_count)]
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+            version (:class:`~natnet.protocol.common.Version`):
 
-        timing_info = TimingInfo.deserialize(data, version)
+        Returns:
+            LazyMocapFrame: Message which parses sections on demand
+        """
+        return cls.decoder(version).deserialize_lazy(data)
 
-        # TODO: Shouldn't this be a uint16_t?
-        params = data.unpack(int16_t)
+    @classmethod
+    def deserialize_selected(cls, data, version, rigid_body_ids=None, marker_model_ids=None,
+                             markerset_names=None):
+        """Deserialize a FrameOfData message, but only the selected rigid bodies, markers and markersets.
+
+        See :meth:`FrameDecoder.deserialize_selected`.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+            version (:class:`~natnet.protocol.common.Version`):
+            rigid_body_ids (set[int]):
+            marker_model_ids (set[int]):
+            markerset_names (set[str]):
+
+        Returns:
+            MocapFrameMessage: Deserialized message
+        """
+        return cls.decoder(version).deserialize_selected(data, rigid_body_ids, marker_model_ids,
+                                                         markerset_names)
 
-        # No idea what this is, but this is how long packets are
-        unknown = data.unpack(uint32_t)  # noqa: F841
+    @staticmethod
+    def peek_frame_number(data):
+        """Get the frame number from a FrameOfData payload without parsing it.
 
-        return cls(frame_number, markersets, rigid_bodies, skeletons, labelled_markers,
-                   force_plates, devices, timing_info, params)
+        This doesn't move the buffer's offset, and works for any protocol version.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            int:
+        """
+        return uint32_t.unpack_from(data.data, data.offset)[0]
+
+    @staticmethod
+    def peek_tracked_models_changed(data):
+        """Check the tracked models changed flag of a FrameOfData payload without parsing it.
+
+        This doesn't move the buffer's offset, and works for any protocol version.
+
+        Args:
+            data (:class:`~natnet.protocol.common.ParseBuffer`):
+
+        Returns:
+            bool:
+        """
+        # Params is followed by one more uint32 at the end of the message
+        params, = int16_t.unpack_from(data.data, len(data.data) - int16_t.size - uint32_t.size)
+        return (params & 0x02) != 0
+
+    @staticmethod
+    def decoder(version):
+        """Get the (cached) :class:`FrameDecoder` for the given protocol version."""
+        return FrameDecoder.for_version(version)
+
+    def _unlabelled_marker_positions(self, include_unlabelled):
+        if not include_unlabelled:
+            return []
+        # Hack to match recorded packet in tests
+        return [l.position for l in self.labelled_markers if l.model_id != 0]
+
+    def serialized_size(self, include_unlabelled=False):
+        """Size of the serialized payload in bytes, so it can be packed into one buffer."""
+        # Frame number and a count for each of the seven lists
+        size = uint32_t.size*8
+        size += sum(m.serialized_size() for m in self.markersets)
+        size += vector3_t.size*len(self._unlabelled_marker_positions(include_unlabelled))
+        size += _rigid_body_t.size*len(self.rigid_bodies)
+        size += sum(s.serialized_size() for s in self.skeletons)
+        size += _labelled_marker_t.size*len(self.labelled_markers)
+        assert not self.force_plates and not self.devices, \
+            'Serializing force plates and devices is not implemented'
+        return size + _timing_info_t.size + _frame_footer_t.size
+
+    def serialize_into(self, buffer, include_unlabelled=False):
+        """Serialize a FrameOfData message payload into a SerializeBuffer.
+
+        Args:
+            buffer (:class:`~natnet.protocol.common.SerializeBuffer`): Buffer with at least
+                :meth:`serialized_size` bytes remaining
+            include_unlabelled (bool): Include the rigid body markers as unlabelled markers
+        """
+        buffer.pack(uint32_t, self.frame_number)
+        buffer.pack(uint32_t, len(self.markersets))
+        for m in self.markersets:
+            m.serialize_into(buffer)
+        positions = self._unlabelled_marker_positions(include_unlabelled)
+        buffer.pack(uint32_t, len(positions))
+        buffer.pack_array(vector3_t, positions)
+        _pack_rigid_bodies(buffer, self.rigid_bodies)
+        buffer.pack(uint32_t, len(self.skeletons))
+        for s in self.skeletons:
+            s.serialize_into(buffer)
+
+        buffer.pack(uint32_t, len(self.labelled_markers))
+        data = buffer.data
+        offset = buffer.offset
+        pack_into = _labelled_marker_t.pack_into
+        for l in self.labelled_markers:
+            p = l.position
+            pack_into(data, offset, l.marker_id, l.model_id, p[0], p[1], p[2], l.size, l._params,
+                      l.residual)
+            offset += _labelled_marker_t.size
+        buffer.offset = offset
+
+        buffer.pack(uint32_t, len(self.force_plates))
+        buffer.pack(uint32_t, len(self.devices))
+        self.timing_info.serialize_into(buffer)
+        buffer.pack(_frame_footer_t, self._params, 0)
 
     def serialize(self, include_unlabelled=False):
-        frame_number = uint32_t.pack(self.frame_number)
-        markersets = uint32_t.pack(len(self.markersets)) + \
-            b''.join(m.serialize() for m in self.markersets)
-        unlabelled_markers = uint32_t.pack(0)
-        if include_unlabelled:
-            # Hack to match recorded packet in tests
-            positions = [l.position for l in self.labelled_markers if l.model_id != 0]
-            unlabelled_markers = uint32_t.pack(len(positions)) + \
-                b''.join(vector3_t.pack(*p) for p in positions)
-        rigid_bodies = uint32_t.pack(len(self.rigid_bodies)) + \
-            b''.join(r.serialize() for r in self.rigid_bodies)
-        skeletons = uint32_t.pack(len(self.skeletons)) + \
-            b''.join(s.serialize() for s in self.skeletons)
-        labelled_markers = uint32_t.pack(len(self.labelled_markers)) + \
-            b''.join(l.serialize() for l in self.labelled_markers)
-        force_plates = uint32_t.pack(len(self.force_plates)) + \
-            b''.join(f.serialize() for f in self.force_plates)
-        devices = uint32_t.pack(len(self.devices)) + \
-            b''.join(d.serialize() for d in self.devices)
-        timing_info = self.timing_info.serialize()
-        params = uint16_t.pack(self._params)
-        unknown = uint32_t.pack(0)
-        return frame_number + markersets + unlabelled_markers + rigid_bodies + skeletons + \
-            labelled_markers + force_plates + devices + timing_info + params + unknown
+        return _serialize(self, include_unlabelled)
+
+    @property
+    def markerset_count(self):
+        return len(self.markersets)
+
+    @property
+    def rigid_body_count(self):
+        return len(self.rigid_bodies)
+
+    @property
+    def labelled_marker_count(self):
+        return len(self.labelled_markers)
 
     @property
     def is_recording(self):
@@ -440,3 +1010,72 @@ class MocapFrameMessage(object):
         """True if the tracked models have changed since the last frame."""
         assert self._params is not None
         return (self._params & 0x02) != 0
+
+
+class LazyMocapFrame(object):
+
+    """Frame of mocap data which is only parsed as it is accessed.
+
+    This has the same attributes as :class:`MocapFrameMessage`, so can be used in its place, but
+    each list is only parsed the first time it's accessed.  Get one from
+    :meth:`MocapFrameMessage.deserialize_lazy`.
+
+    This keeps a reference to the packet, so if the packet is in a buffer which will be reused
+    then all of the sections you need must be accessed before that happens.
+
+    Attributes:
+        frame_number (int):
+        markerset_count (int):
+        rigid_body_count (int):
+        labelled_marker_count (int):
+    """
+
+    def __init__(self, decoder, data, frame_number, sections, params):
+        """
+        Args:
+            decoder (:class:`FrameDecoder`):
+            data (memoryview): Packet payload
+            frame_number (int):
+            sections (dict[str, tuple[int, int]]): Offset and element count of each section
+            params (int):
+        """
+        self._decoder = decoder
+        self._data = data
+        self._sections = sections
+        self._cache = {}
+        self.frame_number = frame_number
+        self._params = params
+
+    def _section(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            offset, count = self._sections[name]
+            unpack = getattr(self._decoder, '_unpack_' + name)
+            value = self._cache[name] = unpack(ParseBuffer(self._data, offset), count)
+            return value
+
+    markersets = property(lambda self: self._section('markersets'))
+    rigid_bodies = property(lambda self: self._section('rigid_bodies'))
+    skeletons = property(lambda self: self._section('skeletons'))
+    labelled_markers = property(lambda self: self._section('labelled_markers'))
+    force_plates = property(lambda self: self._section('force_plates'))
+    devices = property(lambda self: self._section('devices'))
+    timing_info = property(lambda self: self._section('timing_info'))
+
+    markerset_count = property(lambda self: self._sections['markersets'][1])
+    rigid_body_count = property(lambda self: self._sections['rigid_bodies'][1])
+    labelled_marker_count = property(lambda self: self._sections['labelled_markers'][1])
+
+    is_recording = MocapFrameMessage.is_recording
+    tracked_models_changed = MocapFrameMessage.tracked_models_changed
+
+    def to_message(self):
+        """Parse any remaining sections and return an equivalent :class:`MocapFrameMessage`."""
+        return MocapFrameMessage(self.frame_number, self.markersets, self.rigid_bodies, self.skeletons,
+                                 self.labelled_markers, self.force_plates, self.devices,
+                                 self.timing_info, self._params)
+
+    def __repr__(self):
+        return 'LazyMocapFrame(frame_number={!r}, parsed={!r})'.format(
+            self.frame_number, sorted(self._cache))
@@ -15,7 +15,7 @@ sends a RequestModelDefinitions message to prompt the server to send this.
 """
 
 __all__ = ['ModelDefinitionsMessage', 'MarkersetDescription', 'RigidBodyDescription', 'SkeletonDescription',
-           'ForcePlateDescription', 'DeviceDescription']
+           'ForcePlateDescription', 'DeviceDescription', 'ModelIndex']
 try:
     # Only need this for type annotations
     from typing import Optional  # noqa: F401
@@ -23,6 +23,7 @@ except ImportError:
     pass
 
 import enum
+import numbers
 
 import attr
 
@@ -139,12 +140,14 @@ class RigidBodyDescription(object):
 
         return cls(name, id_, parent_id, offset_from_parent, marker_positions, required_active_labels)
 
-    def serialize(self):
-        return self.name.encode('utf-8') + b'\0' + int32_t.pack(self.id_) + \
-               int32_t.pack(self.parent_id) + vector3_t.pack(*self.offset_from_parent) + \
-               uint32_t.pack(len(self.marker_positions)) + \
-               b''.join(vector3_t.pack(*m) for m in self.marker_positions) + \
-               b''.join(uint32_t.pack(l) for l in self.required_active_labels)
+    def serialize(self, skip_markers=False):
+        data = self.name.encode('utf-8') + b'\0' + int32_t.pack(self.id_) + \
+            int32_t.pack(self.parent_id) + vector3_t.pack(*self.offset_from_parent)
+        if not skip_markers:
+            data += uint32_t.pack(len(self.marker_positions)) + \
+                b''.join(vector3_t.pack(*m) for m in self.marker_positions) + \
+                b''.join(uint32_t.pack(l) for l in self.required_active_labels)
+        return data
 
 
 @_registry.register_message(ModelType.Skeleton)
@@ -172,6 +175,11 @@ class SkeletonDescription(object):
                         for i in range(rigid_body_count)]
         return cls(name, id_, rigid_bodies)
 
+    def serialize(self):
+        return self.name.encode('utf-8') + b'\0' + int32_t.pack(self.id_) + \
+               int32_t.pack(len(self.rigid_bodies)) + \
+               b''.join(r.serialize(skip_markers=True) for r in self.rigid_bodies)
+
 
 @_registry.register_message(ModelType.ForcePlate)
 @attr.s
@@ -234,3 +242,207 @@ class ModelDefinitionsMessage(object):
 
     def serialize(self):
         return uint32_t.pack(len(self.models)) + b''.join(_registry.serialize(m) for m in self.models)
+
+
+class ModelIndex(object):
+
+    """Index of model definitions, for looking models up by streaming ID or name.
+
+    Skeleton bones are streamed as rigid bodies with ID ``skeleton_id << 16 | bone_id``, which
+    :meth:`bone` decodes.  When new model definitions arrive, :meth:`update` only reindexes the
+    models which have actually changed.
+
+    Attributes:
+        models (list): Every model description, in the order they were received
+        rigid_bodies (list[:class:`RigidBodyDescription`]):
+        skeletons (list[:class:`SkeletonDescription`]):
+        markersets (list[:class:`MarkersetDescription`]):
+    """
+
+    def __init__(self, models=()):
+        self.models = []
+        self.rigid_bodies = []
+        self.skeletons = []
+        self.markersets = []
+        self._by_key = {}
+        self._rigid_bodies_by_id = {}
+        self._rigid_bodies_by_name = {}
+        self._skeletons_by_id = {}
+        self._skeletons_by_name = {}
+        self._markersets_by_name = {}
+        self._markerset_slots = {}
+        self._bones = {}
+        self.update(models)
+
+    @staticmethod
+    def _key(model):
+        if type(model) is MarkersetDescription:
+            return type(model), model.name
+        return type(model), model.id_
+
+    @staticmethod
+    def split_bone_id(id_):
+        """Split a skeleton bone's streaming ID into skeleton ID and bone ID.
+
+        Returns:
+            tuple[int, int]:
+        """
+        return id_ >> 16, id_ & 0xffff
+
+    def _add(self, model):
+        model_type = type(model)
+        if model_type is RigidBodyDescription:
+            self._rigid_bodies_by_id[model.id_] = model
+            self._rigid_bodies_by_name[model.name] = model
+        elif model_type is SkeletonDescription:
+            self._skeletons_by_id[model.id_] = model
+            self._skeletons_by_name[model.name] = model
+            for bone in model.rigid_bodies:
+                # Bone descriptions may or may not include the skeleton ID
+                self._bones[model.id_, bone.id_ & 0xffff] = (model, bone)
+        elif model_type is MarkersetDescription:
+            self._markersets_by_name[model.name] = model
+
+    def _remove(self, model):
+        model_type = type(model)
+        if model_type is RigidBodyDescription:
+            self._rigid_bodies_by_id.pop(model.id_, None)
+            if self._rigid_bodies_by_name.get(model.name) is model:
+                del self._rigid_bodies_by_name[model.name]
+        elif model_type is SkeletonDescription:
+            self._skeletons_by_id.pop(model.id_, None)
+            if self._skeletons_by_name.get(model.name) is model:
+                del self._skeletons_by_name[model.name]
+            for bone in model.rigid_bodies:
+                self._bones.pop((model.id_, bone.id_ & 0xffff), None)
+        elif model_type is MarkersetDescription:
+            self._markersets_by_name.pop(model.name, None)
+
+    def update(self, models):
+        """Replace the indexed models with a new list of model descriptions.
+
+        Models which are the same as before are left alone, and only the ones which have been added,
+        removed or changed are reindexed.
+
+        Args:
+            models (list): Model descriptions, e.g. from :class:`ModelDefinitionsMessage`
+
+        Returns:
+            tuple[list, list]: Model descriptions which were added (or changed), and which were
+            removed (or changed)
+        """
+        by_key = {}
+        added = []
+        for model in models:
+            key = self._key(model)
+            by_key[key] = model
+            old_model = self._by_key.get(key)
+            if old_model is None or old_model != model:
+                added.append(model)
+        removed = [old_model for key, old_model in self._by_key.items()
+                   if key not in by_key or by_key[key] != old_model]
+
+        for model in removed:
+            self._remove(model)
+        for model in added:
+            self._add(model)
+        self._by_key = by_key
+
+        # Rebuild the lists rather than changing them, so any references to the old ones are unaffected
+        self.models = list(models)
+        self.rigid_bodies = [m for m in self.models if type(m) is RigidBodyDescription]
+        self.skeletons = [m for m in self.models if type(m) is SkeletonDescription]
+        self.markersets = [m for m in self.models if type(m) is MarkersetDescription]
+        self._markerset_slots = {m.name: i for i, m in enumerate(self.markersets)}
+        return added, removed
+
+    def rigid_body(self, key):
+        """Get a rigid body description by streaming ID or name.
+
+        Raises KeyError if there isn't one.
+
+        Args:
+            key (int or str):
+
+        Returns:
+            RigidBodyDescription:
+        """
+        if isinstance(key, numbers.Integral):
+            return self._rigid_bodies_by_id[key]
+        return self._rigid_bodies_by_name[key]
+
+    def skeleton(self, key):
+        """Get a skeleton description by streaming ID or name.
+
+        Raises KeyError if there isn't one.
+
+        Args:
+            key (int or str):
+
+        Returns:
+            SkeletonDescription:
+        """
+        if isinstance(key, numbers.Integral):
+            return self._skeletons_by_id[key]
+        return self._skeletons_by_name[key]
+
+    def markerset(self, name):
+        """Get a markerset description by name.
+
+        Raises KeyError if there isn't one.
+
+        Returns:
+            MarkersetDescription:
+        """
+        return self._markersets_by_name[name]
+
+    def markerset_slot(self, name):
+        """Get the index of a markerset in :attr:`markersets`, which is where it appears in each frame.
+
+        Returns:
+            int or None: Index, or None if there's no such markerset
+        """
+        return self._markerset_slots.get(name)
+
+    def bone(self, id_):
+        """Get the skeleton and bone descriptions for a skeleton bone's streaming ID.
+
+        Raises KeyError if there isn't one.
+
+        Args:
+            id_ (int): Streaming ID, which is ``skeleton_id << 16 | bone_id``
+
+        Returns:
+            tuple[SkeletonDescription, RigidBodyDescription]:
+        """
+        return self._bones[self.split_bone_id(id_)]
+
+    def name(self, id_):
+        """Get the name of a rigid body, skeleton or skeleton bone from its streaming ID.
+
+        Raises KeyError if there isn't one.
+
+        Returns:
+            str:
+        """
+        for by_id in (self._rigid_bodies_by_id, self._skeletons_by_id):
+            try:
+                return by_id[id_].name
+            except KeyError:
+                pass
+        return self.bone(id_)[1].name
+
+    def id(self, name):
+        """Get the streaming ID of a rigid body or skeleton from its name.
+
+        Raises KeyError if there isn't one.
+
+        Returns:
+            int:
+        """
+        for by_name in (self._rigid_bodies_by_name, self._skeletons_by_name):
+            try:
+                return by_name[name].id_
+            except KeyError:
+                pass
+        raise KeyError(name)
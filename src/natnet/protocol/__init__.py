@@ -23,7 +23,8 @@ __all__ = [
     'MessageId', 'Version',
     # Messages
     'ConnectMessage', 'DiscoveryMessage', 'EchoRequestMessage', 'EchoResponseMessage',
-    'MocapFrameMessage', 'ModelDefinitionsMessage', 'RequestModelDefinitionsMessage', 'ServerInfoMessage']
+    'KeepAliveMessage', 'MocapFrameMessage', 'ModelDefinitionsMessage', 'RequestModelDefinitionsMessage',
+    'ServerInfoMessage']
 
 from .common import (MessageId, Version, deserialize, deserialize_header, deserialize_payload,
                      serialize)
@@ -31,6 +32,7 @@ from .ConnectMessage import ConnectMessage
 from .DiscoveryMessage import DiscoveryMessage
 from .EchoRequestMessage import EchoRequestMessage
 from .EchoResponseMessage import EchoResponseMessage
+from .KeepAliveMessage import KeepAliveMessage
 from .MocapFrameMessage import MocapFrameMessage
 from .ModelDefinitionsMessage import ModelDefinitionsMessage
 from .RequestModelDefinitionsMessage import RequestModelDefinitionsMessage
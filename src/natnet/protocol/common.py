@@ -71,9 +71,9 @@ class ParseBuffer(object):
     Contains a buffer and an offset, and provides methods for unpacking data types (as struct.Struct
     instances) from the buffer."""
 
-    def __init__(self, data):
+    def __init__(self, data, offset=0):
         self.data = memoryview(data)
-        self.offset = 0
+        self.offset = offset
 
     def __len__(self):
         """Length of remaining part of buffer."""
@@ -89,12 +89,31 @@ class ParseBuffer(object):
         Args:
             struct_type (struct.Struct): Type of field to unpack
         """
-        value = struct_type.unpack(self.data[self.offset:self.offset + struct_type.size])
+        value = struct_type.unpack_from(self.data, self.offset)
         if len(value) == 1:
             value = value[0]
         self.offset += struct_type.size
         return value
 
+    def unpack_array(self, struct_type, n):
+        """Unpack `n` consecutive fields of the given type.
+
+        Unlike :meth:`unpack`, each field is returned as a tuple even if it only has one member.
+
+        Args:
+            struct_type (struct.Struct): Type of each field
+            n (int): Number of fields
+
+        Returns:
+            list[tuple]:
+        """
+        data = self.data
+        offset = self.offset
+        size = struct_type.size
+        values = [struct_type.unpack_from(data, offset + i*size) for i in range(n)]
+        self.offset = offset + size*n
+        return values
+
     def unpack_cstr(self, size=None):
         """Unpack a null-terminated string field.
 
@@ -114,6 +133,19 @@ class ParseBuffer(object):
             self.offset += len(value) + 1
         return value.decode('utf-8')
 
+    def skip_cstr(self):
+        """Skip a null-terminated string field."""
+        # Strings are short, so look for the null in small chunks rather than copying the rest of the buffer
+        chunk_size = 64
+        offset = self.offset
+        while True:
+            chunk = self.data[offset:offset + chunk_size].tobytes()
+            end = chunk.find(b'\0')
+            if end >= 0 or len(chunk) < chunk_size:
+                self.offset = offset + (end if end >= 0 else len(chunk)) + 1
+                return
+            offset += chunk_size
+
     def unpack_bytes(self, size):
         """Unpack a fixed-length field of bytes."""
         value = self.data[self.offset:self.offset + size].tobytes()
@@ -121,6 +153,89 @@ class ParseBuffer(object):
         return value
 
 
+class SerializeBuffer(object):
+
+    """Output buffer for serializing messages.
+
+    The counterpart of :class:`ParseBuffer`: contains a preallocated bytearray and an offset, and
+    provides methods for packing data types (as struct.Struct instances) into the buffer in place.
+    Messages which know their serialized size up front implement ``serialized_size()`` and
+    ``serialize_into(buffer)``, so that a whole packet is written without building intermediate
+    bytes objects.
+
+    A buffer can be reused for several packets with :meth:`reset`."""
+
+    def __init__(self, size=0):
+        self.data = bytearray(size)
+        self.offset = 0
+
+    def __len__(self):
+        """Length of remaining part of buffer."""
+        return len(self.data) - self.offset
+
+    def reset(self, size):
+        """Rewind to the start of the buffer, and make sure it can hold at least `size` bytes.
+
+        If the buffer has to grow it is replaced rather than resized, so views returned by
+        :meth:`getvalue` stay valid (but will see their contents overwritten if it doesn't).
+        """
+        if len(self.data) < size:
+            self.data = bytearray(size)
+        self.offset = 0
+
+    def pack(self, struct_type, *values):
+        """Pack a field.
+
+        Args:
+            struct_type (struct.Struct): Type of field to pack
+            values: Value of each member of the field
+        """
+        struct_type.pack_into(self.data, self.offset, *values)
+        self.offset += struct_type.size
+
+    def pack_array(self, struct_type, values):
+        """Pack consecutive fields of the given type.
+
+        Like :meth:`~ParseBuffer.unpack_array`, each value is a tuple even if the field only has one
+        member.
+
+        Args:
+            struct_type (struct.Struct): Type of each field
+            values (list[tuple]): Members of each field
+        """
+        data = self.data
+        offset = self.offset
+        pack_into = struct_type.pack_into
+        size = struct_type.size
+        for value in values:
+            pack_into(data, offset, *value)
+            offset += size
+        self.offset = offset
+
+    def pack_bytes(self, value):
+        """Pack a field of raw bytes."""
+        end = self.offset + len(value)
+        self.data[self.offset:end] = value
+        self.offset = end
+
+    def pack_cstr(self, value):
+        """Pack a null-terminated string field."""
+        self.pack_bytes(value.encode('utf-8') + b'\0')
+
+    def getvalue(self):
+        """Get a view of the part of the buffer which has been packed so far.
+
+        Returns:
+            memoryview:
+        """
+        return memoryview(self.data)[:self.offset]
+
+
+def cstr_size(value):
+    """Size of a string once serialized as a null-terminated string field."""
+    return len(value.encode('utf-8')) + 1
+
+
 class Version(collections.namedtuple('Version', ('major', 'minor', 'build', 'revision'))):
 
     """NatNet version, with correct comparison operator.
@@ -157,6 +272,7 @@ class SerDesRegistry(object):
 
     _implementation_types = attr.ib(default=attr.Factory(dict))
     _version = attr.ib(default=Version(3))
+    _decoders = attr.ib(default=attr.Factory(dict))
 
     def register_message(self, id_):
         """Decorator to register the class which implements a given message.
@@ -168,23 +284,54 @@ class SerDesRegistry(object):
         def register_message_impl(cls):
             cls.message_id = id_
             self._implementation_types[id_] = cls
+            self._decoders.clear()
             return cls
 
         return register_message_impl
 
-    @staticmethod
-    def serialize(message):
+    _header_t = struct.Struct('<HH')
+
+    @classmethod
+    def serialize(cls, message, buffer=None):
         """Serialize a message instance into a binary packet.
 
+        If the message implementation has ``serialized_size`` and ``serialize_into`` methods, the
+        header and payload are packed straight into one buffer, otherwise the payload from
+        ``serialize`` is appended to the header.
+
         Args:
             message: A message instance
+            buffer (:class:`SerializeBuffer`): Buffer to reuse, if any
 
         Returns:
-            bytes: The message serialized as a packet, ready to be sent
+            bytes or memoryview: The message serialized as a packet, ready to be sent.  If `buffer`
+            is given this is a view into it, which is only valid until the buffer is reused.
         """
         message_id = message.message_id
-        payload = message.serialize()
-        return uint16_t.pack(message_id) + uint16_t.pack(len(payload)) + payload
+        serialized_size = getattr(message, 'serialized_size', None)
+        if serialized_size is None:
+            payload = message.serialize()
+            packet = cls._header_t.pack(message_id, len(payload)) + payload
+            if buffer is None:
+                return packet
+            buffer.reset(len(packet))
+            buffer.pack_bytes(packet)
+            return buffer.getvalue()
+
+        size = serialized_size()
+        if buffer is None:
+            data = SerializeBuffer(cls._header_t.size + size)
+        else:
+            data = buffer
+            data.reset(cls._header_t.size + size)
+        data.pack(cls._header_t, message_id, size)
+        message.serialize_into(data)
+        assert data.offset == cls._header_t.size + size, \
+            '{} serialized to {} bytes, but expected {}'.format(
+                type(message).__name__, data.offset - cls._header_t.size, size)
+        if buffer is None:
+            return bytes(data.data)
+        return data.getvalue()
 
     @staticmethod
     def deserialize_header(data):
@@ -203,6 +350,27 @@ class SerDesRegistry(object):
             .format(len(data), length)
         return message_id, data
 
+    def _get_decoder(self, message_id, version):
+        """Get a function which deserializes payloads of the given message type and version.
+
+        If the message implementation has a ``decoder`` classmethod, it is called once to build a
+        parser specialised for `version` (see :class:`~natnet.protocol.MocapFrameMessage.FrameDecoder`)
+        and the result is cached.  Otherwise the implementation's ``deserialize`` is used.
+        """
+        try:
+            return self._decoders[message_id, version]
+        except KeyError:
+            pass
+        message_type = self._implementation_types[message_id]
+        make_decoder = getattr(message_type, 'decoder', None)
+        if make_decoder is not None:
+            decode = make_decoder(version).deserialize
+        else:
+            def decode(data):
+                return message_type.deserialize(data, version)
+        self._decoders[message_id, version] = decode
+        return decode
+
     def deserialize_payload(self, message_id, payload_data, version=None, strict=False):
         """Deserialize the payload of a packet into a message instance.
 
@@ -217,8 +385,7 @@ class SerDesRegistry(object):
         """
         if version is None:
             version = self._version
-        message_type = self._implementation_types[message_id]
-        message = message_type.deserialize(payload_data, version)
+        message = self._get_decoder(message_id, version)(payload_data)
         if strict:
             name = message_id.name
             assert len(payload_data) == 0, \
@@ -0,0 +1,314 @@
+# coding: utf-8
+"""Recording packets to disk.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+This module requires Python 3 (for memory-mapped packets), so it isn't imported by the top-level
+package.
+
+A recording is an append-only file of raw packets, each with the local time it was received.  The
+file starts with a header::
+
+    magic (8 bytes)  format version (uint32)  NatNet version (4 bytes)
+
+followed by records, each of which starts with::
+
+    record type (uint8)  length (uint32)  received time (double)
+
+A packet record contains one raw packet, exactly as it was received.  Every so often (and when the
+recording is closed) there is also an index record, which contains the offset of the previous
+index record (int64, -1 for the first) followed by an entry for each mocap frame since then::
+
+    frame number (uint32)  server timestamp (double)  record offset (uint64)
+
+A clock state record contains a clock estimate (see :func:`Recorder.record_clock_state`), with
+the local time it was made as the received time::
+
+    reference server time (double)  reference local time (double)  skew (double)
+
+The server timestamp is :attr:`~natnet.protocol.MocapFrameMessage.TimingInfo.timestamp`.  When
+the recording is closed, a footer containing the offset of the last index record and another magic
+string is written, so the whole index can be loaded without reading the packets.  If the recording
+wasn't closed properly, the index is rebuilt by scanning the records instead.
+"""
+
+__all__ = ['Recorder', 'Recording', 'RecordType']
+
+import array
+import bisect
+import enum
+import io
+import mmap
+import struct
+import threading
+
+from .protocol import MessageId, MocapFrameMessage, Version, serialize
+from .protocol.common import ParseBuffer, uint16_t
+
+_MAGIC = b'NATNETRC'
+_INDEX_MAGIC = b'NNINDEX\0'
+_FORMAT_VERSION = 1
+
+_file_header_t = struct.Struct('<8sI4s')
+_record_header_t = struct.Struct('<BId')
+_index_header_t = struct.Struct('<q')
+_index_entry_t = struct.Struct('<IdQ')
+_footer_t = struct.Struct('<q8s')
+_clock_state_t = struct.Struct('<ddd')
+
+
+class RecordType(enum.IntEnum):
+    Packet = 1
+    Index = 2
+    ClockState = 3
+
+
+class Recorder(object):
+
+    """Write packets to a recording file as they are received.
+
+    Attach this to a :class:`~natnet.comms.Connection` with
+    :func:`~natnet.comms.Connection.set_recorder` (or use
+    :func:`~natnet.comms.Client.start_recording`), or call :func:`record` yourself.  Writes are
+    buffered and never flushed to disk explicitly, and the index is kept in a flat buffer, so
+    recording doesn't create any long-lived objects per packet.
+
+    Packets and clock states are usually recorded from different threads (the receiving thread and
+    whichever thread synchronizes the clocks), so every write is made under a lock.
+    """
+
+    def __init__(self, file_, version=Version(3), index_interval=1000):
+        """
+        Args:
+            file_: Binary file object open for writing
+            version (:class:`~natnet.protocol.common.Version`): Protocol version of the packets
+            index_interval (int): Number of mocap frames between index records
+        """
+        self._file = file_
+        self._version = version
+        self._decoder = MocapFrameMessage.decoder(version)
+        self._index_interval = index_interval
+        self._index_entries = bytearray()
+        self._index_entry_count = 0
+        self._last_index_offset = -1
+        self._lock = threading.Lock()
+        self._file.write(_file_header_t.pack(_MAGIC, _FORMAT_VERSION, version.serialize()))
+        self._offset = _file_header_t.size
+
+    @classmethod
+    def open(cls, filename, version=Version(3), index_interval=1000, buffer_size=1 << 20):
+        """Create a new recording file (overwriting any existing file)."""
+        return cls(io.open(filename, 'wb', buffering=buffer_size), version, index_interval)
+
+    def _write_record(self, record_type, payload, received_time=0.0):
+        offset = self._offset
+        self._file.write(_record_header_t.pack(record_type, len(payload), received_time))
+        self._file.write(payload)
+        self._offset += _record_header_t.size + len(payload)
+        return offset
+
+    def record(self, packet, received_time):
+        """Append a packet to the recording.
+
+        Args:
+            packet (bytes): Raw packet
+            received_time (float): Local time packet was received
+        """
+        with self._lock:
+            offset = self._write_record(RecordType.Packet, packet, received_time)
+            message_id, = uint16_t.unpack_from(packet)
+            if message_id == MessageId.FrameOfData:
+                payload = ParseBuffer(packet, 2*uint16_t.size)
+                timestamp = self._decoder.peek_timing_info(payload).timestamp
+                frame_number = MocapFrameMessage.peek_frame_number(payload)
+                self._index_entries += _index_entry_t.pack(frame_number, timestamp, offset)
+                self._index_entry_count += 1
+                if self._index_entry_count >= self._index_interval:
+                    self._write_index()
+
+    def record_message(self, message, received_time):
+        """Append a message to the recording, as if it had been received."""
+        self.record(serialize(message), received_time)
+
+    def record_clock_state(self, state, local_time):
+        """Append a clock estimate to the recording.
+
+        Attach this to a :class:`~natnet.comms.ClockSynchronizer` with
+        :func:`~natnet.comms.ClockSynchronizer.set_recorder` to record every new estimate, so the
+        recording can be converted to local time exactly as it was live (see
+        :func:`~natnet.comms.ClockSynchronizer.convert_timestamps`).
+
+        Args:
+            state (tuple[float, float, float]): Clock state, from
+                :func:`~natnet.comms.ClockEstimator.get_state`
+            local_time (float): Local time the estimate was made
+        """
+        with self._lock:
+            self._write_record(RecordType.ClockState, _clock_state_t.pack(*state), local_time)
+
+    def _write_index(self):
+        # Called with the lock held
+        self._last_index_offset = self._write_record(
+            RecordType.Index, _index_header_t.pack(self._last_index_offset) + bytes(self._index_entries))
+        self._index_entries = bytearray()
+        self._index_entry_count = 0
+
+    def close(self):
+        """Write the remaining index entries and the footer, and close the file."""
+        with self._lock:
+            self._write_index()
+            self._file.write(_footer_t.pack(self._last_index_offset, _INDEX_MAGIC))
+            self._file.close()
+
+
+class Recording(object):
+
+    """Read-only, memory-mapped view of a recording file.
+
+    Attributes:
+        version (:class:`~natnet.protocol.common.Version`): Protocol version of the packets
+        frame_numbers (array.array): Frame number of each mocap frame, in file order
+        timestamps (array.array): Server timestamp of each mocap frame, in file order
+        offsets (array.array): Record offset of each mocap frame, in file order
+    """
+
+    def __init__(self, file_):
+        """
+        Args:
+            file_: Binary file object open for reading
+        """
+        self._file = file_
+        self._map = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = memoryview(self._map)
+        magic, format_version, version = _file_header_t.unpack_from(self._data)
+        if magic != _MAGIC:
+            raise ValueError('Not a NatNet recording')
+        if format_version != _FORMAT_VERSION:
+            raise ValueError('Unsupported recording format version {}'.format(format_version))
+        self.version = Version(*bytearray(version))
+        self._end = len(self._data)
+
+        self.frame_numbers = array.array('L')
+        self.timestamps = array.array('d')
+        self.offsets = array.array('Q')
+        if not self._load_index():
+            self._rebuild_index()
+
+    @classmethod
+    def open(cls, filename):
+        return cls(io.open(filename, 'rb'))
+
+    def close(self):
+        """Close the file.  Packets which are still referenced keep the mapping open until they are freed."""
+        self._data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load_index(self):
+        """Load the index by following the chain of index records back from the footer."""
+        if self._end < _file_header_t.size + _footer_t.size:
+            return False
+        last_index_offset, magic = _footer_t.unpack_from(self._data, self._end - _footer_t.size)
+        if magic != _INDEX_MAGIC:
+            return False
+        self._end -= _footer_t.size
+        blocks = []
+        offset = last_index_offset
+        while offset >= 0:
+            record_type, length, _ = _record_header_t.unpack_from(self._data, offset)
+            assert record_type == RecordType.Index
+            start = offset + _record_header_t.size
+            offset, = _index_header_t.unpack_from(self._data, start)
+            blocks.append((start + _index_header_t.size, length - _index_header_t.size))
+        for start, length in reversed(blocks):
+            self._add_index_entries(start, length)
+        return True
+
+    def _add_index_entries(self, start, length):
+        for i in range(length//_index_entry_t.size):
+            entry_offset = start + i*_index_entry_t.size
+            frame_number, timestamp, offset = _index_entry_t.unpack_from(self._data, entry_offset)
+            self.frame_numbers.append(frame_number)
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+
+    def _rebuild_index(self):
+        """Index the recording by scanning every record (for recordings which weren't closed)."""
+        decoder = MocapFrameMessage.decoder(self.version)
+        for offset, record_type, packet, _ in self._records(_file_header_t.size):
+            if record_type != RecordType.Packet:
+                continue
+            message_id, = uint16_t.unpack_from(packet)
+            if message_id == MessageId.FrameOfData:
+                payload = ParseBuffer(packet, 2*uint16_t.size)
+                self.frame_numbers.append(MocapFrameMessage.peek_frame_number(payload))
+                self.timestamps.append(decoder.peek_timing_info(payload).timestamp)
+                self.offsets.append(offset)
+
+    def _records(self, offset):
+        """Iterate over records, as (offset, record type, payload, received time)."""
+        while offset + _record_header_t.size <= self._end:
+            record_type, length, received_time = _record_header_t.unpack_from(self._data, offset)
+            start = offset + _record_header_t.size
+            if start + length > self._end:
+                # Truncated record at the end of an unclosed recording
+                return
+            yield offset, record_type, self._data[start:start + length], received_time
+            offset = start + length
+
+    def packets(self, offset=None):
+        """Iterate over packets, starting from the given record offset or the start of the file.
+
+        Each packet is a memoryview into the file.
+
+        Yields:
+            tuple[memoryview, float]: Raw packet and received timestamp
+        """
+        if offset is None:
+            offset = _file_header_t.size
+        for _, record_type, packet, received_time in self._records(offset):
+            if record_type == RecordType.Packet:
+                yield packet, received_time
+
+    def clock_states(self):
+        """Get every clock estimate in the recording.
+
+        This scans every record, so it's best done once per recording.
+
+        Returns:
+            list[tuple[float, tuple[float, float, float]]]: Local time and clock state of each
+            estimate, in the form taken by :func:`~natnet.comms.ClockSynchronizer.convert_timestamps`
+        """
+        return [(local_time, _clock_state_t.unpack(payload))
+                for _, record_type, payload, local_time in self._records(_file_header_t.size)
+                if record_type == RecordType.ClockState]
+
+    def find_frame(self, frame_number):
+        """Get the record offset of the first mocap frame with at least the given frame number.
+
+        Returns None if there is no such frame.
+        """
+        i = bisect.bisect_left(self.frame_numbers, frame_number)
+        return self.offsets[i] if i < len(self.offsets) else None
+
+    def find_timestamp(self, timestamp):
+        """Get the record offset of the first mocap frame at or after the given server timestamp (in seconds).
+
+        Returns None if there is no such frame.
+        """
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        return self.offsets[i] if i < len(self.offsets) else None
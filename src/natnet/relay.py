@@ -0,0 +1,243 @@
+# coding: utf-8
+"""Relay a NatNet server's stream to more clients.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+A :class:`Relay` connects to a NatNet server as a client, then acts as a server for any number of
+downstream clients, so that they don't all have to talk to Motive directly (or can be on a different
+network segment).  Frames are forwarded as raw datagrams without being parsed, to multicast groups
+and/or to unicast subscribers.  Downstream clients connect to the relay exactly as they would to
+Motive::
+
+    relay = Relay.connect('10.0.0.5', multicast_groups=[('239.255.42.101', 1511)])
+    relay.spin()
+
+or from the command line::
+
+    python -m natnet.relay 10.0.0.5 --group 239.255.42.101:1511
+"""
+
+import select
+import struct
+
+import attr
+
+from . import protocol
+from .comms import ClockSyncError, ClockSynchronizer, Connection
+from .logging import Logger
+from .protocol.common import ParseBuffer
+from .protocol.ServerInfoMessage import ConnectionInfo
+from .Server import ServerConnection, _SubscriberTable
+
+__all__ = ['Relay']
+
+_message_id_t = struct.Struct('<H')
+
+
+@attr.s
+class Relay(object):
+
+    """Forward packets from a NatNet server to downstream clients without reparsing them.
+
+    Only the header of each packet from the server is looked at, to decide whether to forward it.
+    Downstream clients' requests are answered locally: server info is the server's own with the
+    connection info replaced, model definitions are cached (and refreshed whenever a frame says the
+    tracked models have changed), and echo requests are answered using the relay's own estimate of
+    the server clock, so downstream clients end up synchronized to the server.
+
+    Attributes:
+        forward_message_ids (set[int]): IDs of messages from the server to forward (by default,
+            just FrameOfData)
+        forwarded_packet_count (int): Number of packets received from the server and forwarded
+    """
+
+    _upstream = attr.ib()  # type: Connection
+    _downstream = attr.ib()  # type: ServerConnection
+    _server_info = attr.ib()  # type: protocol.ServerInfoMessage
+    _clock_synchronizer = attr.ib()  # type: ClockSynchronizer
+    _log = attr.ib()  # type: Logger
+    _multicast_groups = attr.ib(attr.Factory(list))  # type: list[tuple[str, int]]
+    _subscribers = attr.ib(None)  # type: _SubscriberTable
+    forward_message_ids = attr.ib(attr.Factory(lambda: {protocol.MessageId.FrameOfData}))
+    forwarded_packet_count = attr.ib(0)  # type: int
+    _model_definitions_packet = attr.ib(None)  # type: bytes
+    _model_definitions_requesters = attr.ib(attr.Factory(set))  # type: set[tuple[str, int]]
+    _upstream_unicast = attr.ib(False)  # type: bool
+
+    @classmethod
+    def connect(cls, server, multicast_groups=(), command_port=1510, subscriber_timeout=5.0, ttl=1,
+                logger=Logger(), timeout=1):
+        """Connect to a NatNet server, and start listening for downstream clients.
+
+        Raises :class:`~natnet.comms.ClockSyncError` if the server doesn't respond to echo requests.
+
+        Args:
+            server (str): IPv4 address of server (hostname probably works too)
+            multicast_groups (list[tuple[str, int]]): Multicast addresses and ports to forward
+                frames to.  If there are none, downstream clients are told the relay is in unicast
+                mode, and frames are only forwarded to subscribers.
+            command_port (int): Port to listen for downstream clients on, which has to be different
+                to the server's command port if the relay is running on the same machine
+            subscriber_timeout (float): Stop forwarding frames to a unicast subscriber after this
+                long without a KeepAlive message
+            ttl (int): Time-to-live of forwarded multicast packets, which is the number of routers
+                they can cross (so by default they stay on the local network segment)
+            logger (:class:`~natnet.logging.Logger`):
+            timeout (float): How long to wait for the server to respond
+        """
+        logger.info('Connecting to %s', server)
+        upstream = Connection.open(server)
+        upstream.send_message(protocol.ConnectMessage())
+        server_info, _ = upstream.wait_for_message_with_id(protocol.MessageId.ServerInfo, timeout=timeout)
+        logger.debug('Server application: %s', server_info.app_name)
+        logger.debug('Server version: %s', server_info.app_version)
+
+        upstream_unicast = not server_info.connection_info.multicast
+        if upstream_unicast:
+            upstream.bind_unicast_data_socket()
+        else:
+            upstream.bind_data_socket(server_info.connection_info.multicast_address,
+                                      server_info.connection_info.data_port)
+
+        logger.debug('Synchronizing clocks')
+        clock_synchronizer = ClockSynchronizer(server_info, logger)
+        clock_synchronizer.initial_sync(upstream)
+        if not clock_synchronizer.estimator.synchronized:
+            raise ClockSyncError('No response to echo requests')
+
+        downstream = ServerConnection.listen(command_port, ttl)
+        inst = cls(upstream, downstream, server_info, clock_synchronizer, logger, list(multicast_groups),
+                   _SubscriberTable(logger, subscriber_timeout), upstream_unicast=upstream_unicast)
+        inst._keep_alive()
+        upstream.send_message(protocol.RequestModelDefinitionsMessage())
+        logger.info('Relaying to %s', ', '.join('{}:{}'.format(*g) for g in multicast_groups) or
+                    'unicast subscribers only')
+        return inst
+
+    @property
+    def subscriber_count(self):
+        """Number of unicast subscribers."""
+        return len(self._subscribers)
+
+    def _downstream_server_info(self):
+        """The server's ServerInfo, with the connection info pointing at the relay instead."""
+        if self._multicast_groups:
+            multicast_address, data_port = self._multicast_groups[0]
+            connection_info = ConnectionInfo(data_port, True, multicast_address)
+        else:
+            connection_info = ConnectionInfo(0, False, '0.0.0.0')
+        info = self._server_info
+        return protocol.ServerInfoMessage(info.app_name, info.app_version, info.natnet_version,
+                                          info.high_resolution_clock_frequency, connection_info)
+
+    def _send_echo_response(self, packet, client_address, received_time):
+        request = protocol.deserialize(packet)
+        server_time = self._clock_synchronizer.local_to_server_time(received_time)
+        ticks = int(server_time*self._server_info.high_resolution_clock_frequency)
+        self._downstream.send_message(protocol.EchoResponseMessage(request.timestamp, ticks), client_address)
+
+    def _keep_alive(self):
+        """Send a KeepAlive message to a unicast server if one is due."""
+        if self._upstream_unicast:
+            self._upstream.keep_alive()
+
+    def _forward(self, packet):
+        self._subscribers.expire()
+        send_packet = self._downstream.send_packet
+        for address in self._multicast_groups:
+            send_packet(packet, address)
+        for address in self._subscribers:
+            send_packet(packet, address)
+        self.forwarded_packet_count += 1
+
+    def _handle_upstream_packet(self, packet, received_time):
+        message_id, = _message_id_t.unpack_from(packet)
+        if message_id == protocol.MessageId.FrameOfData:
+            if protocol.MocapFrameMessage.peek_tracked_models_changed(ParseBuffer(packet)):
+                self._log.info('Tracked models have changed, requesting new model definitions')
+                self._model_definitions_packet = None
+                self._upstream.send_message(protocol.RequestModelDefinitionsMessage())
+        elif message_id == protocol.MessageId.ModelDef:
+            # Copy it out of the connection's receive buffer
+            self._model_definitions_packet = bytes(packet)
+            for address in self._model_definitions_requesters:
+                self._downstream.send_packet(self._model_definitions_packet, address)
+            self._model_definitions_requesters.clear()
+        elif message_id == protocol.MessageId.EchoResponse:
+            self._clock_synchronizer.handle_echo_response(protocol.deserialize(packet), received_time)
+
+        if message_id in self.forward_message_ids:
+            self._forward(packet)
+
+    def _handle_downstream_packet(self, packet, client_address, received_time):
+        message_id, = _message_id_t.unpack_from(packet)
+        if message_id in (protocol.MessageId.Connect, protocol.MessageId.Discovery):
+            self._log.info('Sending server info to %s', client_address)
+            self._downstream.send_message(self._downstream_server_info(), client_address)
+        elif message_id == protocol.MessageId.EchoRequest:
+            self._send_echo_response(packet, client_address, received_time)
+        elif message_id == protocol.MessageId.RequestModelDef:
+            if self._model_definitions_packet is not None:
+                self._downstream.send_packet(self._model_definitions_packet, client_address)
+            else:
+                # Still waiting for them from the server
+                self._model_definitions_requesters.add(client_address)
+        elif message_id == protocol.MessageId.KeepAlive:
+            self._subscribers.keep_alive(client_address, received_time)
+        else:
+            self._log.debug('Ignoring message %i from %s', message_id, client_address)
+
+    def run_once(self, timeout=None):
+        """Wait for packets from the server or downstream clients, and handle them all.
+
+        Args:
+            timeout (float): Timeout in seconds
+        """
+        downstream_socket = self._downstream._socket
+        readable, _, _ = select.select(self._upstream.sockets + [downstream_socket], [], [], timeout)
+        if downstream_socket in readable:
+            packet, client_address, received_time = self._downstream.wait_for_packet_raw(timeout=0)
+            self._handle_downstream_packet(packet, client_address, received_time)
+        if any(s is not downstream_socket for s in readable):
+            for packet, received_time in self._upstream.wait_for_packets_raw(timeout=0):
+                self._handle_upstream_packet(packet, received_time)
+        self._clock_synchronizer.update(self._upstream)
+        self._keep_alive()
+
+    def spin(self, timeout=None):
+        """Continuously relay packets."""
+        try:
+            while True:
+                self.run_once(timeout)
+        except (KeyboardInterrupt, SystemExit):
+            self._log.info('Exiting')
+
+
+def _parse_group(group):
+    address, _, port = group.partition(':')
+    return address, int(port or 1511)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('server', help='IP address of NatNet server')
+    parser.add_argument('--group', action='append', default=[], type=_parse_group,
+                        help='Multicast group to forward frames to, as address[:port] (default port 1511); '
+                             'can be given more than once')
+    parser.add_argument('--command-port', type=int, default=1510,
+                        help='Port to listen for downstream clients on (default 1510)')
+    parser.add_argument('--ttl', type=int, default=1,
+                        help='Time-to-live of forwarded multicast packets, to let them cross routers (default 1)')
+    args = parser.parse_args(argv)
+    relay = Relay.connect(args.server, args.group, args.command_port, ttl=args.ttl)
+    relay.spin()
+
+
+if __name__ == '__main__':
+    main()
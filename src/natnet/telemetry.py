@@ -0,0 +1,360 @@
+# coding: utf-8
+"""Latency and frame loss statistics.
+
+Copyright (c) 2017, Matthew Edwards.  This file is subject to the 3-clause BSD
+license, as found in the LICENSE file in the top-level directory of this
+distribution and at https://github.com/mje-nz/python_natnet/blob/master/LICENSE.
+No part of python_natnet, including this file, may be copied, modified,
+propagated, or distributed except according to the terms contained in the
+LICENSE file.
+
+A :class:`FrameTelemetry` collects the timing of every frame a client receives into histograms
+over a rolling interval, so percentiles and loss counts can be reported without doing anything in
+the frame callback::
+
+    telemetry = client.enable_telemetry(interval=10, callback=lambda s: print(s.as_dict()))
+    ...
+    print(telemetry.snapshot().transit_latency.percentile(99))
+"""
+
+__all__ = ['FrameSequence', 'FrameStatus', 'FrameTelemetry', 'LatencyHistogram', 'TelemetrySnapshot']
+
+import enum
+
+import attr
+
+
+class LatencyHistogram(object):
+
+    """Histogram of durations with log-linear buckets, like HdrHistogram.
+
+    Durations are counted in units of `resolution`.  Below ``2**significant_bits`` units each
+    bucket is one unit wide, and above that each power of two is split into ``2**(significant_bits -
+    1)`` buckets, so every value is recorded to within ``2**(1 - significant_bits)`` of its true
+    value (0.8% by default) using a small, fixed number of buckets.  Negative durations (e.g., a
+    transit latency made negative by clock sync error) are recorded as zero, and durations over
+    `max_value` as `max_value`.  The exact minimum, maximum and mean are kept as well.
+
+    Attributes:
+        count (int): Number of values recorded
+        min (float): Smallest value recorded, or None
+        max (float): Largest value recorded, or None
+    """
+
+    def __init__(self, resolution=1e-6, max_value=10.0, significant_bits=8):
+        """
+        Args:
+            resolution (float): Smallest distinguishable duration, in seconds
+            max_value (float): Largest duration, in seconds
+            significant_bits (int): Number of significant bits to keep
+        """
+        self._resolution = resolution
+        self._significant_bits = significant_bits
+        self._sub_bucket_count = 1 << significant_bits
+        self._max_units = int(max_value/resolution)
+        self._counts = [0]*(self._bucket_index(self._max_units) + 1)
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._total = 0.0
+
+    def _bucket_index(self, units):
+        if units < self._sub_bucket_count:
+            return units
+        shift = units.bit_length() - self._significant_bits
+        half = self._sub_bucket_count >> 1
+        return self._sub_bucket_count + (shift - 1)*half + (units >> shift) - half
+
+    def _bucket_value(self, index):
+        """Midpoint of a bucket, in seconds."""
+        if index < self._sub_bucket_count:
+            return index*self._resolution
+        half = self._sub_bucket_count >> 1
+        shift = (index - self._sub_bucket_count)//half + 1
+        lowest = (half + (index - self._sub_bucket_count) % half) << shift
+        return (lowest + ((1 << shift) - 1)/2.0)*self._resolution
+
+    def record(self, value):
+        """Record a duration, in seconds."""
+        units = int(value/self._resolution)
+        if units < 0:
+            units = 0
+        elif units > self._max_units:
+            units = self._max_units
+        self._counts[self._bucket_index(units)] += 1
+        self.count += 1
+        self._total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        """Mean of the values recorded, or None."""
+        return self._total/self.count if self.count else None
+
+    def percentile(self, percentile):
+        """Estimate a percentile of the values recorded (e.g., 99 for p99), or None if there are none."""
+        if not self.count:
+            return None
+        if percentile >= 100:
+            return self.max
+        target = max(1, percentile/100.0*self.count)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                # The bucket midpoint could be slightly outside the values actually recorded
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def reset(self):
+        self._counts = [0]*len(self._counts)
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._total = 0.0
+
+    def copy(self):
+        inst = LatencyHistogram.__new__(LatencyHistogram)
+        inst.__dict__.update(self.__dict__)
+        inst._counts = list(self._counts)
+        return inst
+
+    def summary(self):
+        """Get the count, min, mean, max and some percentiles as a dict."""
+        return {
+            'count': self.count,
+            'min': self.min,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p99.9': self.percentile(99.9),
+            'max': self.max
+        }
+
+
+@attr.s
+class TelemetrySnapshot(object):
+
+    """Statistics for the frames received over an interval.
+
+    Attributes:
+        start_time (float): Local time of the start of the interval
+        end_time (float): Local time of the last frame in the interval
+        frame_count (int): Number of frames received
+        dropped_frame_count (int): Change in the number of frames missing from the sequence (see
+            :class:`FrameSequence`)
+        out_of_order_frame_count (int): Number of frames which arrived after a later frame
+        duplicate_frame_count (int): Number of frames which arrived more than once
+        system_latency (:class:`LatencyHistogram`): See :class:`~natnet.comms.TimestampAndLatency`
+        transit_latency (:class:`LatencyHistogram`):
+        processing_latency (:class:`LatencyHistogram`):
+        jitter (:class:`LatencyHistogram`): Variation in the time between frames arriving, compared
+            to the time between them being captured
+    """
+
+    start_time = attr.ib()  # type: float
+    end_time = attr.ib()  # type: float
+    frame_count = attr.ib()  # type: int
+    dropped_frame_count = attr.ib()  # type: int
+    out_of_order_frame_count = attr.ib()  # type: int
+    duplicate_frame_count = attr.ib()  # type: int
+    system_latency = attr.ib()  # type: LatencyHistogram
+    transit_latency = attr.ib()  # type: LatencyHistogram
+    processing_latency = attr.ib()  # type: LatencyHistogram
+    jitter = attr.ib()  # type: LatencyHistogram
+
+    def as_dict(self):
+        """Get the counts and a summary of each histogram as a (JSON-serializable) dict."""
+        return {
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'frame_count': self.frame_count,
+            'dropped_frame_count': self.dropped_frame_count,
+            'out_of_order_frame_count': self.out_of_order_frame_count,
+            'duplicate_frame_count': self.duplicate_frame_count,
+            'system_latency': self.system_latency.summary(),
+            'transit_latency': self.transit_latency.summary(),
+            'processing_latency': self.processing_latency.summary(),
+            'jitter': self.jitter.summary()
+        }
+
+
+class FrameStatus(enum.Enum):
+
+    """How a frame fits into the sequence of frame numbers (see :func:`FrameSequence.track`).
+
+    Attributes:
+        New: Later than every frame so far (possibly with a gap before it)
+        OutOfOrder: Fills in a gap, having arrived after a later frame
+        Duplicate: Already seen
+        Restart: Early enough that the frame numbers must have restarted
+    """
+
+    New = 'new'
+    OutOfOrder = 'out_of_order'
+    Duplicate = 'duplicate'
+    Restart = 'restart'
+
+
+class FrameSequence(object):
+
+    """Track frame numbers to count lost, duplicated and out-of-order frames.
+
+    A frame is counted as dropped as soon as a later frame arrives, and uncounted if it turns up
+    after all.  The frame numbers seen recently are kept in a bitmap, so duplicates are detected
+    within the last :attr:`window` frames.  A frame further back than that is taken to mean the
+    frame numbers have restarted (e.g., because Motive was restarted), and so is a jump back of
+    more than :attr:`restart_threshold` frames to a frame number below :attr:`restart_threshold`
+    (e.g., a short take looping), since frames are never reordered that far in practice.
+
+    Attributes:
+        latest_frame_number (int): Highest frame number seen since the last restart, or None
+        frame_count (int): Number of frames tracked
+        dropped_frame_count (int): Number of frames which are missing from the sequence
+        out_of_order_frame_count (int): Number of frames which arrived after a later frame
+        duplicate_frame_count (int): Number of frames which arrived more than once
+        restart_count (int): Number of times the frame numbers restarted
+    """
+
+    window = 1024
+    restart_threshold = 100
+
+    def __init__(self):
+        self.latest_frame_number = None
+        self._seen = 0
+        self.frame_count = 0
+        self.dropped_frame_count = 0
+        self.out_of_order_frame_count = 0
+        self.duplicate_frame_count = 0
+        self.restart_count = 0
+
+    def track(self, frame_number):
+        """Add a frame to the sequence.
+
+        Returns:
+            :class:`FrameStatus`:
+        """
+        self.frame_count += 1
+        latest = self.latest_frame_number
+        if latest is not None and frame_number > latest:
+            gap = frame_number - latest
+            self.dropped_frame_count += gap - 1
+            # Bit i is set if frame (latest - i) has been seen
+            self._seen = ((self._seen << gap) | 1) & ((1 << self.window) - 1) if gap < self.window else 1
+            self.latest_frame_number = frame_number
+            return FrameStatus.New
+        if latest is None or latest - frame_number >= self.window or \
+                (frame_number < self.restart_threshold and latest - frame_number > self.restart_threshold):
+            if latest is not None:
+                self.restart_count += 1
+            self._seen = 1
+            self.latest_frame_number = frame_number
+            return FrameStatus.New if latest is None else FrameStatus.Restart
+        bit = 1 << (latest - frame_number)
+        if self._seen & bit:
+            self.duplicate_frame_count += 1
+            return FrameStatus.Duplicate
+        self._seen |= bit
+        self.out_of_order_frame_count += 1
+        self.dropped_frame_count -= 1
+        return FrameStatus.OutOfOrder
+
+    def _counts(self):
+        return (self.dropped_frame_count, self.out_of_order_frame_count, self.duplicate_frame_count)
+
+
+class FrameTelemetry(object):
+
+    """Rolling latency, jitter and frame loss statistics.
+
+    Frames are recorded into histograms until `interval` seconds have passed, then the statistics
+    for that interval are saved as :attr:`last_snapshot` (and passed to the callback, if any) and
+    collection starts again.  Enable this on a client with
+    :func:`~natnet.comms.Client.enable_telemetry`.
+
+    Attributes:
+        last_snapshot (:class:`TelemetrySnapshot`): Statistics for the last complete interval, or
+            None
+    """
+
+    def __init__(self, interval=10.0, callback=None, sequence=None, **histogram_kwargs):
+        """
+        Args:
+            interval (float): Length of each interval, in seconds
+            callback: Called with a :class:`TelemetrySnapshot` at the end of each interval
+            sequence (:class:`FrameSequence`): Frame sequence which is already being tracked
+                elsewhere (e.g., by a client) to take the frame loss counts from, otherwise the frame
+                numbers passed to :func:`record` are tracked
+            histogram_kwargs: Passed to each :class:`LatencyHistogram`
+        """
+        self._interval = interval
+        self._callback = callback
+        self._track_frames = sequence is None
+        self._sequence = FrameSequence() if sequence is None else sequence
+        self._system_latency = LatencyHistogram(**histogram_kwargs)
+        self._transit_latency = LatencyHistogram(**histogram_kwargs)
+        self._processing_latency = LatencyHistogram(**histogram_kwargs)
+        self._jitter = LatencyHistogram(**histogram_kwargs)
+        self._start_time = None
+        self._end_time = None
+        self._frame_count = 0
+        self._start_counts = self._sequence._counts()
+        self._last_frame_number = None
+        self._last_transit_time = None
+        self.last_snapshot = None
+
+    def record(self, frame_number, received_time, timing):
+        """Record a received frame.
+
+        Args:
+            frame_number (int):
+            received_time (float): Local time the frame was received
+            timing (:class:`~natnet.comms.TimestampAndLatency`):
+        """
+        if self._start_time is None:
+            self._start_time = received_time
+        elif received_time - self._start_time >= self._interval:
+            self._finish_interval(received_time)
+
+        if self._track_frames:
+            self._sequence.track(frame_number)
+        self._frame_count += 1
+        self._end_time = received_time
+        self._system_latency.record(timing.system_latency)
+        self._transit_latency.record(timing.transit_latency)
+        self._processing_latency.record(timing.processing_latency)
+
+        if self._last_frame_number is None or frame_number > self._last_frame_number:
+            self._last_frame_number = frame_number
+            # Jitter as in RFC 3550: how much the time from capture to arrival changed
+            transit_time = received_time - timing.timestamp
+            if self._last_transit_time is not None:
+                self._jitter.record(abs(transit_time - self._last_transit_time))
+            self._last_transit_time = transit_time
+
+    def snapshot(self):
+        """Get the statistics for the current interval so far.
+
+        Returns:
+            :class:`TelemetrySnapshot`:
+        """
+        dropped, out_of_order, duplicate = (count - start for count, start in
+                                            zip(self._sequence._counts(), self._start_counts))
+        return TelemetrySnapshot(
+            self._start_time, self._end_time, self._frame_count, dropped, out_of_order, duplicate,
+            self._system_latency.copy(), self._transit_latency.copy(), self._processing_latency.copy(),
+            self._jitter.copy())
+
+    def _finish_interval(self, now):
+        self.last_snapshot = self.snapshot()
+        for histogram in (self._system_latency, self._transit_latency, self._processing_latency, self._jitter):
+            histogram.reset()
+        self._start_time = now
+        self._frame_count = 0
+        self._start_counts = self._sequence._counts()
+        if self._callback:
+            self._callback(self.last_snapshot)
@@ -0,0 +1,14 @@
+"""pytest configuration."""
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3,):
+    # Uses memoryviews of mmaps
+    collect_ignore.append('test_recording.py')
+if sys.version_info < (3, 5):
+    # Uses async/await syntax
+    collect_ignore.append('test_aio.py')
+if sys.version_info < (3, 8):
+    # Uses multiprocessing.shared_memory
+    collect_ignore.append('test_pipeline.py')
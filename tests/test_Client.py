@@ -1,11 +1,16 @@
 """Tests for Client class."""
 
+import threading
+
 import mock
 import pytest
 
 import natnet
+from natnet.comms import BackgroundReceiver, OverflowPolicy
 from natnet.fakes import FakeClockSynchronizer, FakeConnection
-from natnet.protocol.ModelDefinitionsMessage import ModelDefinitionsMessage, RigidBodyDescription
+from natnet.protocol.MocapFrameMessage import LabelledMarker, LazyMocapFrame, Markerset
+from natnet.protocol.ModelDefinitionsMessage import (MarkersetDescription, ModelDefinitionsMessage,
+                                                     RigidBodyDescription)
 
 
 @pytest.fixture(scope='module', autouse=True)
@@ -89,6 +94,105 @@ def test_client_calls_callback_for_mocapframe(client_with_fakes, test_packets, t
     assert timing.latency == pytest.approx(0.005495071)
 
 
+def test_client_calls_lazy_frame_callback(client_with_fakes, test_packets, test_messages):
+    client = client_with_fakes
+    _, mocapframe_packet, _ = test_packets
+    _, mocapframe_message, _ = test_messages
+
+    client._conn.add_packet(mocapframe_packet)
+    callback = mock.Mock()
+    client.set_frame_callback(callback, lazy=True)
+    client.spin()
+
+    callback.assert_called_once()
+    (frame, timing), _ = callback.call_args
+    assert isinstance(frame, LazyMocapFrame)
+    assert frame.frame_number == mocapframe_message.frame_number
+    # Only the timing info should have been parsed so far
+    assert list(frame._cache) == ['timing_info']
+    assert frame.rigid_bodies == mocapframe_message.rigid_bodies
+
+
+def test_client_processes_batch(client_with_fakes, test_packets):
+    client = client_with_fakes
+    _, mocapframe_packet, _ = test_packets
+    for i in range(3):
+        client._conn.add_packet(mocapframe_packet)
+
+    callback = mock.Mock()
+    client.set_callback(callback)
+    client.set_batch_size(2)
+    client.run_once()
+    assert callback.call_count == 2
+    client.run_once()
+    assert callback.call_count == 3
+
+
+def test_client_latest_only_drops_stale_frames(client_with_fakes, test_messages):
+    client = client_with_fakes
+    _, mocapframe_message, _ = test_messages
+    echo_response_message = natnet.protocol.EchoResponseMessage(0, 0)
+    for frame_number in (10, 12, 11):
+        frame = natnet.protocol.deserialize(natnet.protocol.serialize(mocapframe_message))
+        frame.frame_number = frame_number
+        client._conn.add_message(frame)
+    client._conn.add_message(echo_response_message)
+
+    callback = mock.Mock()
+    client.set_frame_callback(callback)
+    client._clock_synchronizer.handle_echo_response = mock.Mock()
+    client.set_latest_only()
+    client.run_once()
+
+    callback.assert_called_once()
+    (frame, timing), _ = callback.call_args
+    assert frame.frame_number == 12
+    assert client.skipped_frame_count == 2
+    # Other messages are still handled
+    client._clock_synchronizer.handle_echo_response.assert_called_once()
+
+
+@pytest.mark.timeout(5)
+def test_client_receiver_thread(client_with_fakes, test_packets):
+    client = client_with_fakes
+    _, mocapframe_packet, _ = test_packets
+    for i in range(3):
+        client._conn.add_packet(mocapframe_packet)
+
+    callback = mock.Mock()
+    client.set_callback(callback)
+    client.start_receiver_thread()
+    # Receiver thread hits the end of the fake packets and raises SystemExit, which should be
+    # passed on to the main thread once all the packets have been processed
+    client.spin()
+    assert callback.call_count == 3
+    client.stop_receiver_thread()
+
+
+@pytest.mark.parametrize('overflow,expected', [
+    (OverflowPolicy.DropOldest, [b'2', b'3']),
+    (OverflowPolicy.DropNewest, [b'0', b'1']),
+])
+def test_background_receiver_overflow(overflow, expected):
+    receiver = BackgroundReceiver(FakeConnection(), max_queued_packets=2, overflow=overflow)
+    receiver._put([(str(i).encode(), 0) for i in range(4)])
+    assert receiver.dropped_packet_count == 2
+    assert [packet for packet, _ in receiver.wait_for_packets_raw(timeout=0)] == expected
+    assert receiver.wait_for_packets_raw(timeout=0) == []
+
+
+@pytest.mark.timeout(5)
+def test_background_receiver_overflow_block():
+    receiver = BackgroundReceiver(FakeConnection(), max_queued_packets=2, overflow=OverflowPolicy.Block)
+    receiver._running = True
+    producer = threading.Thread(target=receiver._put, args=([(str(i).encode(), 0) for i in range(3)],))
+    producer.start()
+    assert [packet for packet, _ in receiver.wait_for_packets_raw(max_packets=1)] == [b'0']
+    producer.join()
+    assert [packet for packet, _ in receiver.wait_for_packets_raw(timeout=0)] == [b'1', b'2']
+    assert receiver.dropped_packet_count == 0
+
+
 def test_client_fills_in_occluded_markers(client_with_fakes):
     client = client_with_fakes
 
@@ -134,6 +238,61 @@ def test_client_fills_in_occluded_markers(client_with_fakes):
     assert labelled_markers[4].position == (-0.10057533532381058, 0.26159632205963135, 0.49067628383636475)
 
 
+def test_occlusion_workaround_uses_markerset_slots(client_with_fakes):
+    client = client_with_fakes
+    bodies = [RigidBodyDescription(name='Body{}'.format(i), id_=i, parent_id=-1, offset_from_parent=(0, 0, 0),
+                                   marker_positions=[(0, 0, 0)]*3, required_active_labels=[0]*3)
+              for i in range(1, 4)]
+    markerset_descriptions = [MarkersetDescription(b.name, ['a', 'b', 'c']) for b in bodies]
+    client._handle_model_definitions(ModelDefinitionsMessage(markerset_descriptions + bodies))
+    assert [e.markerset_slot for e in client._expected_markers] == [0, 1, 2]
+    assert client.models.rigid_body('Body2') is bodies[1]
+
+    markersets = [Markerset(b.name, [(b.id_, m, 0.0) for m in range(1, 4)]) for b in bodies]
+    labelled_markers = [LabelledMarker(model_id, marker_id, (0, 0, 0), 0.01, LabelledMarker._OCCLUDED, 0)
+                        for model_id, marker_id in [(1, 1), (1, 2), (1, 3), (2, 2)]]
+    # Body 2 is missing two markers and body 3 is missing all of them
+    client._do_occlusion_workaround(labelled_markers, markersets)
+    assert [(l.model_id, l.marker_id) for l in labelled_markers] == \
+        [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3), (3, 1), (3, 2), (3, 3)]
+    assert [l.occluded for l in labelled_markers] == [False, False, False, True, False, True, True, True, True]
+    assert labelled_markers[3].position == (2, 1, 0.0)
+    assert labelled_markers[8].position == (3, 3, 0.0)
+
+
+def test_client_only_parses_selected_rigid_bodies(client_with_fakes):
+    client = client_with_fakes
+    tree = RigidBodyDescription(
+        name='FakeTree', id_=7, parent_id=-1, offset_from_parent=(0.0, 0.0, 0.0),
+        marker_positions=[(0, 0, 0)]*5, required_active_labels=[0, 0, 0, 0, 0])
+    other = RigidBodyDescription(
+        name='Other', id_=8, parent_id=-1, offset_from_parent=(0.0, 0.0, 0.0),
+        marker_positions=[(0, 0, 0)]*3, required_active_labels=[0, 0, 0])
+    client._conn.add_message(ModelDefinitionsMessage([tree, other]))
+    mocapframe_packet_occluded = open('test_data/mocapframe_packet_occluded_v3.bin', 'rb').read()
+    client._conn.add_packet(mocapframe_packet_occluded)
+    client._conn.add_packet(mocapframe_packet_occluded)
+
+    callback = mock.Mock()
+    client.set_callback(callback, rigid_bodies=['FakeTree'])
+    client.run_once()  # Model definitions, which resolve the name
+    assert client._selected_rigid_body_ids == client._selected_marker_model_ids == {7}
+    assert client._selected_markerset_names == {'FakeTree'}
+    client.run_once()
+    (rigid_bodies, labelled_markers, timing), _ = callback.call_args
+    assert [r.id_ for r in rigid_bodies] == [7]
+    # Including the occluded marker, which comes from the markerset
+    assert len(labelled_markers) == 5
+
+    # Missing markers are only filled in for the selected models
+    client.set_callback(callback, rigid_bodies=[8])
+    with mock.patch.object(client, '_log') as log:
+        client.run_once()
+    (rigid_bodies, labelled_markers, timing), _ = callback.call_args
+    assert rigid_bodies == labelled_markers == []
+    log.warning.assert_not_called()
+
+
 def test_client_calls_synchronizer_for_echo_response(client_with_fakes):
     client = client_with_fakes
     echo_response_message = natnet.protocol.EchoResponseMessage(0, 0)
@@ -196,3 +355,89 @@ def test_client_connect(test_packets):
     assert client._conn.send_message.call_args_list[1] == mock.call(natnet.protocol.RequestModelDefinitionsMessage())
     assert conn.packets_remaining == 0
     client._conn.bind_data_socket.assert_called_once()
+
+
+def test_client_connect_fails_without_echo_responses(test_packets):
+    with mock.patch('natnet.comms.ClockSynchronizer.initial_sync', return_value=False):
+        with mock.patch('natnet.comms.Connection') as MockedConnectionCls:
+            server_info_packet, _, _ = test_packets
+            MockedConnectionCls.open.return_value = FakeConnection([server_info_packet])
+
+            with pytest.raises(natnet.ClockSyncError):
+                natnet.Client.connect('192.168.0.106')
+
+
+def test_client_collects_telemetry(client_with_fakes, test_packets):
+    client = client_with_fakes
+    _, mocapframe_packet, _ = test_packets
+    for i in range(3):
+        client._conn.add_packet(mocapframe_packet)
+    assert client.telemetry is None
+    telemetry = client.enable_telemetry()
+    client.set_frame_callback(mock.Mock())
+    with pytest.raises(SystemExit):
+        while True:
+            client.run_once()
+
+    assert client.telemetry is telemetry
+    snapshot = telemetry.snapshot()
+    assert snapshot.frame_count == 3
+    # It's the same frame each time
+    assert snapshot.duplicate_frame_count == 2
+    assert snapshot.out_of_order_frame_count == 0
+    assert snapshot.system_latency.percentile(50) == pytest.approx(0.005495071, rel=0.01)
+    client.disable_telemetry()
+    assert client.telemetry is None
+
+
+def _deliver_frames(client, test_messages, frame_numbers_and_times):
+    _, mocapframe_message, _ = test_messages
+    delivered = []
+    client.set_frame_callback(lambda frame, timing: delivered.append(frame.frame_number), lazy=True)
+    for frame_number, received_time in frame_numbers_and_times:
+        mocapframe_message.frame_number = frame_number
+        packet = natnet.protocol.serialize(mocapframe_message)
+        client._handle_packet(natnet.MessageId.FrameOfData, natnet.protocol.deserialize_header(packet)[1],
+                              received_time)
+    return delivered
+
+
+@pytest.mark.parametrize('frames,delay,expected', [
+    (0, None, [1, 2, 4, 3, 5, 5, 7, 8, 9, 6]),
+    (2, None, [1, 2, 3, 4, 5, 7, 8, 9]),
+    (0, 0.005, [1, 2, 3, 4, 5, 7, 8, 9])
+])
+def test_client_reorder_window(client_with_fakes, test_messages, frames, delay, expected):
+    client = client_with_fakes
+    client.set_reorder_window(frames, delay)
+    # 3 and 6 arrive late (6 too late to be put back in order when reordering), and 5 is duplicated
+    delivered = _deliver_frames(client, test_messages, [
+        (1, 0.0), (2, 0.001), (4, 0.002), (3, 0.003), (5, 0.004), (5, 0.004),
+        (7, 0.010), (8, 0.011), (9, 0.016), (6, 0.017)])
+
+    assert delivered == expected
+    assert client.frame_sequence.dropped_frame_count == 0
+    assert client.frame_sequence.out_of_order_frame_count == 2
+    assert client.frame_sequence.duplicate_frame_count == 1
+    assert client.late_frame_count == (1 if frames or delay else 0)
+
+
+def test_client_reorder_window_flushes_on_timeout(client_with_fakes, test_messages):
+    client = client_with_fakes
+    client.set_reorder_window(10)
+    assert _deliver_frames(client, test_messages, [(1, 0.0), (3, 0.002), (4, 0.003)]) == [1]
+    with mock.patch.object(client, '_receive_packets', return_value=[]):
+        client.run_once(timeout=0)
+    assert client.frame_sequence.dropped_frame_count == 1
+    assert client._last_delivered_frame_number == 4
+
+
+def test_client_reorder_window_delivers_frames_after_restart(client_with_fakes, test_messages):
+    client = client_with_fakes
+    client.set_reorder_window(2)
+    frames = [(frame_number, 0.001*frame_number) for frame_number in range(1, 201)] + [(1, 0.201), (2, 0.202)]
+    delivered = _deliver_frames(client, test_messages, frames)
+
+    assert delivered == list(range(1, 201)) + [1, 2]
+    assert client.frame_sequence.restart_count == 1
+    assert client.late_frame_count == 0
@@ -0,0 +1,210 @@
+"""Tests for ClockSynchronizer and clock estimators."""
+
+import random
+import timeit
+
+import mock
+import pytest
+
+import natnet
+from natnet.comms import ClockSynchronizer, CristianClockEstimator, KalmanClockEstimator
+from natnet.fakes import FakeConnection
+
+SKEW = 30e-6
+OFFSET = 1000.0
+
+
+def _server_time(local_time):
+    return OFFSET + local_time*(1 + SKEW)
+
+
+def _echoes(count, interval=0.1, seed=0):
+    """Simulate echoes over a network with variable delay in each direction.
+
+    Yields (received time, server time estimated from echo, RTT).
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        sent_time = 10 + i*interval
+        request_delay = 100e-6 + rng.expovariate(1/200e-6)
+        response_delay = 100e-6 + rng.expovariate(1/200e-6)
+        rtt = request_delay + response_delay
+        yield sent_time + rtt, _server_time(sent_time + request_delay) + rtt/2, rtt
+
+
+def _run(estimator, echoes):
+    min_rtt = float('inf')
+    for received_time, server_time, rtt in echoes:
+        min_rtt = min(min_rtt, rtt)
+        estimator.add_measurement(received_time, server_time, rtt, min_rtt)
+
+
+def test_kalman_estimator_converges():
+    estimator = KalmanClockEstimator()
+    _run(estimator, _echoes(1))
+    initial_offset_uncertainty = estimator.offset_uncertainty
+    initial_skew_uncertainty = estimator.skew_uncertainty
+
+    _run(estimator, _echoes(600))
+
+    assert estimator.skew == pytest.approx(SKEW, abs=2e-6)
+    assert estimator.offset_uncertainty < initial_offset_uncertainty
+    assert estimator.skew_uncertainty < initial_skew_uncertainty/10
+    now = estimator.last_synced_at
+    assert estimator.local_to_server_time(now) == pytest.approx(_server_time(now), abs=20e-6)
+    # Ten seconds without an echo still doesn't leave it far out
+    assert estimator.local_to_server_time(now + 10) == pytest.approx(_server_time(now + 10), abs=50e-6)
+    assert estimator.server_to_local_time(_server_time(now + 10)) == pytest.approx(now + 10, abs=50e-6)
+
+
+def test_kalman_estimator_weights_echoes_by_rtt():
+    estimator = KalmanClockEstimator()
+    _run(estimator, _echoes(100))
+    now = estimator.last_synced_at + 0.1
+    before = estimator.local_to_server_time(now)
+
+    # A slow echo which is 5ms out barely moves the estimate
+    assert estimator.add_measurement(now, _server_time(now) + 5e-3, 10e-3, 200e-6)
+
+    assert estimator.local_to_server_time(now) == pytest.approx(before, abs=10e-6)
+
+
+def test_cristian_estimator_ignores_slow_echoes():
+    estimator = CristianClockEstimator()
+    assert estimator.add_measurement(10.0, _server_time(10.0), 200e-6, 200e-6)
+    assert estimator.skew_uncertainty is None
+
+    assert not estimator.add_measurement(10.1, _server_time(10.1) + 5e-3, 10e-3, 200e-6)
+    assert estimator.last_synced_at == 10.0
+    assert estimator.add_measurement(12.0, _server_time(12.0), 250e-6, 200e-6)
+    assert estimator.last_synced_at == 12.0
+    assert estimator.skew == pytest.approx(SKEW)
+
+
+def test_clock_synchronizer_uses_estimator():
+    server_info = mock.Mock(high_resolution_clock_frequency=1e9)
+    estimator = mock.Mock(synchronized=False)
+    clock = ClockSynchronizer(server_info, natnet.Logger(), estimator)
+    conn = mock.Mock()
+
+    with mock.patch('timeit.default_timer', return_value=10.0):
+        clock.send_echo_request(conn)
+    request = conn.send_message.call_args[0][0]
+    response = natnet.protocol.EchoResponseMessage(request.timestamp, int(500e9))
+    clock.handle_echo_response(response, 10.0002)
+
+    received_time, server_time, rtt, min_rtt = estimator.add_measurement.call_args[0]
+    assert received_time == 10.0002
+    assert server_time == pytest.approx(500.0001)
+    assert rtt == pytest.approx(0.0002)
+    assert min_rtt == rtt
+    assert clock.offset_uncertainty is estimator.offset_uncertainty
+
+
+class _EchoingConnection(FakeConnection):
+
+    """Fake connection which answers echo requests immediately, from a server with a skewed clock."""
+
+    def send_message(self, message):
+        if isinstance(message, natnet.protocol.EchoRequestMessage):
+            server_ticks = int(_server_time(timeit.default_timer())*1e9)
+            self.add_message(natnet.protocol.EchoResponseMessage(message.timestamp, server_ticks))
+
+    def _receive_packet_raw(self, timeout=None):
+        packet, _ = super(_EchoingConnection, self)._receive_packet_raw(timeout)
+        return packet, timeit.default_timer()
+
+
+def test_initial_sync_converges_and_keeps_frames():
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    conn = _EchoingConnection([frame_packet])
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=1e9), natnet.Logger())
+
+    assert clock.initial_sync(conn, max_outstanding=4)
+    assert 10 <= clock._echo_count < 100
+    assert clock.offset_uncertainty < 25e-6
+    assert clock.in_flight_echo_count == 0
+    # The frame which arrived while syncing is still there
+    assert conn.wait_for_packets_raw(timeout=0) == [(frame_packet, mock.ANY)]
+
+
+def test_initial_sync_without_responses():
+    conn = mock.Mock()
+    conn.wait_for_packets_raw.return_value = []
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=1e9), natnet.Logger())
+
+    assert not clock.initial_sync(conn, echo_timeout=0.01, timeout=0.05)
+    assert not clock.estimator.synchronized
+    # Updating before the first response just sends another echo request
+    conn.send_message.reset_mock()
+    clock._last_sent_time = None
+    clock.update(conn)
+    conn.send_message.assert_called_once()
+
+
+def test_clock_synchronizer_matches_in_flight_echoes():
+    server_info = mock.Mock(high_resolution_clock_frequency=1e9)
+    estimator = mock.Mock(synchronized=False)
+    clock = ClockSynchronizer(server_info, natnet.Logger(), estimator)
+    conn = mock.Mock()
+
+    for sent_time in (10.0, 10.0, 11.5, 12.0):
+        with mock.patch('timeit.default_timer', return_value=sent_time):
+            clock.send_echo_request(conn)
+    timestamps = [c[0][0].timestamp for c in conn.send_message.call_args_list]
+    assert len(set(timestamps)) == 4
+    # The first two expired when the last was sent
+    assert clock.in_flight_echo_count == 2
+    assert clock.expired_echo_count == 2
+
+    # Responses can arrive in any order
+    assert clock.handle_echo_response(natnet.protocol.EchoResponseMessage(timestamps[3], int(500e9)), 12.0002)
+    assert clock.handle_echo_response(natnet.protocol.EchoResponseMessage(timestamps[2], int(499e9)), 12.0003)
+    assert not clock.handle_echo_response(natnet.protocol.EchoResponseMessage(timestamps[0], int(499e9)), 12.0004)
+    rtts = [c[0][2] for c in estimator.add_measurement.call_args_list]
+    assert rtts == [pytest.approx(0.0002), pytest.approx(0.5003)]
+    assert clock.in_flight_echo_count == 0
+
+
+def _timing(i):
+    frequency = 1e7
+    mid_exposure = int((1000 + i*0.01)*frequency)
+    return mock.Mock(camera_mid_exposure_timestamp=mid_exposure, transmit_timestamp=mid_exposure + 31234)
+
+
+@pytest.mark.parametrize('use_history', [False, True])
+def test_convert_timestamps_matches_live_calculation(use_history):
+    np = pytest.importorskip('numpy')
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=10000000), natnet.Logger())
+    history = [(0.5, (1000.0, 0.0, 30e-6)), (0.75, (1000.01, 0.0, -20e-6)), (0.75, (1000.02, 0.005, 0.0))]
+    clock._set_state(history[-1][1])
+    timings = [_timing(i) for i in range(100)]
+    received = [0.005 + i*0.01 + 0.002 for i in range(100)]
+
+    arrays = clock.convert_timestamps(np.array([t.camera_mid_exposure_timestamp for t in timings], dtype=np.uint64),
+                                      np.array([t.transmit_timestamp for t in timings], dtype=np.uint64),
+                                      np.array(received), history if use_history else None)
+
+    for i, (timing, received_time) in enumerate(zip(timings, received)):
+        if use_history:
+            # Frames received before the first state use it, and later ones use the latest state
+            clock._set_state([state for local_time, state in history if local_time <= received_time or
+                              local_time == history[0][0]][-1])
+        expected = natnet.comms.TimestampAndLatency._calculate(received_time, timing, clock)
+        assert arrays.timestamp[i] == expected.timestamp
+        assert arrays.system_latency[i] == expected.system_latency
+        assert arrays.transit_latency[i] == expected.transit_latency
+
+
+def test_convert_timestamps_without_received_times():
+    np = pytest.importorskip('numpy')
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=10000000), natnet.Logger())
+    clock._set_state((1000.0, 0.0, 0.0))
+
+    arrays = clock.convert_timestamps(np.array([10000000000]), np.array([10000010000]))
+
+    assert arrays.timestamp == pytest.approx([0.0])
+    assert arrays.system_latency == pytest.approx([0.001])
+    assert arrays.transit_latency is None
+    with pytest.raises(ValueError):
+        clock.convert_timestamps(np.array([0]), np.array([0]), history=[(0.0, (0.0, 0.0, 0.0))])
@@ -0,0 +1,67 @@
+"""Tests for Connection class."""
+
+import socket
+
+import pytest
+
+import natnet
+from natnet.comms import Connection
+
+
+@pytest.fixture
+def conn_and_sender():
+    """Create a connection listening on loopback, and a socket to send packets to its data socket."""
+    command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    command_socket.bind(('127.0.0.1', 0))
+    data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    data_socket.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    conn = Connection(command_socket, data_socket, command_socket.getsockname(), receive_buffer_count=4)
+    yield conn, sender, data_socket.getsockname()
+    sender.close()
+
+
+def test_wait_for_packets_raw_drains_queue(conn_and_sender):
+    conn, sender, address = conn_and_sender
+    for i in range(3):
+        sender.sendto(('packet %i' % i).encode(), address)
+
+    packets = conn.wait_for_packets_raw(timeout=1)
+
+    assert [bytes(p) for p, t in packets] == [b'packet 0', b'packet 1', b'packet 2']
+    received_times = [t for p, t in packets]
+    assert received_times == sorted(received_times)
+    assert conn.last_sender_address[1] == sender.getsockname()[1]
+
+
+def test_wait_for_packets_raw_limits_batch(conn_and_sender):
+    conn, sender, address = conn_and_sender
+    for i in range(6):
+        sender.sendto(('packet %i' % i).encode(), address)
+
+    packets = conn.wait_for_packets_raw(timeout=1, max_packets=2)
+    assert [bytes(p) for p, t in packets] == [b'packet 0', b'packet 1']
+
+    # Batch size can't exceed the number of receive buffers
+    packets = conn.wait_for_packets_raw(timeout=1, max_packets=10)
+    assert [bytes(p) for p, t in packets] == [b'packet 2', b'packet 3', b'packet 4', b'packet 5']
+
+
+def test_wait_for_packets_raw_timeout(conn_and_sender):
+    conn, _, _ = conn_and_sender
+    assert conn.wait_for_packets_raw(timeout=0.01) == []
+
+
+def test_wait_for_message_with_id_keeps_others(conn_and_sender):
+    conn, sender, address = conn_and_sender
+    first, second = (natnet.protocol.serialize(natnet.protocol.EchoRequestMessage(i)) for i in range(2))
+    sender.sendto(first, address)
+    sender.sendto(natnet.protocol.serialize(natnet.protocol.KeepAliveMessage()), address)
+    sender.sendto(second, address)
+
+    message, _ = conn.wait_for_message_with_id(natnet.MessageId.KeepAlive, timeout=1, keep_others=True)
+    assert message == natnet.protocol.KeepAliveMessage()
+    # Packets received while waiting come before any new ones
+    packets = conn.wait_for_packets_raw(timeout=1)
+    assert [bytes(p) for p, t in packets] == [first]
+    assert bytes(conn.wait_for_packet_raw(timeout=1)[0]) == second
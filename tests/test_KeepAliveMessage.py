@@ -0,0 +1,14 @@
+"""Tests for parsing and creating KeepAlive messages."""
+
+from natnet.protocol import KeepAliveMessage, MessageId, Version, deserialize, serialize
+
+
+def test_serialize_keepalive_message():
+    """Test serializing a KeepAlive message (header only, no payload)."""
+    assert serialize(KeepAliveMessage()) == b'\x0a\x00\x00\x00'
+
+
+def test_parse_keepalive_packet():
+    message = deserialize(b'\x0a\x00\x00\x00', Version(3), strict=True)
+    assert message == KeepAliveMessage()
+    assert KeepAliveMessage.message_id == MessageId.KeepAlive
@@ -1,10 +1,14 @@
 """Tests for parsing MocapFrame messages."""
 
+import functools
+import struct
+
 import pytest
 
-from natnet.protocol import MocapFrameMessage, Version, deserialize, serialize
-from natnet.protocol.common import ParseBuffer
-from natnet.protocol.MocapFrameMessage import LabelledMarker, Markerset, RigidBody, TimingInfo
+from natnet.protocol import MocapFrameMessage, Version, deserialize, deserialize_header, serialize
+from natnet.protocol.common import ParseBuffer, SerializeBuffer
+from natnet.protocol.MocapFrameMessage import (FrameDecoder, LabelledMarker, LazyMocapFrame,
+                                               Markerset, RigidBody, Skeleton, TimingInfo)
 
 
 def test_parse_mocapframe_packet_v3():
@@ -125,8 +129,9 @@ def test_serialize_mocapframe_message():
         timing_info=timing_info,
         params=0
     )
-    old_serialize = msg.serialize
-    msg.serialize = lambda: old_serialize(include_unlabelled=True)
+    assert msg.serialize(include_unlabelled=True) == packet[4:]
+    msg.serialized_size = functools.partial(msg.serialized_size, include_unlabelled=True)
+    msg.serialize_into = functools.partial(msg.serialize_into, include_unlabelled=True)
     serialized_msg = serialize(msg)
     print(len(serialized_msg), len(packet))
     assert serialized_msg == packet
@@ -139,7 +144,241 @@ def test_serialize_and_deserialize_markerset():
     assert Markerset.deserialize(packet, Version(3)) == markerset
 
 
+def test_serialize_into_reused_buffer():
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    msg = deserialize(packet, Version(3))
+    buffer = SerializeBuffer()
+    first = serialize(msg, buffer)
+    assert isinstance(first, memoryview)
+    assert first.tobytes() == serialize(msg)
+    data = buffer.data
+
+    # Packing a smaller message reuses the same bytearray
+    msg.labelled_markers = msg.labelled_markers[:1]
+    second = serialize(msg, buffer)
+    assert buffer.data is data
+    second_msg = deserialize(second, Version(3), strict=True)
+    assert second_msg == msg
+
+    # A bigger one needs a new bytearray, but doesn't invalidate earlier views
+    msg.skeletons = [Skeleton(1, msg.rigid_bodies*100)]
+    third = serialize(msg, buffer)
+    assert buffer.data is not data
+    assert deserialize(second, Version(3), strict=True) == second_msg
+    assert deserialize(third, Version(3), strict=True) == msg
+
+
+def test_frame_decoder_is_cached():
+    assert MocapFrameMessage.decoder(Version(3)) is FrameDecoder.for_version(Version(3))
+    assert FrameDecoder.for_version(Version(3)) is not FrameDecoder.for_version(Version(2, 9))
+
+
+def _rigid_body_bytes(version):
+    """Pack a rigid body the long way, following the version checks in RigidBody.deserialize."""
+    data = struct.pack('<I7f', 3, 1, 2, 3, 0, 0, 0, 1)
+    if version < Version(3):
+        data += struct.pack('<I6f', 2, 1, 1, 1, 2, 2, 2)
+        if version >= Version(2):
+            data += struct.pack('<2I2f', 1, 2, 0.5, 0.5)
+        data += struct.pack('<I', 0)
+    if version >= Version(2):
+        data += struct.pack('<f', 0.25)
+    if version >= Version(2, 6) or version.major == 0:
+        data += struct.pack('<h', 1)
+    return data
+
+
+def _labelled_marker_bytes(version):
+    """Pack a labelled marker the long way, following the version checks in LabelledMarker.deserialize."""
+    data = struct.pack('<HH4f', 4, 3, 1, 2, 3, 0.5)
+    if version >= Version(2, 6) or version.major == 0:
+        data += struct.pack('<h', 10)
+    if version >= Version(3) or version.major == 0:
+        data += struct.pack('<f', 0.25)
+    return data
+
+
+@pytest.mark.parametrize('version', [Version(0), Version(1), Version(2), Version(2, 6), Version(2, 11),
+                                     Version(3), Version(3, 1)])
+def test_frame_decoder_matches_element_deserializers(version):
+    """Test the precompiled parse plan gives the same results as the version-checking parsers."""
+    decoder = FrameDecoder.for_version(version)
+
+    data = _rigid_body_bytes(version)*2
+    expected = ParseBuffer(data)
+    actual = ParseBuffer(data)
+    assert decoder._unpack_rigid_bodies(actual, 2) == [RigidBody.deserialize(expected, version)
+                                                       for i in range(2)]
+    assert len(actual) == len(expected) == 0
+
+    data = _labelled_marker_bytes(version)*3
+    expected = ParseBuffer(data)
+    actual = ParseBuffer(data)
+    assert decoder._unpack_labelled_markers(actual, 3) == [LabelledMarker.deserialize(expected, version)
+                                                           for i in range(3)]
+    assert len(actual) == len(expected) == 0
+
+
+@pytest.mark.parametrize('version', [Version(1), Version(2), Version(2, 6), Version(3)])
+def test_frame_decoder_skips_unselected_elements(version):
+    decoder = FrameDecoder.for_version(version)
+
+    data = ParseBuffer(_rigid_body_bytes(version)*2)
+    assert decoder._unpack_selected_rigid_bodies(data, 2, {4}) == []
+    assert len(data) == 0
+    data = ParseBuffer(_rigid_body_bytes(version)*2)
+    assert decoder._unpack_selected_rigid_bodies(data, 2, {3}) == decoder._unpack_rigid_bodies(
+        ParseBuffer(_rigid_body_bytes(version)*2), 2)
+    assert len(data) == 0
+
+    data = ParseBuffer(_labelled_marker_bytes(version)*3)
+    assert decoder._unpack_selected_labelled_markers(data, 3, {0}) == []
+    assert len(data) == 0
+    data = ParseBuffer(_labelled_marker_bytes(version)*3)
+    assert len(decoder._unpack_selected_labelled_markers(data, 3, {3})) == 3
+    assert len(data) == 0
+
+
+def test_deserialize_mocapframe_selected():
+    packet = open('test_data/mocapframe_packet_occluded_v3.bin', 'rb').read()
+    frame = deserialize(packet, Version(3))
+    message_id, payload = deserialize_header(packet)
+    selected = MocapFrameMessage.deserialize_selected(payload, Version(3), {7}, set(), {'all'})
+    assert len(payload) == 0
+    assert selected.rigid_bodies == frame.rigid_bodies
+    assert selected.labelled_markers == []
+    assert selected.markersets == frame.markersets[1:]
+    assert selected.timing_info == frame.timing_info
+
+
+def test_deserialize_mocapframe_columnar():
+    """Test the NumPy structured array path gives the same values as the object path."""
+    np = pytest.importorskip('numpy')
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    frame = deserialize(packet, Version(3))
+    message_id, payload = deserialize_header(packet)
+    columnar_frame = MocapFrameMessage.deserialize_columnar(payload, Version(3))
+    assert len(payload) == 0
+
+    assert columnar_frame.frame_number == frame.frame_number
+    assert columnar_frame.timing_info == frame.timing_info
+
+    rigid_bodies = columnar_frame.rigid_bodies
+    assert rigid_bodies.shape == (1,)
+    assert rigid_bodies['id_'][0] == 2
+    assert rigid_bodies['position'][0] == pytest.approx(frame.rigid_bodies[0].position)
+    assert rigid_bodies['orientation'][0] == pytest.approx(frame.rigid_bodies[0].orientation)
+    assert rigid_bodies['mean_error'][0] == pytest.approx(frame.rigid_bodies[0].mean_error)
+    assert rigid_bodies['params'][0] == frame.rigid_bodies[0]._params
+
+    markers = columnar_frame.labelled_markers
+    assert markers.shape == (6,)
+    assert list(markers['model_id']) == [m.model_id for m in frame.labelled_markers]
+    assert list(markers['marker_id']) == [m.marker_id for m in frame.labelled_markers]
+    assert markers['position'] == pytest.approx(np.array([m.position for m in frame.labelled_markers]))
+    assert markers['size'] == pytest.approx(np.array([m.size for m in frame.labelled_markers]))
+    assert list(markers['params']) == [m._params for m in frame.labelled_markers]
+    assert markers['residual'] == pytest.approx(np.array([m.residual for m in frame.labelled_markers]))
+
+
+@pytest.mark.parametrize('version', [Version(2), Version(2, 6)])
+def test_deserialize_columnar_rigid_bodies_with_markers(version):
+    """Test the columnar path falls back correctly for pre-NatNet 3 rigid bodies."""
+    pytest.importorskip('numpy')
+    decoder = FrameDecoder.for_version(version)
+    data = _rigid_body_bytes(version)*2
+    expected = [RigidBody.deserialize(ParseBuffer(data), version)]*2
+    rigid_bodies = decoder._unpack_rigid_body_array(ParseBuffer(data), 2)
+    assert list(rigid_bodies['id_']) == [b.id_ for b in expected]
+    assert rigid_bodies['mean_error'] == pytest.approx([b.mean_error for b in expected])
+
+
+@pytest.mark.parametrize('filename', ['mocapframe_packet_v3.bin', 'mocapframe_packet_occluded_v3.bin'])
+def test_deserialize_mocapframe_lazy(filename):
+    """Test the lazy frame only parses sections when accessed, and gives the same values."""
+    packet = open('test_data/' + filename, 'rb').read()
+    frame = deserialize(packet, Version(3))
+    message_id, payload = deserialize_header(packet)
+    lazy_frame = MocapFrameMessage.deserialize_lazy(payload, Version(3))
+    assert isinstance(lazy_frame, LazyMocapFrame)
+    assert len(payload) == 0
+
+    assert lazy_frame.frame_number == frame.frame_number
+    assert lazy_frame.markerset_count == frame.markerset_count
+    assert lazy_frame.rigid_body_count == frame.rigid_body_count
+    assert lazy_frame.labelled_marker_count == frame.labelled_marker_count
+    assert lazy_frame.tracked_models_changed == frame.tracked_models_changed
+    assert lazy_frame._cache == {}
+
+    assert lazy_frame.rigid_bodies == frame.rigid_bodies
+    assert lazy_frame.timing_info == frame.timing_info
+    assert sorted(lazy_frame._cache) == ['rigid_bodies', 'timing_info']
+    assert lazy_frame.rigid_bodies is lazy_frame.rigid_bodies
+
+    assert lazy_frame.to_message() == frame
+
+
+def test_deserialize_mocapframe_lazy_skips_markersets_and_skeletons(monkeypatch):
+    """Test finding the sections doesn't build any markersets or skeletons."""
+    frame = deserialize(open('test_data/mocapframe_packet_v3.bin', 'rb').read(), Version(3))
+    # Including a name longer than the chunks skip_cstr looks for the null in
+    frame.markersets = [Markerset(u'short', [(1.0, 2.0, 3.0)]), Markerset(u'long'*40, [(4.0, 5.0, 6.0)]*2)]
+    frame.skeletons = [Skeleton(1, frame.rigid_bodies), Skeleton(2, frame.rigid_bodies*2)]
+    packet = serialize(frame)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Markerset or skeleton built while scanning')
+    with monkeypatch.context() as m:
+        m.setattr(Markerset, '__init__', fail)
+        m.setattr(Skeleton, '__init__', fail)
+        lazy_frame = MocapFrameMessage.deserialize_lazy(deserialize_header(packet)[1], Version(3))
+
+    assert lazy_frame._cache == {}
+    assert lazy_frame.markersets == frame.markersets
+    assert lazy_frame.skeletons == frame.skeletons
+    assert lazy_frame.to_message() == frame
+
+
+def test_peek_frame_number():
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    message_id, payload = deserialize_header(packet)
+    assert MocapFrameMessage.peek_frame_number(payload) == 162734
+    # Buffer should be untouched
+    assert MocapFrameMessage.deserialize(payload, Version(3)).frame_number == 162734
+
+
+def test_peek_timing_info():
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    message_id, payload = deserialize_header(packet)
+    offset = payload.offset
+    timing_info = FrameDecoder.for_version(Version(3)).peek_timing_info(payload)
+    assert timing_info == deserialize(packet).timing_info
+    assert payload.offset == offset
+
+
+def test_peek_tracked_models_changed():
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    message_id, payload = deserialize_header(packet)
+    assert not MocapFrameMessage.peek_tracked_models_changed(payload)
+
+    frame = deserialize(packet)
+    frame._params = 0x02
+    message_id, payload = deserialize_header(serialize(frame))
+    assert MocapFrameMessage.peek_tracked_models_changed(payload)
+
+
 def test_deserialize_mocapframe(benchmark):
     """Benchmark parsing a NatNet 3.0 packet containing a MocapFrame."""
     packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
     benchmark(deserialize, packet, Version(3))
+
+
+def test_deserialize_mocapframe_columnar_benchmark(benchmark):
+    """Benchmark parsing a NatNet 3.0 packet containing a MocapFrame into NumPy arrays."""
+    pytest.importorskip('numpy')
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+
+    def work():
+        _, payload = deserialize_header(packet)
+        return MocapFrameMessage.deserialize_columnar(payload, Version(3))
+    benchmark(work)
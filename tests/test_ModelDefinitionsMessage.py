@@ -2,8 +2,10 @@
 
 import pytest
 
+import natnet
 from natnet.protocol import ModelDefinitionsMessage, Version, deserialize, serialize  # noqa: F401
-from natnet.protocol.ModelDefinitionsMessage import MarkersetDescription, RigidBodyDescription
+from natnet.protocol.ModelDefinitionsMessage import (MarkersetDescription, ModelIndex,
+                                                     RigidBodyDescription)
 
 
 def test_parse_modeldef_packet_v3():
@@ -74,3 +76,44 @@ def test_serialize_modeldef_message():
     serialized_msg = serialize(msg)
     print(len(serialized_msg), len(packet))
     assert serialized_msg == packet
+
+
+def test_model_index():
+    scene = natnet.Scene(rigid_body_count=2, skeleton_count=1, bones_per_skeleton=3)
+    index = ModelIndex(scene.model_definitions().models)
+    assert [r.id_ for r in index.rigid_bodies] == [1, 2]
+    assert [m.name for m in index.markersets] == [r.name for r in index.rigid_bodies]
+    assert index.rigid_body(2) is index.rigid_body(index.rigid_bodies[1].name) is index.rigid_bodies[1]
+    assert index.id(index.rigid_bodies[0].name) == 1
+    assert index.markerset_slot(index.rigid_bodies[1].name) == 1
+    assert index.markerset_slot('nope') is None
+    with pytest.raises(KeyError):
+        index.rigid_body(3)
+
+    skeleton = index.skeletons[0]
+    assert index.skeleton(skeleton.name) is index.skeleton(skeleton.id_) is skeleton
+    bone_id = skeleton.id_ << 16 | 2
+    assert ModelIndex.split_bone_id(bone_id) == (skeleton.id_, 2)
+    assert index.bone(bone_id) == (skeleton, skeleton.rigid_bodies[1])
+    assert index.name(bone_id) == skeleton.rigid_bodies[1].name
+
+
+def test_model_index_update():
+    first = RigidBodyDescription('First', 1, -1, (0.0, 0.0, 0.0), [], [])
+    second = RigidBodyDescription('Second', 2, -1, (0.0, 0.0, 0.0), [], [])
+    index = ModelIndex([first, second])
+    rigid_bodies = index.rigid_bodies
+
+    renamed = RigidBodyDescription('Renamed', 2, -1, (0.0, 0.0, 0.0), [], [])
+    third = RigidBodyDescription('Third', 3, -1, (0.0, 0.0, 0.0), [], [])
+    added, removed = index.update([first, renamed, third])
+    assert added == [renamed, third]
+    assert removed == [second]
+    assert index.rigid_body(2) is renamed
+    assert index.rigid_body('Third') is third
+    with pytest.raises(KeyError):
+        index.id('Second')
+    # Old lists aren't changed
+    assert rigid_bodies == [first, second]
+
+    assert index.update([first, renamed, third]) == ([], [])
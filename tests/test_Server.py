@@ -2,12 +2,17 @@
 """Integration tests for comms module using Server class."""
 
 
+import math
 import sys
 import time
+import timeit
 
+import mock
 import pytest
 
 import natnet
+from natnet.fakes import FakeClockSynchronizer, FakeConnection
+from natnet.protocol.MocapFrameMessage import TimingInfo
 
 if sys.platform == 'win32':
     # For some reason multiprocessing is letting me pickle lambdas everywhere except on Windows.
@@ -21,8 +26,8 @@ else:
 
 class MPServer(natnet.Server):
 
-    def __init__(self, started_event, exit_event, *args, **kwargs):
-        super(MPServer, self).__init__(*args, **kwargs)
+    def __init__(self, started_event, exit_event, scene=None, unicast=False):
+        super(MPServer, self).__init__(scene, unicast)
         self.started_event = started_event  # type: multiprocessing.Event
         self.exit_event = exit_event  # type: multiprocessing.Event
 
@@ -35,11 +40,11 @@ class MPServer(natnet.Server):
     should_exit = property(should_exit, lambda self, e: None)
 
 
-@pytest.fixture()
-def server():
+def _run_server(scene=None, unicast=False, **kwargs):
     started_event = multiprocessing.Event()
     exit_event = multiprocessing.Event()
-    process = multiprocessing.Process(target=lambda: MPServer(started_event, exit_event).run(rate=1000))
+    process = multiprocessing.Process(
+        target=lambda: MPServer(started_event, exit_event, scene, unicast).run(**kwargs))
     process.start()
     started_event.wait()  # Starting processes is really slow on Windows
     time.sleep(0.1)  # Give the server a head start at stdout
@@ -49,7 +54,136 @@ def server():
     process.terminate()
 
 
+@pytest.fixture()
+def server():
+    for _ in _run_server(rate=1000):
+        yield
+
+
+@pytest.fixture()
+def unicast_server():
+    for _ in _run_server(natnet.Scene(rigid_body_count=1), unicast=True, rate=200):
+        yield
+
+
+@pytest.fixture()
+def burst_server():
+    for _ in _run_server(natnet.Scene(rigid_body_count=2), rate=1000, burst_size=10):
+        yield
+
+
 @pytest.mark.timeout(5)
 def test_autodiscovery(server):
     c = natnet.Client.connect(timeout=1)
     c.run_once()
+
+
+def _receive_frames(client, count):
+    frames = []
+    client.set_frame_callback(lambda frame, timing: frames.append(frame))
+    while len(frames) < count:
+        client.run_once()
+    return frames
+
+
+def _median_interval(frames):
+    """Get the median server timestamp interval between consecutive frames."""
+    intervals = sorted(b.timing_info.timestamp - a.timing_info.timestamp for a, b in zip(frames, frames[1:]))
+    return intervals[len(intervals)//2]
+
+
+@pytest.mark.timeout(5)
+def test_server_cadence(server):
+    c = natnet.Client.connect(timeout=1)
+    frames = _receive_frames(c, 200)
+    assert _median_interval(frames) == pytest.approx(1e-3, abs=1e-4)
+
+
+@pytest.mark.timeout(5)
+def test_server_burst_mode(burst_server):
+    c = natnet.Client.connect(timeout=1)
+    frames = _receive_frames(c, 100)
+    # Each burst of ten frames starts 10ms after the last one
+    burst_starts = [f for f in frames if f.frame_number % 10 == 1]
+    assert _median_interval(burst_starts) == pytest.approx(1e-2, abs=1e-3)
+    assert _median_interval(frames) < 1e-3
+
+
+@pytest.mark.timeout(10)
+def test_unicast_server_fans_out_to_every_client(unicast_server):
+    clients = [natnet.Client.connect('127.0.0.1', timeout=1) for i in range(5)]
+    for c in clients:
+        frames = _receive_frames(c, 5)
+        assert [len(f.rigid_bodies) for f in frames] == [1]*5
+
+
+def test_unicast_server_subscribers():
+    server = natnet.Server(unicast=True, subscriber_timeout=1)
+    server._conn = mock.Mock()
+    server._start_time = timeit.default_timer()
+    now = timeit.default_timer()
+    server._handle_message(natnet.protocol.KeepAliveMessage(), ('10.0.0.1', 1000), now)
+    server._handle_message(natnet.protocol.KeepAliveMessage(), ('10.0.0.2', 1000), now - 2)
+    server._handle_message(natnet.protocol.KeepAliveMessage(), ('10.0.0.3', 1000), now)
+    assert server.subscriber_count == 3
+
+    server._send_burst(1)
+    # Second subscriber has timed out, and the same packet is sent to the others
+    assert server.subscriber_count == 2
+    calls = server._conn.send_packet.call_args_list
+    assert [args[1] for args, _ in calls] == [('10.0.0.1', 1000), ('10.0.0.3', 1000)]
+    assert calls[0][0][0] is calls[1][0][0]
+
+
+def test_scene_frame():
+    scene = natnet.Scene(rigid_body_count=3, markers_per_rigid_body=4, free_marker_count=5, skeleton_count=2,
+                         bones_per_skeleton=3)
+    assert scene.labelled_marker_count == 17
+    timing_info = TimingInfo(0, 0, 1.0, 0, 0, 0)
+    frame = scene.frame(10, 1.0, timing_info)
+    frame = natnet.protocol.deserialize(natnet.protocol.serialize(frame), strict=True)
+
+    assert frame.frame_number == 10
+    assert [r.id_ for r in frame.rigid_bodies] == [1, 2, 3]
+    assert [m.name for m in frame.markersets] == ['Rigid body 1', 'Rigid body 2', 'Rigid body 3']
+    assert len(frame.labelled_markers) == 17
+    assert [s.id_ for s in frame.skeletons] == [4, 5]
+    assert [r.id_ for r in frame.skeletons[0].rigid_bodies] == [(4 << 16) + 1, (4 << 16) + 2, (4 << 16) + 3]
+
+    # Markers are around their rigid body, and the orientation is a unit quaternion
+    rigid_body = frame.rigid_bodies[0]
+    for marker in frame.labelled_markers[:4]:
+        assert marker.model_id == 1
+        distance = math.sqrt(sum((m - r)**2 for m, r in zip(marker.position, rigid_body.position)))
+        assert distance == pytest.approx(0.05, abs=1e-6)
+    assert sum(q**2 for q in rigid_body.orientation) == pytest.approx(1)
+
+    # Rigid bodies move
+    later_frame = scene.frame(11, 1.1, timing_info)
+    assert later_frame.rigid_bodies[0].position != pytest.approx(rigid_body.position)
+
+
+def test_scene_model_definitions():
+    scene = natnet.Scene(rigid_body_count=2, markers_per_rigid_body=3, skeleton_count=1, bones_per_skeleton=2)
+    message = natnet.protocol.deserialize(natnet.protocol.serialize(scene.model_definitions()), strict=True)
+    names = [m.name for m in message.models]
+    assert names == ['Rigid body 1', 'Rigid body 1', 'Rigid body 2', 'Rigid body 2', 'Skeleton 3']
+    assert len(message.models[1].marker_positions) == 3
+    assert [r.id_ for r in message.models[4].rigid_bodies] == [(3 << 16) + 1, (3 << 16) + 2]
+
+
+def test_scene_occlusion_dropouts_are_filled_in_by_client():
+    scene = natnet.Scene(rigid_body_count=5, markers_per_rigid_body=4, occlusion_probability=0.5)
+    timing_info = TimingInfo(0, 0, 1.0, 0, 0, 0)
+    frame = scene.frame(1, 0.0, timing_info)
+    assert 0 < len(frame.labelled_markers) < 20
+
+    log = natnet.Logger()
+    server_info = natnet.protocol.deserialize(open('test_data/serverinfo_packet_v3.bin', 'rb').read())
+    conn = FakeConnection([natnet.protocol.serialize(scene.model_definitions()), natnet.protocol.serialize(frame)])
+    client = natnet.Client(conn, FakeClockSynchronizer(server_info, log), log)
+    frames = []
+    client.set_frame_callback(lambda frame, timing: frames.append(frame))
+    client.run_once()
+    client.run_once()
+    assert len(frames[0].labelled_markers) == 20
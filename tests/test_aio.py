@@ -0,0 +1,94 @@
+# coding: utf-8
+"""Integration tests for aio module using Server class."""
+
+import asyncio
+import timeit
+
+import mock
+import pytest
+
+import natnet
+from natnet.aio import AsyncClient
+from natnet.comms import ClockSynchronizer
+from test_Server import server  # noqa: F401
+
+
+@pytest.mark.timeout(5)
+def test_async_client_receives_frames(server):  # noqa: F811
+    async def receive_frames():
+        client = await AsyncClient.connect('127.0.0.1', timeout=1)
+        frames = []
+        async for frame, timing in client.frames():
+            frames.append(frame)
+            if len(frames) == 2:
+                client.close()
+        return frames
+
+    loop = asyncio.new_event_loop()
+    try:
+        frames = loop.run_until_complete(receive_frames())
+    finally:
+        loop.close()
+    assert len(frames) == 2
+    assert frames[1].frame_number > frames[0].frame_number
+
+
+def test_async_client_holds_frames_until_first_echo():
+    frame = natnet.protocol.deserialize(open('test_data/mocapframe_packet_v3.bin', 'rb').read())
+    frame_packets = []
+    for frame_number in (1, 2):
+        frame.frame_number = frame_number
+        frame_packets.append(natnet.protocol.serialize(frame))
+    conn = mock.Mock()
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=1e9), natnet.Logger())
+    client = AsyncClient(conn, natnet.Logger())
+    client._client = natnet.Client(conn, clock, natnet.Logger())
+    client._client.set_frame_callback(client._enqueue_frame)
+
+    # Before the first echo response the frame can't be timestamped, so it's held back
+    client._handle_packet(frame_packets[0], timeit.default_timer(), ('127.0.0.1', 1511))
+    assert client._frames.empty()
+
+    clock.send_echo_request(conn)
+    request = conn.send_message.call_args[0][0]
+    response = natnet.protocol.serialize(natnet.protocol.EchoResponseMessage(request.timestamp, int(500e9)))
+    client._handle_packet(response, timeit.default_timer(), ('127.0.0.1', 1510))
+    assert clock.estimator.synchronized
+    # The held frame is handled before the next one
+    client._handle_packet(frame_packets[1], timeit.default_timer(), ('127.0.0.1', 1511))
+
+    assert [client._frames.get_nowait()[0].frame_number for _ in range(2)] == [1, 2]
+
+
+def test_async_client_counts_early_frames_dropped():
+    packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    clock = ClockSynchronizer(mock.Mock(high_resolution_clock_frequency=1e9), natnet.Logger())
+    client = AsyncClient(mock.Mock(), natnet.Logger(), max_queued_frames=2)
+    client._client = natnet.Client(client._conn, clock, natnet.Logger())
+
+    for received_time in (1.0, 2.0, 3.0):
+        client._handle_packet(packet, received_time, ('127.0.0.1', 1511))
+
+    assert client.dropped_frame_count == 1
+    assert [received_time for _, received_time in client._early_packets] == [2.0, 3.0]
+
+
+def test_async_client_sends_keep_alives_without_frames():
+    async def wait_without_frames(client):
+        client._keep_alive()
+        await asyncio.sleep(0.1)
+        client.close()
+        call_count = client._conn.send_keep_alive.call_count
+        await asyncio.sleep(0.05)
+        return call_count
+
+    conn = mock.Mock(keep_alive_interval=0.01)
+    client = AsyncClient(conn, natnet.Logger())
+    loop = asyncio.new_event_loop()
+    try:
+        call_count = loop.run_until_complete(wait_without_frames(client))
+    finally:
+        loop.close()
+    assert call_count >= 2
+    # Closing the client stops them
+    assert conn.send_keep_alive.call_count == call_count
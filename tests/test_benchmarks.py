@@ -0,0 +1,159 @@
+"""Parser throughput benchmarks.
+
+These are skipped (well, run once without timing) by default.  To run them and save the results as
+a JSON baseline in ``.benchmarks``::
+
+    tox -e bench
+
+then to run them again and fail if anything is more than 10% slower than the latest baseline::
+
+    tox -e bench-compare
+
+Each result's ``extra_info`` has the throughput in packets per second, and the memory allocated
+while parsing one packet (peak, and retained by the resulting message).
+"""
+
+import glob
+import os.path
+import struct
+
+import pytest
+
+from natnet.protocol import MessageId, Version, deserialize, serialize
+from natnet.protocol.common import SerializeBuffer
+from natnet.protocol.MocapFrameMessage import FrameDecoder
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+VERSIONS = [Version(2), Version(2, 6), Version(2, 9), Version(2, 11), Version(3)]
+RIGID_BODY_COUNTS = [1, 10, 100]
+LABELLED_MARKER_COUNTS = [10, 200, 2000]
+
+
+def synthetic_frame_packet(version, rigid_body_count, labelled_marker_count):
+    """Pack a FrameOfData packet in the given protocol version's format.
+
+    Packing uses the same structs as :class:`~natnet.protocol.MocapFrameMessage.FrameDecoder`, so
+    it follows the version checks without repeating them.
+    """
+    decoder = FrameDecoder.for_version(version)
+    uint32_t = struct.Struct('<I')
+
+    payload = decoder._header_t.pack(1234, 0)
+    payload += uint32_t.pack(0)  # Unlabelled markers
+
+    rigid_body_tail = ((0.001,) if decoder._rigid_body_has_mean_error else ()) + \
+        ((1,) if decoder._rigid_body_has_params else ())
+    payload += uint32_t.pack(rigid_body_count)
+    for i in range(rigid_body_count):
+        fields = (i + 1, 1.0, 2.0, 3.0, 0.0, 0.0, 0.0, 1.0)
+        if decoder._rigid_body_has_markers:
+            payload += decoder._rigid_body_t.pack(*fields)
+            payload += uint32_t.pack(0)  # Markers
+            payload += decoder._rigid_body_tail_t.pack(0, *rigid_body_tail)
+        else:
+            payload += decoder._rigid_body_t.pack(*(fields + rigid_body_tail))
+
+    if decoder._has_skeletons:
+        payload += uint32_t.pack(0)
+
+    if decoder._has_labelled_markers:
+        labelled_marker_tail = ((0,) if decoder._labelled_marker_has_params else ()) + \
+            ((0.0001,) if decoder._labelled_marker_has_residual else ())
+        payload += uint32_t.pack(labelled_marker_count)
+        for i in range(labelled_marker_count):
+            payload += decoder._labelled_marker_t.pack(i % 100 + 1, i//100 + 1, 1.0, 2.0, 3.0, 0.01,
+                                                       *labelled_marker_tail)
+
+    if decoder._has_force_plates:
+        payload += uint32_t.pack(0)
+    if decoder._has_devices:
+        payload += uint32_t.pack(0)
+
+    # Timecode, subframe and timestamp, then the HPC timestamps if the decoder doesn't pad them out
+    timing_info = (0, 0, 1.5) + (() if decoder._timing_info_padding else (100, 200, 300))
+    payload += decoder._timing_info_t.pack(*timing_info)
+    payload += decoder._footer_t.pack(0, 0)
+
+    return struct.pack('<HH', MessageId.FrameOfData, len(payload)) + payload
+
+
+def _benchmark_deserialize(benchmark, packet, version):
+    """Benchmark deserializing the packet, and record throughput and allocations."""
+    deserialize(packet, version)  # Warm up caches
+    if tracemalloc is not None:
+        tracemalloc.start()
+        message = deserialize(packet, version)  # noqa: F841
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        benchmark.extra_info['peak_allocated_bytes'] = peak
+        benchmark.extra_info['retained_bytes'] = retained
+
+    benchmark(deserialize, packet, version)
+
+    stats = getattr(benchmark, 'stats', None)
+    if stats:
+        benchmark.extra_info['packets_per_second'] = 1.0/stats.stats.mean
+
+
+def test_synthetic_frame_packet_round_trip():
+    """Make sure the synthetic packets actually parse as intended."""
+    for version in VERSIONS:
+        frame = deserialize(synthetic_frame_packet(version, 3, 20), version, strict=True)
+        assert len(frame.rigid_bodies) == 3
+        assert frame.rigid_bodies[2].id_ == 3
+        assert len(frame.labelled_markers) == (20 if version >= Version(2, 3) else 0)
+        assert frame.timing_info.timestamp == 1.5
+
+
+@pytest.mark.parametrize('filename', sorted(glob.glob('test_data/*.bin')),
+                         ids=lambda filename: os.path.basename(filename))
+def test_benchmark_recorded_packet(benchmark, filename):
+    benchmark.group = 'recorded packets'
+    packet = open(filename, 'rb').read()
+    _benchmark_deserialize(benchmark, packet, Version(3))
+
+
+@pytest.mark.parametrize('version', VERSIONS, ids=lambda version: 'v' + '.'.join(map(str, version)))
+@pytest.mark.parametrize('rigid_body_count', RIGID_BODY_COUNTS)
+@pytest.mark.parametrize('labelled_marker_count', LABELLED_MARKER_COUNTS)
+def test_benchmark_synthetic_frame(benchmark, version, rigid_body_count, labelled_marker_count):
+    benchmark.group = 'synthetic frames, {} rigid bodies, {} labelled markers'.format(
+        rigid_body_count, labelled_marker_count)
+    packet = synthetic_frame_packet(version, rigid_body_count, labelled_marker_count)
+    _benchmark_deserialize(benchmark, packet, version)
+
+
+@pytest.mark.parametrize('rigid_body_count', RIGID_BODY_COUNTS)
+@pytest.mark.parametrize('labelled_marker_count', LABELLED_MARKER_COUNTS)
+def test_benchmark_serialize_frame(benchmark, rigid_body_count, labelled_marker_count):
+    benchmark.group = 'serialize, {} rigid bodies, {} labelled markers'.format(
+        rigid_body_count, labelled_marker_count)
+    packet = synthetic_frame_packet(Version(3), rigid_body_count, labelled_marker_count)
+    frame = deserialize(packet, Version(3))
+    buffer = SerializeBuffer()
+    assert serialize(frame, buffer) == packet
+    benchmark(serialize, frame, buffer)
+
+
+@pytest.mark.skipif(tracemalloc is None, reason='Requires tracemalloc')
+def test_allocation_scales_with_frame_size():
+    """Parsing shouldn't allocate anything per element beyond the resulting objects."""
+    def peak_allocation(labelled_marker_count):
+        packet = synthetic_frame_packet(Version(3), 1, labelled_marker_count)
+        deserialize(packet, Version(3))  # Warm up caches
+        tracemalloc.start()
+        frame = deserialize(packet, Version(3))  # noqa: F841
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, retained
+
+    small_peak, small_retained = peak_allocation(100)
+    large_peak, large_retained = peak_allocation(1000)
+    # Transient allocations (e.g., the intermediate tuples from unpacking) are at most as big as
+    # the result
+    assert large_peak - small_peak < 2*(large_retained - small_retained) + 1024
@@ -0,0 +1,128 @@
+"""Tests for reading packet captures."""
+
+import socket
+import struct
+
+import pytest
+
+import natnet
+from natnet.capture import Capture, CaptureError
+
+
+def test_read_pcapng_capture():
+    with Capture.open('test_data/raw/traffic.pcapng') as capture:
+        messages = list(capture.messages())
+        frames = list(capture.frames())
+
+    message_types = [type(message) for message, _ in messages]
+    assert message_types.count(natnet.protocol.ServerInfoMessage) == 2
+    assert message_types.count(natnet.protocol.ModelDefinitionsMessage) == 1
+    assert len(frames) == 518
+    frame_numbers = [frame.frame_number for frame, _ in frames]
+    assert frame_numbers == list(range(162734, 162734 + 518))
+    timestamps = [timestamp for _, timestamp in frames]
+    assert timestamps == sorted(timestamps)
+    # Capture timestamps are in seconds since the epoch (this was captured in October 2017)
+    assert 1506816000 < timestamps[0] < 1509494400
+
+
+def _ethernet_frames(payload, source_port, destination_port, fragment_size=None):
+    """Wrap a UDP payload in Ethernet frames, fragmenting the IP packet if necessary."""
+    udp = struct.pack('!HHHH', source_port, destination_port, 8 + len(payload), 0) + payload
+    fragment_size = fragment_size or len(udp)
+    frames = []
+    for offset in range(0, len(udp), fragment_size):
+        data = udp[offset:offset + fragment_size]
+        more_fragments = offset + fragment_size < len(udp)
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(data), 1234, (more_fragments << 13) | offset//8,
+                         64, 17, 0, socket.inet_aton('10.0.0.1'), socket.inet_aton('239.255.42.99'))
+        frames.append(b'\0'*12 + b'\x08\x00' + ip + data)
+    return frames
+
+
+def _pcap(frames, seconds=None):
+    data = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+    seconds = seconds or [1000 + i for i in range(len(frames))]
+    for frame, second in zip(frames, seconds):
+        data += struct.pack('<IIII', second, 500000, len(frame), len(frame)) + frame
+    return data
+
+
+def test_read_pcap_capture_with_fragments(tmpdir):
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    echo_packet = open('test_data/echorequest_packet_v3.bin', 'rb').read()
+    # Fragments out of order, plus a packet on another port
+    fragments = _ethernet_frames(frame_packet, 1511, 1511, fragment_size=128)
+    frames = [fragments[1], fragments[0]] + _ethernet_frames(echo_packet, 5000, 5001) + fragments[2:]
+    filename = tmpdir.join('test.pcap')
+    filename.write_binary(_pcap(frames))
+
+    with Capture.open(str(filename)) as capture:
+        packets = list(capture.packets())
+    assert packets == [(frame_packet, pytest.approx(1000 + len(frames) - 1 + 0.5))]
+
+    with Capture.open(str(filename), ports=None) as capture:
+        packets = list(capture.packets_with_addresses())
+    assert [packet for packet, _, _, _ in packets] == [echo_packet, frame_packet]
+    assert packets[0][2:] == (('10.0.0.1', 5000), ('239.255.42.99', 5001))
+
+
+def test_read_invalid_capture(tmpdir):
+    filename = tmpdir.join('test.pcap')
+    filename.write_binary(b'\0'*64)
+    with pytest.raises(CaptureError):
+        list(Capture.open(str(filename)).packets())
+
+
+def test_read_capture_with_truncated_packets(tmpdir):
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    truncated_frame, = _ethernet_frames(frame_packet, 1511, 1511)
+    # Captured with a snapshot length which cuts off the frame, and which cuts off a UDP header
+    frames = [truncated_frame[:200], truncated_frame[:40]] + _ethernet_frames(frame_packet, 1511, 1511)
+    filename = tmpdir.join('test.pcap')
+    filename.write_binary(_pcap(frames))
+
+    with Capture.open(str(filename)) as capture:
+        frames = list(capture.frames())
+    assert len(frames) == 1
+    assert frames[0][1] == pytest.approx(1002.5)
+
+
+def test_read_capture_expires_incomplete_fragments(tmpdir):
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    fragments = _ethernet_frames(frame_packet, 1511, 1511, fragment_size=128)
+    # The first datagram loses its last fragment, and a minute later another datagram arrives with
+    # the same IP identification
+    frames = fragments[:-1] + fragments
+    seconds = [1000]*(len(fragments) - 1) + [1060]*len(fragments)
+    filename = tmpdir.join('test.pcap')
+    filename.write_binary(_pcap(frames, seconds))
+
+    with Capture.open(str(filename)) as capture:
+        packets = list(capture.packets())
+    assert packets == [(frame_packet, pytest.approx(1060.5))]
+
+
+def test_read_pcapng_simple_packets(tmpdir):
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    frame, = _ethernet_frames(frame_packet, 1511, 1511)
+    padded_frame = frame + b'\0'*(-len(frame) % 4)
+
+    def block(block_type, body):
+        return struct.pack('<II', block_type, 12 + len(body)) + body + struct.pack('<I', 12 + len(body))
+
+    data = block(0x0a0d0d0a, struct.pack('<IHHq', 0x1a2b3c4d, 1, 0, -1))
+    data += block(1, struct.pack('<HHI', 1, 0, 65535))
+    # A simple packet block before any timestamped packet, then one after
+    data += block(3, struct.pack('<I', len(frame)) + padded_frame)
+    timestamp = 1000500000
+    data += block(6, struct.pack('<IIIII', 0, timestamp >> 32, timestamp & 0xffffffff, len(frame), len(frame)) +
+                  padded_frame)
+    data += block(3, struct.pack('<I', len(frame)) + padded_frame)
+    filename = tmpdir.join('test.pcapng')
+    filename.write_binary(data)
+
+    with Capture.open(str(filename)) as capture:
+        packets = list(capture.packets())
+    assert packets == [(frame_packet, 0.0), (frame_packet, pytest.approx(1000.5)),
+                       (frame_packet, pytest.approx(1000.5))]
@@ -1,11 +1,15 @@
 """Tests for fakes."""
 
+import sys
 import timeit
 
 import mock
 import pytest
 
-from natnet.fakes import FakeConnection, SingleFrameFakeClient
+import natnet
+from natnet.fakes import FakeConnection, ReplayClient, ReplayConnection, SingleFrameFakeClient
+
+requires_recording = pytest.mark.skipif(sys.version_info < (3,), reason='Recordings require Python 3')
 
 
 def test_fakeconnection_repeat():
@@ -81,3 +85,86 @@ def test_single_frame_fake_client_timestamps():
     client.set_callback(check_time)
     for i in range(10):
         client.run_once()
+
+
+@pytest.fixture
+def recording_file(tmpdir):
+    """Record server info, model definitions and ten frames 10ms apart."""
+    from natnet.recording import Recorder
+    server_info_packet = open('test_data/serverinfo_packet_v3.bin', 'rb').read()
+    modeldef_packet = open('test_data/modeldef_packet_v3.bin', 'rb').read()
+    mocapframe_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    filename = str(tmpdir.join('test.natnet'))
+    recorder = Recorder.open(filename)
+    recorder.record(server_info_packet, 0.0)
+    recorder.record(modeldef_packet, 0.0)
+    for i in range(10):
+        frame = natnet.protocol.deserialize(mocapframe_packet)
+        frame.frame_number = 100 + i
+        frame.timing_info.timestamp = 10.0 + i/100.0
+        recorder.record(natnet.protocol.serialize(frame), 1.0 + i/100.0)
+    recorder.close()
+    return filename
+
+
+def _frame_numbers(packets):
+    return [natnet.protocol.deserialize(packet).frame_number for packet, _ in packets
+            if natnet.protocol.deserialize_header(packet)[0] == natnet.protocol.MessageId.FrameOfData]
+
+
+@requires_recording
+def test_replay_connection_as_fast_as_possible(recording_file):
+    conn = ReplayConnection.open(recording_file, speed=None)
+    assert conn.server_info is not None
+    assert conn.model_definitions is not None
+
+    packets = conn.wait_for_packets_raw()
+    # Server info is skipped
+    assert len(packets) == 11
+    assert _frame_numbers(packets) == list(range(100, 110))
+    assert packets[-1][1] == pytest.approx(1.09)
+    with pytest.raises(SystemExit):
+        conn.wait_for_packets_raw()
+
+
+@requires_recording
+def test_replay_connection_repeat(recording_file):
+    conn = ReplayConnection.open(recording_file, speed=None, repeat=True)
+    packets = conn.wait_for_packets_raw(max_packets=15)
+    assert _frame_numbers(packets) == list(range(100, 110)) + [100, 101, 102]
+
+
+@requires_recording
+def test_replay_connection_seek(recording_file):
+    conn = ReplayConnection.open(recording_file, speed=None)
+    conn.seek_frame(105)
+    assert _frame_numbers(conn.wait_for_packets_raw()) == list(range(105, 110))
+    conn.seek_timestamp(10.075)
+    assert _frame_numbers(conn.wait_for_packets_raw()) == [108, 109]
+    with pytest.raises(ValueError):
+        conn.seek_frame(1000)
+
+
+@requires_recording
+@pytest.mark.parametrize('speed', [1, 3])
+def test_replay_connection_speed(recording_file, speed):
+    conn = ReplayConnection.open(recording_file, speed=speed)
+    conn.wait_for_packet_raw()  # Model definitions
+    start = timeit.default_timer()
+    for i in range(10):
+        _, received_time = conn.wait_for_packet_raw()
+    # Recorded frames are 1s after the model definitions, then 10ms apart
+    assert received_time - start == pytest.approx((1.0 + 0.09)/speed, abs=0.02)
+
+
+@requires_recording
+def test_replay_client(recording_file):
+    client = ReplayClient.replay(recording_file, speed=None)
+    model_callback = mock.Mock()
+    client.set_model_callback(model_callback)
+    model_callback.assert_called_once()
+    callback = mock.Mock()
+    client.set_frame_callback(callback)
+    client.set_batch_size(100)
+    client.run_once()
+    assert [frame.frame_number for (frame, _), _ in callback.call_args_list] == list(range(100, 110))
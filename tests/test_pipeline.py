@@ -0,0 +1,68 @@
+# coding: utf-8
+"""Tests for pipeline module."""
+
+import struct
+
+import pytest
+
+import natnet
+from natnet.fakes import FakeClockSynchronizer, FakeConnection
+from natnet.pipeline import Pipeline
+
+
+def get_frame_number_and_body_count(frame, timing):
+    """Processing function (has to be picklable)."""
+    return frame.frame_number, len(frame.rigid_bodies), timing.system_latency
+
+
+@pytest.mark.timeout(10)
+def test_pipeline_delivers_results_in_order():
+    server_info_message = natnet.protocol.deserialize(open('test_data/serverinfo_packet_v3.bin', 'rb').read())
+    frame = natnet.protocol.deserialize(open('test_data/mocapframe_packet_v3.bin', 'rb').read())
+    conn = FakeConnection()
+    for frame_number in range(20):
+        frame.frame_number = frame_number
+        conn.add_message(frame)
+    log = natnet.Logger()
+    client = natnet.Client(conn, FakeClockSynchronizer(server_info_message, log), log)
+
+    results = []
+    pipeline = Pipeline(client, get_frame_number_and_body_count,
+                        lambda frame_number, result: results.append((frame_number, result)),
+                        workers=3, slots=32)
+    pipeline.spin()
+
+    assert [frame_number for frame_number, _ in results] == list(range(20))
+    assert [result[:2] for _, result in results] == [(i, 1) for i in range(20)]
+    # SampleClient says 5.5ms
+    assert results[0][1][2] == pytest.approx(0.005495071)
+    assert pipeline.dropped_frame_count == 0
+
+
+@pytest.mark.timeout(10)
+def test_pipeline_skips_malformed_and_oversized_frames():
+    server_info_message = natnet.protocol.deserialize(open('test_data/serverinfo_packet_v3.bin', 'rb').read())
+    frame_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    frame = natnet.protocol.deserialize(frame_packet)
+    conn = FakeConnection()
+    for frame_number in range(10):
+        frame.frame_number = frame_number
+        conn.add_message(frame)
+        if frame_number == 3:
+            # Truncated, so it fails to parse in the worker
+            conn.add_packet(frame_packet[:2] + struct.pack('<H', 36) + frame_packet[4:40])
+        elif frame_number == 6:
+            # Too big for a slot
+            payload = frame_packet[4:] + b'\0'*1024
+            conn.add_packet(frame_packet[:2] + struct.pack('<H', len(payload)) + payload)
+    log = natnet.Logger()
+    client = natnet.Client(conn, FakeClockSynchronizer(server_info_message, log), log)
+
+    results = []
+    pipeline = Pipeline(client, get_frame_number_and_body_count,
+                        lambda frame_number, result: results.append((frame_number, result)),
+                        workers=2, slots=32, slot_size=len(frame_packet) + 512)
+    pipeline.spin()
+
+    assert [frame_number for frame_number, _ in results] == list(range(10))
+    assert pipeline.dropped_frame_count == 1
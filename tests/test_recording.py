@@ -0,0 +1,142 @@
+"""Tests for recording packets."""
+
+import threading
+
+import pytest
+
+import natnet
+from natnet.fakes import FakeClockSynchronizer, FakeConnection
+from natnet.recording import Recorder, Recording
+
+
+@pytest.fixture(scope='module')
+def frame_packets():
+    mocapframe_packet = open('test_data/mocapframe_packet_v3.bin', 'rb').read()
+    packets = []
+    for i in range(10):
+        frame = natnet.protocol.deserialize(mocapframe_packet)
+        frame.frame_number = 100 + i
+        frame.timing_info.timestamp = 10.0 + i/100.0
+        packets.append(natnet.protocol.serialize(frame))
+    return packets
+
+
+@pytest.fixture(scope='module')
+def echo_packet():
+    return natnet.protocol.serialize(natnet.protocol.EchoResponseMessage(1, 2))
+
+
+def _record(filename, packets, index_interval=1000, close=True):
+    recorder = Recorder.open(str(filename), index_interval=index_interval)
+    for i, packet in enumerate(packets):
+        recorder.record(packet, float(i))
+    if close:
+        recorder.close()
+    else:
+        recorder._file.flush()
+    return recorder
+
+
+@pytest.mark.parametrize('index_interval', [1000, 3])
+def test_recording_round_trip(tmpdir, frame_packets, echo_packet, index_interval):
+    packets = frame_packets[:5] + [echo_packet] + frame_packets[5:]
+    filename = tmpdir.join('test.natnet')
+    _record(filename, packets, index_interval)
+
+    with Recording.open(str(filename)) as recording:
+        assert recording.version == natnet.Version(3)
+        received = [(bytes(packet), received_time) for packet, received_time in recording.packets()]
+        assert received == [(packet, float(i)) for i, packet in enumerate(packets)]
+        assert list(recording.frame_numbers) == list(range(100, 110))
+        assert list(recording.timestamps) == pytest.approx([10.0 + i/100.0 for i in range(10)])
+
+
+def test_recording_rebuilds_index_if_not_closed(tmpdir, frame_packets):
+    filename = tmpdir.join('test.natnet')
+    recorder = _record(filename, frame_packets, index_interval=4, close=False)
+
+    with Recording.open(str(filename)) as recording:
+        assert list(recording.frame_numbers) == list(range(100, 110))
+        assert len(list(recording.packets())) == len(frame_packets)
+    recorder.close()
+
+
+def test_recording_seek(tmpdir, frame_packets, echo_packet):
+    filename = tmpdir.join('test.natnet')
+    _record(filename, [echo_packet] + frame_packets)
+
+    with Recording.open(str(filename)) as recording:
+        offset = recording.find_frame(105)
+        packet, received_time = next(recording.packets(offset))
+        assert natnet.protocol.deserialize(packet).frame_number == 105
+        assert received_time == 6.0
+
+        offset = recording.find_timestamp(10.075)
+        packet, _ = next(recording.packets(offset))
+        assert natnet.protocol.deserialize(packet).frame_number == 108
+
+        assert recording.find_frame(1000) is None
+
+
+def test_recording_rejects_other_files(tmpdir):
+    filename = tmpdir.join('test.bin')
+    filename.write_binary(b'\0'*64)
+    with pytest.raises(ValueError):
+        Recording.open(str(filename))
+
+
+def test_client_records_packets(tmpdir, frame_packets):
+    server_info_message = natnet.protocol.deserialize(open('test_data/serverinfo_packet_v3.bin', 'rb').read())
+    conn = FakeConnection(list(frame_packets))
+    log = natnet.Logger()
+    client = natnet.Client(conn, FakeClockSynchronizer(server_info_message, log), log)
+    filename = tmpdir.join('test.natnet')
+
+    client.start_recording(str(filename))
+    client.set_batch_size(len(frame_packets))
+    client.run_once()
+    client.stop_recording()
+
+    with Recording.open(str(filename)) as recording:
+        messages = [natnet.protocol.deserialize(packet) for packet, _ in recording.packets()]
+    assert messages[0] == server_info_message
+    assert [m.frame_number for m in messages[1:]] == list(range(100, 110))
+
+
+def test_recording_clock_states(tmpdir, frame_packets):
+    filename = tmpdir.join('test.natnet')
+    recorder = Recorder.open(str(filename))
+    recorder.record(frame_packets[0], 1.0)
+    recorder.record_clock_state((1000.0, 1.5, 30e-6), 1.5)
+    recorder.record(frame_packets[1], 2.0)
+    recorder.close()
+
+    with Recording.open(str(filename)) as recording:
+        assert recording.clock_states() == [(1.5, (1000.0, 1.5, 30e-6))]
+        assert [bytes(packet) for packet, _ in recording.packets()] == frame_packets[:2]
+        assert list(recording.frame_numbers) == [100, 101]
+
+
+def test_recording_from_two_threads(tmpdir, frame_packets):
+    filename = tmpdir.join('test.natnet')
+    recorder = Recorder.open(str(filename), index_interval=7)
+
+    def record_clock_states():
+        for i in range(1000):
+            recorder.record_clock_state((1000.0 + i, float(i), 30e-6), float(i))
+
+    thread = threading.Thread(target=record_clock_states)
+    thread.start()
+    for i in range(1000):
+        recorder.record(frame_packets[i % len(frame_packets)], float(i))
+    thread.join()
+    recorder.close()
+
+    with Recording.open(str(filename)) as recording:
+        assert [local_time for local_time, _ in recording.clock_states()] == list(map(float, range(1000)))
+        assert [received_time for _, received_time in recording.packets()] == list(map(float, range(1000)))
+        assert len(recording.offsets) == 1000
+        for offset, frame_number in zip(recording.offsets, recording.frame_numbers):
+            packet, _ = next(recording.packets(offset))
+            assert natnet.protocol.MocapFrameMessage.peek_frame_number(
+                natnet.protocol.common.ParseBuffer(packet, 4)) == frame_number
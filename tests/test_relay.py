@@ -0,0 +1,75 @@
+# coding: utf-8
+"""Integration tests for relay module using Server class."""
+
+import socket
+import threading
+
+import pytest
+
+import natnet
+from natnet.comms import ClockSynchronizer, Connection
+from natnet.relay import Relay
+from natnet.Server import ServerConnection
+from test_Server import server  # noqa: F401
+
+
+@pytest.fixture()
+def relay(server):  # noqa: F811
+    relay = Relay.connect('127.0.0.1', multicast_groups=[('239.255.42.101', 1521)], command_port=1520)
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            relay.run_once(timeout=0.01)
+    thread = threading.Thread(target=run)
+    thread.start()
+    yield relay
+    stop.set()
+    thread.join()
+
+
+def _connect_to_relay():
+    conn = Connection.open('127.0.0.1', command_port=1520)
+    conn.send_message(natnet.protocol.ConnectMessage())
+    server_info, _ = conn.wait_for_message_with_id(natnet.MessageId.ServerInfo, timeout=1)
+    return conn, server_info
+
+
+@pytest.mark.timeout(10)
+def test_relay_forwards_frames(relay):
+    multicast_conn, server_info = _connect_to_relay()
+    assert server_info.app_name == 'python_natnet server'
+    assert server_info.connection_info.multicast
+    assert (server_info.connection_info.multicast_address, server_info.connection_info.data_port) == \
+        ('239.255.42.101', 1521)
+    multicast_conn.bind_data_socket('239.255.42.101', 1521)
+
+    unicast_conn, _ = _connect_to_relay()
+    unicast_conn.bind_unicast_data_socket()
+    unicast_conn.send_keep_alive()
+
+    for conn in (multicast_conn, unicast_conn):
+        frame, _ = conn.wait_for_message_with_id(natnet.MessageId.FrameOfData, timeout=1)
+        assert frame.frame_number > 0
+        conn.send_message(natnet.protocol.RequestModelDefinitionsMessage())
+        model_definitions, _ = conn.wait_for_message_with_id(natnet.MessageId.ModelDef, timeout=1)
+        assert model_definitions.models == []
+    assert relay.subscriber_count == 1
+    assert relay.forwarded_packet_count > 0
+
+
+@pytest.mark.timeout(10)
+def test_relay_answers_echo_requests_with_server_time(relay):
+    conn, server_info = _connect_to_relay()
+    clock = ClockSynchronizer(server_info, natnet.Logger())
+    clock.initial_sync(conn)
+    # The relay's estimate of the server clock is passed on to downstream clients
+    assert clock.server_time_now() == pytest.approx(relay._clock_synchronizer.server_time_now(), abs=1e-3)
+
+
+def test_relay_sets_multicast_ttl():
+    conn = ServerConnection.listen(command_port=1530, ttl=8)
+    try:
+        assert bytearray(conn._socket.getsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1))[0] == 8
+    finally:
+        conn._socket.close()
@@ -0,0 +1,109 @@
+"""Tests for telemetry module."""
+
+import random
+
+import mock
+import pytest
+
+from natnet.telemetry import FrameSequence, FrameStatus, FrameTelemetry, LatencyHistogram
+
+
+def test_latency_histogram_percentiles():
+    rng = random.Random(0)
+    values = [rng.uniform(0, 0.02) for i in range(10000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    assert histogram.count == len(values)
+    assert histogram.min == values[0]
+    assert histogram.max == values[-1]
+    assert histogram.mean == pytest.approx(sum(values)/len(values))
+    for percentile in (1, 50, 90, 99, 99.9):
+        expected = values[int(percentile/100.0*len(values)) - 1]
+        assert histogram.percentile(percentile) == pytest.approx(expected, rel=0.01, abs=2e-6)
+    assert histogram.percentile(100) == values[-1]
+
+
+def test_latency_histogram_limits():
+    histogram = LatencyHistogram(max_value=1.0)
+    assert histogram.percentile(50) is None
+    histogram.record(-0.001)
+    histogram.record(5.0)
+    assert histogram.min == -0.001
+    assert histogram.percentile(1) == 0
+    assert histogram.percentile(100) == 5.0
+    copy = histogram.copy()
+    histogram.reset()
+    assert histogram.count == 0
+    assert copy.count == 2
+    assert copy.summary()['max'] == 5.0
+
+
+def _timing(timestamp, latency=0.001):
+    return mock.Mock(timestamp=timestamp, system_latency=latency, transit_latency=latency,
+                     processing_latency=latency)
+
+
+def test_frame_telemetry_counts_and_jitter():
+    telemetry = FrameTelemetry(interval=10)
+    # Frame 3 is lost, 5 arrives late, and 7 arrives 1ms late
+    for frame_number, received_time in [(1, 0.0), (2, 0.01), (4, 0.03), (6, 0.05), (5, 0.051), (7, 0.061),
+                                        (8, 0.07)]:
+        telemetry.record(frame_number, received_time, _timing(frame_number*0.01 - 0.01))
+
+    snapshot = telemetry.snapshot()
+    assert snapshot.frame_count == 7
+    assert snapshot.dropped_frame_count == 1
+    assert snapshot.out_of_order_frame_count == 1
+    assert snapshot.system_latency.percentile(50) == pytest.approx(0.001, rel=0.01)
+    assert snapshot.jitter.count == 5
+    assert snapshot.jitter.max == pytest.approx(0.001)
+    assert snapshot.as_dict()['transit_latency']['count'] == 7
+    assert telemetry.last_snapshot is None
+
+
+def test_frame_telemetry_intervals():
+    callback = mock.Mock()
+    telemetry = FrameTelemetry(interval=1, callback=callback)
+    for i in range(250):
+        telemetry.record(i, i*0.01, _timing(i*0.01))
+
+    assert callback.call_count == 2
+    assert telemetry.last_snapshot is callback.call_args[0][0]
+    assert telemetry.last_snapshot.start_time == 1.0
+    assert telemetry.last_snapshot.frame_count == 100
+    assert telemetry.snapshot().frame_count == 50
+
+
+def test_frame_sequence():
+    sequence = FrameSequence()
+    statuses = [sequence.track(frame_number) for frame_number in [10, 11, 13, 14, 12, 14, 17, 5000, 3, 4, 4]]
+
+    assert statuses == [FrameStatus.New, FrameStatus.New, FrameStatus.New, FrameStatus.New, FrameStatus.OutOfOrder,
+                        FrameStatus.Duplicate, FrameStatus.New, FrameStatus.New, FrameStatus.Restart,
+                        FrameStatus.New, FrameStatus.Duplicate]
+    assert sequence.frame_count == 11
+    # 15 and 16, then 18 to 4999
+    assert sequence.dropped_frame_count == 2 + 4982
+    assert sequence.out_of_order_frame_count == 1
+    assert sequence.duplicate_frame_count == 2
+    assert sequence.restart_count == 1
+    assert sequence.latest_frame_number == 4
+
+
+def test_frame_sequence_restart_within_window():
+    sequence = FrameSequence()
+    statuses = [sequence.track(frame_number) for frame_number in list(range(1, 501)) + list(range(1, 600))]
+
+    assert statuses.count(FrameStatus.Restart) == 1
+    assert statuses[500] == FrameStatus.Restart
+    assert sequence.restart_count == 1
+    assert sequence.duplicate_frame_count == 0
+    assert sequence.dropped_frame_count == 0
+    assert sequence.latest_frame_number == 599
+    # Frames which are only a little late near the start aren't restarts
+    sequence = FrameSequence()
+    assert [sequence.track(frame_number) for frame_number in (1, 3, 2)] == \
+        [FrameStatus.New, FrameStatus.New, FrameStatus.OutOfOrder]